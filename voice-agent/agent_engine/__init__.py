@@ -0,0 +1,19 @@
+# Importable Angel Tea agent engine shared by the voice demos, the benchmark and
+# any server. Importing it is side-effect free: no network, no credentials and no
+# openai import until a client is actually needed (see client.get_client).
+
+from .client import get_async_client, get_client
+from .menu import CATALOG, MENU, MENU_VERSION, TOPPINGS, VALID_SUGAR, VALID_ICE, LOOKUP_STATS, Catalog
+from .tools import (
+    TOOLS, REQUEST_TOOLS, CART, Cart, CartLine, READBACK_PLANS, TOOL_CACHE, ToolResultCache, canonical_tools,
+    readback_segment_phrases, run_tool, run_tool_json, tool_schemas,
+)
+from .fast_path import FAST_PATH_STATS, fast_path_reply, fast_path_hit_rate
+from .agent import (
+    SYSTEM_PROMPT, FALLBACK_REPLY, ConversationMemory, SentenceSplitter, agent_reply, agent_reply_async,
+    agent_reply_stream,
+)
+from .limits import Overloaded, UpstreamLimiter
+from .sessions import Session, SessionStore
+from .reply_cache import REPLY_CACHE, ReplyCache, normalize_transcript, turn_is_stateless
+from .tracing import TRACER, Tracer
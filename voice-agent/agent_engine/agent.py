@@ -0,0 +1,441 @@
+# The agent: system prompt, the tool-calling loop (blocking, streamed and async),
+# and bounded conversation memory. The OpenAI client is passed in or created lazily.
+
+import json, os, re, sys, time
+from contextlib import nullcontext
+from itertools import chain
+from typing import Optional
+
+from .client import get_async_client, get_client
+from .tools import REQUEST_TOOLS, Cart, run_tool_json
+from .tracing import TRACER
+
+try:
+    import tiktoken  # optional: exact token counts for the conversation budget
+except ImportError:
+    tiktoken = None
+
+SYSTEM_PROMPT = """You are a calm, helpful tea shop voice agent.
+Your goals:
+1) Recommend drinks briefly and clearly.
+2) Answer prices accurately.
+3) Place small orders (items, size=M/L, sugar, ice, toppings, quantity), then read back the order and total price for confirmation.
+4) If the user asks unclear questions, ask a short follow-up.
+
+Important behavior:
+- Keep answers short (1–3 sentences).
+- Confirm key details when placing orders (item, size, sugar, ice, toppings, quantity).
+- Use the provided tools:
+  - get_menu(query, fields, limit, cursor)
+  - recommend(filters, k)
+  - get_price(name, size, toppings)
+  - quote_items(items[])
+  - add_to_cart(items[]), update_cart_line(line, ...), remove_from_cart(line)
+  - place_order(items[])
+- For price questions about one or more drinks, call quote_items once with every drink and answer from its readback.
+- Build orders in the cart. The "Cart" system message shows the current lines (numbered) and any details still to ask about.
+  For changes like "make that a large instead", call update_cart_line on that line. When the customer confirms, call place_order with no items to place the cart.
+- Sizes are M or L. Each added topping is +$0.80 unless the drink lists included toppings.
+- Boba is not included unless the drink name states it or the user adds it as a topping.
+- Never invent items or prices that are not in the tool results.
+If an item is not found, suggest close alternatives from the menu.
+"""
+
+FALLBACK_REPLY = "I didn't catch that—could you please repeat your question?"
+
+def _trace_usage(span, usage):
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        span.set(prompt_tokens=usage.prompt_tokens, cached_tokens=getattr(details, "cached_tokens", 0) or 0)
+
+def _record_usage(stats: dict, usage, latency_ms: float):
+    """Append one round's token usage (including cached prompt tokens) to stats["usage"]."""
+    if stats is None or usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    stats["usage"].append({
+        "prompt_tokens": usage.prompt_tokens,
+        "cached_tokens": getattr(details, "cached_tokens", 0) or 0,
+        "completion_tokens": usage.completion_tokens,
+        "latency_ms": round(latency_ms, 1),
+    })
+
+def _append_tool_results(conversation: list, tool_payloads: list, run_tool=run_tool_json):
+    """Run each tool call; run_tool returns the result dict or its JSON text (already serialized)."""
+    for tc in tool_payloads:
+        with TRACER.span(f"tool.{tc['function']['name']}"):
+            result = run_tool(tc["function"]["name"], tc["function"]["arguments"])
+        conversation.append({
+            "role":"tool",
+            "tool_call_id": tc["id"],
+            "content": result if isinstance(result, str) else json.dumps(result)
+        })
+
+def _assistant_message(message) -> tuple:
+    """The chat message to append for a completion, and its tool calls as payloads."""
+    assistant_msg = {"role": message.role, "content": message.content or ""}
+    tool_payloads = []
+    if message.tool_calls:
+        for tc in message.tool_calls:
+            tool_payloads.append({
+                "id": tc.id,
+                "type": tc.type,
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments,
+                }
+            })
+        assistant_msg["tool_calls"] = tool_payloads
+    return assistant_msg, tool_payloads
+
+MAX_TOOL_ROUNDS = 3
+
+class _ToolLoop:
+    """
+    Bookkeeping shared by the agent_reply variants: round and tool-call stats, the
+    tool-round cap, and running requested tools. Each variant makes the request its
+    own way and hands the result to finish_round().
+    """
+    __slots__ = ("conversation", "stats", "run_tool", "tool_rounds", "fell_back")
+
+    def __init__(self, conversation: list, stats: dict, run_tool):
+        self.conversation, self.stats, self.run_tool = conversation, stats, run_tool
+        self.tool_rounds = 0
+        self.fell_back = False  # True when the reply is FALLBACK_REPLY rather than model text
+        if stats is not None:
+            stats.update(llm_rounds=0, tool_calls=0, usage=[])
+
+    def begin_round(self) -> int:
+        """Count a model request; returns its 1-based round number for tracing."""
+        if self.stats is not None:
+            self.stats["llm_rounds"] += 1
+        return self.tool_rounds + 1
+
+    def finish_round(self, assistant_msg: dict, tool_payloads: list) -> Optional[str]:
+        """Append the model's message and run its tools; the final reply, or None for another round."""
+        if tool_payloads:
+            self.tool_rounds += 1
+            if self.stats is not None:
+                self.stats["tool_calls"] += len(tool_payloads)
+            if self.tool_rounds > MAX_TOOL_ROUNDS:
+                return self._fall_back()
+            self.conversation.append(assistant_msg)
+            _append_tool_results(self.conversation, tool_payloads, self.run_tool)
+            return None
+        final_text = (assistant_msg["content"] or "").strip()
+        if not final_text:
+            return self._fall_back()
+        self.conversation.append(assistant_msg)
+        return final_text
+
+    def _fall_back(self) -> str:
+        """Record FALLBACK_REPLY as the answer; tool calls left unanswered would make every later request a 400."""
+        self.fell_back = True
+        self.conversation.append({"role": "assistant", "content": FALLBACK_REPLY})
+        return FALLBACK_REPLY
+
+def agent_reply(conversation: list, stats: dict = None, client=None,
+                tools: list = REQUEST_TOOLS, run_tool=run_tool_json) -> str:
+    """
+    Agent with function calling support.
+    - The model may request multiple tool calls; we execute then feed back.
+    - Up to 3 tool rounds.
+    conversation is mutated with assistant/tool messages so history persists.
+    If stats is given, it receives llm_rounds, tool_calls and per-round usage for this turn.
+    client defaults to get_client(); tools (canonical schemas) and run_tool let another
+    menu reuse the loop.
+    """
+    client = client or get_client()
+    loop = _ToolLoop(conversation, stats, run_tool)
+    while True:
+        round_no = loop.begin_round()
+        started = time.perf_counter()
+        with TRACER.span("llm.round", round=round_no) as span:
+            resp = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=conversation,
+                tools=tools,
+                tool_choice="auto"
+            )
+            _trace_usage(span, getattr(resp, "usage", None))
+        _record_usage(stats, getattr(resp, "usage", None), (time.perf_counter() - started) * 1000)
+        reply = loop.finish_round(*_assistant_message(resp.choices[0].message))
+        if reply is not None:
+            return reply
+
+async def agent_reply_async(conversation: list, stats: dict = None, client=None,
+                            tools: list = REQUEST_TOOLS, run_tool=run_tool_json, limiter=None) -> str:
+    """
+    agent_reply for the asyncio service: the same tool loop on an AsyncOpenAI client
+    (default get_async_client()). With a limiter, the turn is admitted once: it holds
+    one "chat" slot for all its rounds, so Overloaded can only be raised before the
+    first request, never after tools have changed the cart. Tools run inline; they
+    are pure CPU work of well under a millisecond.
+    """
+    client = client or get_async_client()
+    loop = _ToolLoop(conversation, stats, run_tool)
+    async with (limiter.slot("chat") if limiter else nullcontext()):
+        while True:
+            round_no = loop.begin_round()
+            started = time.perf_counter()
+            with TRACER.span("llm.round", round=round_no) as span:
+                resp = await client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=conversation,
+                    tools=tools,
+                    tool_choice="auto"
+                )
+                _trace_usage(span, getattr(resp, "usage", None))
+            _record_usage(stats, getattr(resp, "usage", None), (time.perf_counter() - started) * 1000)
+            reply = loop.finish_round(*_assistant_message(resp.choices[0].message))
+            if reply is not None:
+                return reply
+
+# ---------- Streaming: sentence-level incremental TTS ----------
+_SENTENCE_END_RE = re.compile(r"[.!?…]+[\"')\]]*\s+")
+# A period after one of these does not end the sentence ("Dr. Pepper", "12 oz. cup").
+_ABBREVIATIONS = frozenset({"dr", "mr", "mrs", "ms", "st", "jr", "sr", "vs", "oz", "approx", "e.g", "i.e"})
+
+class SentenceSplitter:
+    """Buffers streamed text and returns whole sentences as soon as they are complete."""
+
+    def __init__(self):
+        self.buf = ""
+
+    def feed(self, delta: str) -> list:
+        self.buf += delta
+        out, start = [], 0
+        for m in _SENTENCE_END_RE.finditer(self.buf):
+            words = self.buf[start:m.start()].split()
+            if m.group().startswith(".") and words and words[-1].lower().lstrip("(\"'") in _ABBREVIATIONS:
+                continue
+            sentence = self.buf[start:m.end()].strip()
+            if sentence:
+                out.append(sentence)
+            start = m.end()
+        self.buf = self.buf[start:]
+        return out
+
+    def flush(self) -> list:
+        rest, self.buf = self.buf.strip(), ""
+        return [rest] if rest else []
+
+def _merge_tool_call_deltas(acc: dict, deltas):
+    """Assemble streamed tool_call fragments by index into chat message payloads."""
+    for d in deltas or []:
+        tc = acc.setdefault(d.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+        if d.id:
+            tc["id"] = d.id
+        if d.type:
+            tc["type"] = d.type
+        if d.function:
+            if d.function.name:
+                tc["function"]["name"] += d.function.name
+            if d.function.arguments:
+                tc["function"]["arguments"] += d.function.arguments
+
+def agent_reply_stream(conversation: list, on_sentence, stats: dict = None, client=None,
+                       tools: list = REQUEST_TOOLS, run_tool=run_tool_json) -> str:
+    """
+    Same tool loop as agent_reply, but consumes a streamed completion and calls
+    on_sentence(text) for each finished sentence while the rest is still generating.
+    Returns the full reply text.
+    """
+    client = client or get_client()
+    loop = _ToolLoop(conversation, stats, run_tool)
+    while True:
+        round_no = loop.begin_round()
+        started = time.perf_counter()
+        splitter = SentenceSplitter()
+        parts, calls = [], {}
+        first_token_ms, usage = None, None
+        with TRACER.span("llm.round", round=round_no, stream=True) as span:
+            stream = client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=conversation,
+                tools=tools,
+                tool_choice="auto",
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            for chunk in stream:
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                    TRACER.mark("llm.first_token")
+                usage = getattr(chunk, "usage", None) or usage  # final chunk (no choices) carries usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    parts.append(delta.content)
+                    for sentence in splitter.feed(delta.content):
+                        on_sentence(sentence)
+                _merge_tool_call_deltas(calls, delta.tool_calls)
+            for sentence in splitter.flush():
+                on_sentence(sentence)
+            _trace_usage(span, usage)
+        _record_usage(stats, usage, first_token_ms or 0.0)  # streamed: time to first chunk
+
+        content = "".join(parts)
+        assistant_msg = {"role": "assistant", "content": content}
+        tool_payloads = [calls[i] for i in sorted(calls)]
+        if tool_payloads:
+            assistant_msg["tool_calls"] = tool_payloads
+        reply = loop.finish_round(assistant_msg, tool_payloads)
+        if reply is not None:
+            if loop.fell_back:
+                on_sentence(reply)
+            return reply
+
+# ---------- Conversation memory (bounded context per turn) ----------
+MEMORY_TOKEN_BUDGET = int(os.getenv("VOICE_AGENT_MEMORY_TOKENS", "3000"))
+MEMORY_MAX_TURNS = 4  # the cart block carries order state, so only recent turns are needed
+MEMORY_MAX_ORDERS = 3  # placed orders kept in the state block, most recent last
+_COMPACT_TOOL_RESULTS = {"get_menu", "recommend", "get_price", "quote_items",
+                         "add_to_cart", "update_cart_line", "remove_from_cart"}
+try:
+    _TOKENIZER = tiktoken.get_encoding("o200k_base") if tiktoken else None
+except Exception:  # encoding files not downloadable
+    _TOKENIZER = None
+
+def _message_tokens(msg: dict) -> int:
+    """Token count of one chat message (tiktoken if installed, else ~4 chars per token)."""
+    text = msg.get("content") or ""
+    for tc in msg.get("tool_calls") or ():
+        text += tc["function"]["name"] + tc["function"]["arguments"]
+    n = len(_TOKENIZER.encode(text)) if _TOKENIZER else (len(text) + 3) // 4
+    return n + 4  # role/framing overhead
+
+_OMITTED_RESULT = '{"omitted":"earlier result"}'
+
+class _Message:
+    """One stored chat message; tool calls are (id, name, arguments) tuples with interned names."""
+    __slots__ = ("role", "content", "tool_calls", "tool_call_id")
+
+    def __init__(self, msg: dict, content: str = None):
+        self.role = sys.intern(msg["role"])
+        self.content = msg.get("content") if content is None else content
+        self.tool_calls = tuple(
+            (tc["id"], sys.intern(tc["function"]["name"]), tc["function"]["arguments"])
+            for tc in msg.get("tool_calls") or ()) or None
+        self.tool_call_id = msg.get("tool_call_id")
+
+    def as_dict(self) -> dict:
+        msg = {"role": self.role, "content": self.content}
+        if self.tool_calls:
+            msg["tool_calls"] = [{"id": id_, "type": "function", "function": {"name": name, "arguments": args}}
+                                 for id_, name, args in self.tool_calls]
+        if self.tool_call_id:
+            msg["tool_call_id"] = self.tool_call_id
+        return msg
+
+class Turn:
+    """A finished turn as compact records: its messages and their token count, computed once."""
+    __slots__ = ("messages", "tokens")
+
+    def __init__(self, messages: list):
+        names = {tc["id"]: tc["function"]["name"] for m in messages for tc in (m.get("tool_calls") or ())}
+        # Bulky tool results are stubbed on the way in: the assistant's answer already carries what mattered.
+        self.messages = tuple(
+            _Message(m, _OMITTED_RESULT if m["role"] == "tool" and names.get(m["tool_call_id"]) in _COMPACT_TOOL_RESULTS
+                     else None)
+            for m in messages)
+        self.tokens = sum(_message_tokens(m.as_dict()) for m in self.messages)
+
+    def as_dicts(self) -> list:
+        return [m.as_dict() for m in self.messages]
+
+class ConversationMemory:
+    """
+    Holds the session's history turn by turn and builds a bounded message list
+    for each model call: the system prompt first (a stable prefix for prompt
+    caching), then recent turns, then a compact session-state block (orders
+    placed, the cart) just before the new user message.
+
+    Finished turns are stored as Turn records with bulky tool results replaced
+    by a stub (the assistant's answer already carries what mattered). Orders are
+    taken from the cart after each turn, however they were placed, and the last
+    MEMORY_MAX_ORDERS are kept. Turns up to a finished order collapse into the
+    state block, and the oldest turns are dropped until at most MEMORY_MAX_TURNS
+    remain and the history, orders included, fits the budget.
+    """
+
+    def __init__(self, system_prompt: str, budget: int = MEMORY_TOKEN_BUDGET, cart: Cart = None):
+        self.system = {"role": "system", "content": system_prompt}
+        self.budget = budget
+        self.cart = cart
+        self.turns = []    # Turn records, oldest first
+        self.orders = []   # (order_id, readback) of the latest orders placed this session
+        self.orders_tokens = 0
+        self.dropped_turns = 0
+        self.last_prompt_tokens = 0
+        self._start = 0
+        self._order_turn = -1  # index in turns of the latest turn that placed an order
+
+    def _orders_text(self) -> Optional[str]:
+        if not self.orders:
+            return None
+        return "Orders already placed:\n" + "\n".join(
+            f"- #{order_id}: {readback}" for order_id, readback in self.orders)
+
+    def state_block(self) -> Optional[dict]:
+        parts = []
+        orders = self._orders_text()
+        if orders:
+            parts.append(orders)
+        cart = self.cart.block() if self.cart else None
+        if cart:
+            parts.append(cart)
+        return {"role": "system", "content": "\n".join(parts)} if parts else None
+
+    def has_context(self) -> bool:
+        """True once the session has history (kept or dropped turns, orders) or cart lines."""
+        return bool(self.turns or self.dropped_turns or self.orders or (self.cart and self.cart.lines))
+
+    def begin_turn(self, user_text: str) -> list:
+        """Message list for this turn; pass it to the agent, then hand it back to end_turn."""
+        messages = [self.system]
+        messages.extend(chain.from_iterable(t.as_dicts() for t in self.turns))
+        turn_tokens = self.history_tokens() - self.orders_tokens  # the orders are counted in state below
+        state = self.state_block()
+        if state:  # changes every turn, so it goes after the cacheable prefix
+            messages.append(state)
+        self._start = len(messages)
+        messages.append({"role": "user", "content": user_text})
+        self.last_prompt_tokens = turn_tokens + sum(_message_tokens(m) for m in
+                                                     (self.system, state, messages[-1]) if m)
+        return messages
+
+    def turn_messages(self, messages: list) -> list:
+        """This turn's messages (the user message onwards) from a list begin_turn returned."""
+        return messages[self._start:]
+
+    def end_turn(self, messages: list):
+        placed = self.cart.take_placed() if self.cart else []
+        self.turns.append(Turn(self.turn_messages(messages)))
+        if placed:
+            self.orders = (self.orders + placed)[-MEMORY_MAX_ORDERS:]
+            orders = self._orders_text()
+            self.orders_tokens = _message_tokens({"content": orders})
+            self._order_turn = len(self.turns) - 1
+        self._compact()
+
+    def _compact(self):
+        # Turns up to a finished order are summarized by the state block (keep the latest turn for follow-ups).
+        if 0 <= self._order_turn < len(self.turns) - 1:
+            cut = self._order_turn + 1
+            self.turns = self.turns[cut:]
+            self.dropped_turns += cut
+            self._order_turn = -1
+        while len(self.turns) > MEMORY_MAX_TURNS or (len(self.turns) > 1 and self.history_tokens() > self.budget):
+            self.drop_oldest()
+
+    def drop_oldest(self):
+        """Forget the oldest stored turn (the session store also calls this to enforce its byte cap)."""
+        self.turns.pop(0)
+        self.dropped_turns += 1
+        self._order_turn -= 1
+
+    def history_tokens(self) -> int:
+        """Tokens of the stored turns plus the placed-orders summary."""
+        return sum(t.tokens for t in self.turns) + self.orders_tokens
@@ -0,0 +1,49 @@
+# Lazily constructed OpenAI clients shared by everything in the process.
+# openai is imported and OPENAI_API_KEY checked only on first use, so importing
+# the engine (benchmark collection, tests, a server's startup) needs neither.
+
+import os
+import threading
+
+HTTP_POOL_SIZE = int(os.getenv("VOICE_AGENT_HTTP_POOL", "64"))        # open connections to the API
+HTTP_KEEPALIVE = int(os.getenv("VOICE_AGENT_HTTP_KEEPALIVE", "32"))   # idle ones kept warm
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+
+
+def _api_key() -> str:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing OPENAI_API_KEY. Run: export OPENAI_API_KEY='sk-...'")
+    return api_key
+
+
+def get_client():
+    """The process-wide OpenAI client, created on first call; raises RuntimeError without OPENAI_API_KEY."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=_api_key())
+    return _client
+
+
+def get_async_client():
+    """
+    The process-wide AsyncOpenAI client for the service, created on first call from
+    inside the event loop. All sessions share its keep-alive connection pool, so
+    STT, chat and TTS requests reuse warm TLS connections instead of opening new ones.
+    """
+    global _async_client
+    if _async_client is None:
+        with _lock:
+            if _async_client is None:
+                import httpx  # installed with openai
+                from openai import AsyncOpenAI
+                limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_KEEPALIVE)
+                http_client = httpx.AsyncClient(limits=limits, timeout=httpx.Timeout(60.0, connect=5.0))
+                _async_client = AsyncOpenAI(api_key=_api_key(), http_client=http_client)
+    return _async_client
@@ -0,0 +1,150 @@
+# Local fast path: answers simple price questions and orders from a template
+# without calling the model. Orders go into the cart, like the add_to_cart tool.
+
+import re
+from collections import Counter
+
+from .menu import _SUGAR_LEVELS, Catalog, FuzzyMatcher, _tokens
+from .tools import CART, Cart, _SIZE_WORDS, _readback_segments, _register_readback, tool_get_price
+
+# ---------- Local Fast Path (simple price/order turns without the LLM) ----------
+# A small grammar for utterances like "Two large Taro Milk Tea, 50% sugar, less ice"
+# or "How much is a large Brown Sugar Bubble Tea?". Anything it is not sure about
+# returns None and goes to agent_reply as before. Drinks, sizes, toppings and prices
+# come from the cart's Catalog, so answers match what the same order would cost.
+_NUMBER_WORDS = {"a":1, "an":1, "one":1, "two":2, "three":3, "four":4, "five":5,
+                 "six":6, "seven":7, "eight":8, "nine":9, "ten":10}
+_QTY_PATTERN = r"(?:\d+|" + "|".join(_NUMBER_WORDS) + r")"
+_FAST_BAIL_RE = re.compile(r"\b(recommend|suggest|menu|what's good|instead|remove|cancel|change|make that|"
+                           r"without|not|don't|which|or)\b")
+_PRICE_RE = re.compile(r"\b(how much|price|cost|costs)\b")
+_PRICE_FILLER_RE = re.compile(r"\b(how much|what's|what|is|are|does|do|the|price|prices|cost|costs|of|for|it|a|an)\b")
+_ORDER_LEAD_RE = re.compile(r"^(?:i want|i'd like|i would like|can i get|can i have|could i get|could i have|"
+                            r"let me get|give me|i'll have|i'll take|i will have|order)\b")
+_ITEM_SPLIT_RE = re.compile(rf"\s*(?:;|,|\band\b)\s*(?={_QTY_PATTERN}\b(?!\s*%))")
+_SUGAR_RE = re.compile(r"\b(\d{1,3})\s*%(?:\s*(?:sugar|sweet|sweetness))?|\b(no|zero|half|full)\s+sugar\b")
+_SUGAR_WORDS = {"no": "0%", "zero": "0%", "half": "50%", "full": "100%"}
+_ICE_RE = re.compile(r"\b(no|less|light|regular|normal|extra|more)\s+ice\b")
+_ICE_WORDS = {"light": "less", "normal": "regular", "more": "extra"}
+_SIZE_RE = re.compile(r"\b(small|medium|regular|large|m|l|s)\b")
+_TOPPINGS_RE = re.compile(r"\bwith\b(.+)$")
+_ITEM_FILLER_RE = re.compile(r"\b(please|thanks|thank you|cups? of|size)\b")
+FAST_PATH_MIN_CONFIDENCE = 0.9
+
+# turns seen / answered locally; printed when the demo exits.
+FAST_PATH_STATS = Counter()
+
+def _fast_resolve_drink(text: str, catalog: Catalog):
+    name = " ".join(_tokens(text))
+    if not name:
+        return None
+    by_name = catalog.index.by_name
+    hit = by_name.get(name) or (by_name.get(name[:-1]) if name.endswith("s") else None)
+    if hit:
+        return hit
+    top = catalog.fuzzy.suggest(name, k=2)
+    if top and top[0]["confidence"] >= FAST_PATH_MIN_CONFIDENCE and (
+            len(top) == 1 or top[0]["confidence"] - top[1]["confidence"] >= FuzzyMatcher.AUTO_MARGIN):
+        return top[0]["name"]
+    return None
+
+def _parse_fast_item(segment: str, need_qty: bool, catalog: Catalog):
+    """One item phrase -> {name, size, qty, sugar, ice, toppings} or None if anything is unclear."""
+    item = {}
+    m = _SUGAR_RE.search(segment)
+    if m:
+        item["sugar"] = f"{m.group(1)}%" if m.group(1) else _SUGAR_WORDS[m.group(2)]
+        if item["sugar"] not in _SUGAR_LEVELS:
+            return None
+        segment = segment[:m.start()] + " " + segment[m.end():]
+    m = _ICE_RE.search(segment)
+    if m:
+        item["ice"] = f"{_ICE_WORDS.get(m.group(1), m.group(1))} ice"
+        segment = segment[:m.start()] + " " + segment[m.end():]
+    m = _TOPPINGS_RE.search(segment)
+    if m:
+        toppings = []
+        for spoken in re.split(r",|\band\b", m.group(1)):
+            if spoken.strip():
+                canon, _, _ = catalog.canon_toppings([spoken])
+                if not canon:
+                    return None
+                toppings += canon
+        item["toppings"] = toppings
+        segment = segment[:m.start()]
+    segment = segment.replace(",", " ").strip()
+
+    words = segment.split()
+    if words and (words[0].isdigit() or words[0] in _NUMBER_WORDS):
+        item["qty"] = int(words[0]) if words[0].isdigit() else _NUMBER_WORDS[words[0]]
+        if item["qty"] < 1:  # "0 large taro" would otherwise become one drink in normalize_line
+            return None
+        words = words[1:]
+    elif need_qty:
+        return None
+    sizes = [i for i, w in enumerate(words) if _SIZE_RE.fullmatch(w)]
+    if len(sizes) > 1:
+        return None
+    if sizes:
+        item["size"] = catalog.size_map.get(words.pop(sizes[0]))
+        if not item["size"]:
+            return None
+    name = _fast_resolve_drink(_ITEM_FILLER_RE.sub(" ", " ".join(words)), catalog)
+    if not name:
+        return None
+    item["name"] = name
+    return item
+
+def _size_word(size_key: str) -> str:
+    return _SIZE_WORDS.get(size_key.upper(), size_key)
+
+def _fast_price_reply(text: str, catalog: Catalog):
+    item = _parse_fast_item(_PRICE_FILLER_RE.sub(" ", _PRICE_RE.sub(" ", text)), need_qty=False, catalog=catalog)
+    if not item or item.get("qty", 1) != 1 or "sugar" in item or "ice" in item:
+        return None
+    tops = item.get("toppings", [])
+    extra = f" with {' and '.join(tops)}" if tops else ""
+    if "size" not in item:
+        *rest, last = [f"${catalog.unit_price(item['name'], s, tops):.2f} for a {_size_word(s)}"
+                       for s in catalog.index.sizes]
+        return f"{item['name']}{extra} is {', '.join(rest) + ' and ' if rest else ''}{last}."
+    price = tool_get_price(item["name"], item["size"], tops, catalog=catalog)
+    if not price.get("found"):
+        return None
+    return f"A {_size_word(item['size'])} {item['name']}{extra} is ${price['price']:.2f}."
+
+def _fast_order_reply(text: str, cart: Cart):
+    items = []
+    for segment in _ITEM_SPLIT_RE.split(_ORDER_LEAD_RE.sub("", text).strip()):
+        item = _parse_fast_item(segment, need_qty=True, catalog=cart.catalog)
+        if not item or "size" not in item:
+            return None
+        items.append(item)
+    if not items:
+        return None
+    result = cart.add(items)  # the drinks join the cart, so later turns can edit or check them out
+    if not result.get("ok"):
+        return None
+    reply = f"Got it: {result['readback']} Anything else?"
+    segments = _readback_segments(result)
+    _register_readback(reply, segments and ["Got it:"] + segments + ["Anything else?"])
+    return reply
+
+def fast_path_reply(text: str, cart: Cart = None):
+    """
+    Templated reply for a simple price question or order, or None to use the LLM.
+    Ordered drinks are added to cart (the demo's CART unless a session passes its own),
+    and both prices and orders use the cart's catalog.
+    """
+    FAST_PATH_STATS["turns"] += 1
+    cart = cart or CART
+    t = re.sub(r"[^a-z0-9%'$;, ]", " ", (text or "").lower().replace("-", " ")).strip()
+    reply = None
+    if t and not _FAST_BAIL_RE.search(t):
+        reply = _fast_price_reply(t, cart.catalog) if _PRICE_RE.search(t) else _fast_order_reply(t, cart)
+    if reply:
+        FAST_PATH_STATS["hits"] += 1
+    return reply
+
+def fast_path_hit_rate() -> float:
+    return FAST_PATH_STATS["hits"] / FAST_PATH_STATS["turns"] if FAST_PATH_STATS["turns"] else 0.0
@@ -0,0 +1,100 @@
+# Per-endpoint concurrency limits with backpressure for the async service.
+# Each upstream (STT, chat, TTS) gets its own semaphore. When all slots are busy
+# and too many requests are already waiting, or a slot does not free up within
+# the queue timeout, acquire() raises Overloaded. The caller can then shed the
+# turn (HTTP 503 + Retry-After) instead of piling more work on a saturated API.
+
+import asyncio
+import os
+import time
+from collections import Counter
+
+ENDPOINT_LIMITS = {
+    "stt": int(os.getenv("VOICE_AGENT_MAX_STT", "8")),
+    "chat": int(os.getenv("VOICE_AGENT_MAX_CHAT", "16")),
+    "tts": int(os.getenv("VOICE_AGENT_MAX_TTS", "8")),
+}
+MAX_QUEUED = int(os.getenv("VOICE_AGENT_MAX_QUEUED", "32"))           # waiters per endpoint
+QUEUE_TIMEOUT_S = float(os.getenv("VOICE_AGENT_QUEUE_TIMEOUT", "5"))  # longest wait for a slot
+
+
+class Overloaded(Exception):
+    """An upstream endpoint is saturated; retry after retry_after seconds."""
+
+    def __init__(self, endpoint: str, retry_after: float = 1.0):
+        super().__init__(f"{endpoint} is saturated, retry later")
+        self.endpoint, self.retry_after = endpoint, retry_after
+
+
+class _Slot:
+    __slots__ = ("limiter", "endpoint")
+
+    def __init__(self, limiter: "UpstreamLimiter", endpoint: str):
+        self.limiter, self.endpoint = limiter, endpoint
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.endpoint)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.limiter.release(self.endpoint)
+        return False
+
+
+class UpstreamLimiter:
+    """
+    Semaphores per upstream endpoint: `async with limiter.slot("chat"): ...`.
+    Create it inside the running event loop. stats counts admitted, rejected and
+    timed-out requests per endpoint; in_flight/queued are live gauges.
+    """
+
+    def __init__(self, limits: dict = None, max_queued: int = MAX_QUEUED, queue_timeout: float = QUEUE_TIMEOUT_S):
+        self.limits = dict(limits or ENDPOINT_LIMITS)
+        self.max_queued, self.queue_timeout = max_queued, queue_timeout
+        self._sems = {name: asyncio.Semaphore(n) for name, n in self.limits.items()}
+        self.in_flight = Counter()
+        self.queued = Counter()
+        self.stats = Counter()
+        self.wait_ms = Counter()
+
+    def slot(self, endpoint: str) -> _Slot:
+        return _Slot(self, endpoint)
+
+    async def acquire(self, endpoint: str):
+        sem = self._sems[endpoint]
+        started = time.perf_counter()
+        if not sem.locked():
+            await sem.acquire()  # a free slot: taken without suspending
+        elif self.queued[endpoint] >= self.max_queued:
+            self.stats[f"{endpoint}.rejected"] += 1
+            raise Overloaded(endpoint, self.queue_timeout)
+        else:
+            self.queued[endpoint] += 1
+            try:
+                await asyncio.wait_for(sem.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.stats[f"{endpoint}.timed_out"] += 1
+                raise Overloaded(endpoint, self.queue_timeout) from None
+            finally:
+                self.queued[endpoint] -= 1
+        self.in_flight[endpoint] += 1
+        self.stats[f"{endpoint}.admitted"] += 1
+        self.wait_ms[endpoint] += round((time.perf_counter() - started) * 1000)
+
+    def release(self, endpoint: str):
+        self.in_flight[endpoint] -= 1
+        self._sems[endpoint].release()
+
+    def snapshot(self) -> dict:
+        return {
+            name: {
+                "limit": limit,
+                "in_flight": self.in_flight[name],
+                "queued": self.queued[name],
+                "admitted": self.stats[f"{name}.admitted"],
+                "rejected": self.stats[f"{name}.rejected"],
+                "timed_out": self.stats[f"{name}.timed_out"],
+                "avg_wait_ms": round(self.wait_ms[name] / max(1, self.stats[f"{name}.admitted"]), 1),
+            }
+            for name, limit in self.limits.items()
+        }
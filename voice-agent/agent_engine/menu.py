@@ -0,0 +1,815 @@
+# Angel Tea catalog: the full menu with explicit M/L prices and toppings, plus the
+# lookup structures built from it once at import (name index, fuzzy and phonetic
+# matching, topping trie, integer-cents pricing, recommendation facets).
+# Pure Python data and code: importing it needs no network, credentials or openai.
+
+import hashlib, json, re
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from itertools import chain
+from pathlib import Path
+from typing import Optional
+
+try:
+    import numpy as np  # optional: vectorized batch pricing
+except ImportError:
+    np = None
+
+# ---------- Full Angel Tea Menu (explicit M/L pricing) ----------
+# Conventions:
+# - prices: dict with 'm' and 'l'
+# - topseller: boolean for items marked with a star or ranking on the menu
+# - included_toppings: toppings bundled at $0.00 for that drink (rare)
+
+TOPPING_PRICE = 0.80
+
+TOPPINGS = [
+    "brown sugar boba", "coconut jelly", "herbal jelly", "sago",
+    "oreo crumbs", "milk foam", "red bean", "chocolate",
+    "mango popping bubbles", "green apple popping bubbles",
+    "lychee popping bubbles", "blueberry popping bubbles",
+    "strawberry popping bubbles"
+]
+
+TOPPING_SYNONYMS = {
+    "boba": "brown sugar boba",
+    "tapioca": "brown sugar boba",
+    "pearls": "brown sugar boba",
+    "milk cap": "milk foam",
+    "cheese foam": "milk foam",
+    "oreo": "oreo crumbs",
+    "mango popping": "mango popping bubbles",
+    "green apple popping": "green apple popping bubbles",
+    "lychee popping": "lychee popping bubbles",
+    "blueberry popping": "blueberry popping bubbles",
+    "strawberry popping": "strawberry popping bubbles",
+}
+
+MENU = {
+    # ---------------- ANGEL MILK TEA ----------------
+    "Angel Milk Tea": {"category":"milk_tea","prices":{"m":5.99,"l":6.89},"topseller": True},
+    "Jasmine Milk Tea": {"category":"milk_tea","prices":{"m":5.99,"l":6.89}},
+    "Coffee Milk Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49}},
+    "Taro Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19},"topseller": True},
+    "Matcha Milk Tea": {"category":"milk_tea","prices":{"m":6.79,"l":7.69}},
+    "THAI Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
+    "Oreo Milk Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49},"topseller": True},
+    "Mango Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
+    "Strawberry Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
+    "Lychee Jasmine Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
+    "Brown Sugar Bubble Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49},"topseller": True,
+                               "included_toppings":["brown sugar boba"]},
+    "Milk Foam Caramel Milk Tea": {"category":"milk_tea","prices":{"m":7.39,"l":8.29},"topseller": True,
+                                   "included_toppings":["milk foam"]},
+
+    # ---------------- ANGEL FRUIT TEA ----------------
+    "3 Brother 4 Season Spring Tea": {"category":"fruit_tea","prices":{"m":7.39,"l":8.29},"topseller": True,
+                                      "included_toppings":["brown sugar boba","sago","coconut jelly"]},
+    "Mango Passion Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
+    "Passion Fruit Green Tea": {"category":"fruit_tea","prices":{"m":6.25,"l":7.19}},
+    "Bayberry Jasmine Green Tea": {"category":"fruit_tea","prices":{"m":6.25,"l":7.19}},
+    "Pineapple Mango Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69}},
+    "Peach Coconut Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
+    "Strawberry Pineapple Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
+    "Milk Foam Honey Peach Black Tea": {"category":"fruit_tea","prices":{"m":7.39,"l":8.29},
+                                        "included_toppings":["milk foam"]},
+    "Honey Lemon Black Tea": {"category":"fruit_tea","prices":{"m":6.49,"l":7.39}},
+    "Chinese Sour Plum Drink": {"category":"fruit_tea","prices":{"m":5.99,"l":6.89}},
+
+    # ---------------- LATTE SERIES ----------------
+    "Strawberry Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69},
+                                "included_toppings":["brown sugar boba","sago","coconut jelly"]},
+    "Kiwi Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69}},
+    "Peach Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69}},
+    "Strawberry Ube Latte": {"category":"latte","prices":{"m":6.79,"l":7.69},
+                             "included_toppings":["brown sugar boba","sago","coconut jelly"]},
+    "Brown Sugar Bubble Latte": {"category":"latte","prices":{"m":6.59,"l":7.49},
+                                 "included_toppings":["brown sugar boba"]},
+
+    # ---------------- SAGO NECTAR (Caffeine Free) ----------------
+    "Mango Pomelo Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49},"topseller": True},
+    "Strawberry Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49},"topseller": True},
+    "Pina Colada Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
+    "Peach Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
+    "Lychee Bayberry Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
+
+    # ---------------- SPARKLING (Caffeine Free, flavor variants) ----------------
+    "Sparkling Strawberry": {"category":"sparkling","prices":{"m":7.39,"l":8.29},"topseller": True},
+    "Sparkling Pineapple": {"category":"sparkling","prices":{"m":7.39,"l":8.29},"topseller": True},
+    "Sparkling Mango": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+    "Sparkling Kiwi": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+    "Sparkling Passion Fruit": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+    "Sparkling Peach": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+    "Sparkling Bayberry": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+    "Sparkling Orange": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
+
+    # ---------------- YOGURT SMOOTHIE (Caffeine Free, flavor variants) ----------------
+    "Mango Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Strawberry Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Passion Fruit Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Lychee Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Pineapple Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Peach Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Bayberry Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Orange Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Kiwi Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+    "Oreo Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
+
+    # ---------------- HERBAL HEALTH TEA ----------------
+    "Chrysanthemum Goji Berry Cassia Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
+    "Longan Rose Ginger Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
+    "Jasmine Date Goji Berry Rose Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
+    "Brown Sugar Date Ginger Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
+    "Ginseng Mulberry Chrysanthemum Goji Berry Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
+
+    # ---------------- MILK SLUSH (Caffeine Free, flavor variants) ----------------
+    "Mango Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Passion Fruit Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Strawberry Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Lychee Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Pineapple Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Peach Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Bayberry Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Orange Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Kiwi Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Oreo Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Matcha Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+    "Taro Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
+}
+
+VALID_SUGAR = {"0%","25%","50%","75%","100%"}
+VALID_ICE = {"no ice","less ice","regular ice","extra ice"}
+_SUGAR_LEVELS = frozenset(s.lower() for s in VALID_SUGAR)
+_ICE_LEVELS = frozenset(i.lower() for i in VALID_ICE)
+
+SIZE_MAP = {
+    "m":"m", "medium":"m", "regular":"m", "s":"m", "small":"m",
+    "l":"l", "large":"l"
+}
+
+def _normalize_name(name: str) -> str:
+    return (name or "").strip().lower()
+
+def _tokens(text: str) -> list:
+    return re.findall(r"[a-z0-9%]+", (text or "").lower())
+
+# ---------- Menu Index (built once at load time) ----------
+# - by_name: normalized name -> menu key, so exact hits are a single dict lookup
+# - by_token: token -> item ids, narrows substring / partial-name matches to a few candidates
+# - records: per-item prices, included toppings and topseller flag, precomputed for pricing
+# - sizes: the menu's price keys in first-seen order ("m", "l")
+class MenuIndex:
+    PARTIAL_CACHE_MAX = 4096
+
+    def __init__(self, menu: dict):
+        self.keys = list(menu.keys())
+        self.norm = [_normalize_name(k) for k in self.keys]
+        self.by_name = {}
+        self.by_token = {}
+        for i, n in enumerate(self.norm):
+            self.by_name.setdefault(n, self.keys[i])
+            for tok in set(_tokens(n)):
+                self.by_token.setdefault(tok, set()).add(i)
+        self.records = {
+            k: {
+                "category": m["category"],
+                "prices": m["prices"],
+                "included": frozenset(t.lower() for t in m.get("included_toppings", [])),
+                "topseller": m.get("topseller", False),
+            }
+            for k, m in menu.items()
+        }
+        self.sizes = tuple(dict.fromkeys(chain.from_iterable(m["prices"] for m in menu.values())))
+        self._partial = {}
+
+    def _ids_for(self, tok: str) -> frozenset:
+        """Item ids with a token containing `tok`; memoized per query token."""
+        ids = self._partial.get(tok)
+        if ids is None:
+            found = set()
+            for vocab_tok, vocab_ids in self.by_token.items():
+                if tok in vocab_tok:
+                    found |= vocab_ids
+            ids = frozenset(found)
+            if len(self._partial) < self.PARTIAL_CACHE_MAX:
+                self._partial[tok] = ids
+        return ids
+
+    def find(self, name: str):
+        """Exact normalized match first, then the first menu item containing `name`."""
+        key = _normalize_name(name)
+        if not key:
+            return None
+        hit = self.by_name.get(key)
+        if hit:
+            return hit
+        # every token of a substring lies inside some token of the full name
+        cands = None
+        for tok in _tokens(key):
+            ids = self._ids_for(tok)
+            cands = ids if cands is None else cands & ids
+            if not cands:
+                return None
+        for i in sorted(cands) if cands is not None else range(len(self.keys)):
+            if key in self.norm[i]:
+                return self.keys[i]
+        return None
+
+
+# ---------- Fuzzy Matching (trigrams + bounded edit distance) ----------
+def _trigrams(text: str) -> set:
+    t = f"  {' '.join(_tokens(text))} "
+    return {t[i:i+3] for i in range(len(t) - 2)}
+
+def _bounded_edit_distance(a: str, b: str, max_dist: int) -> int:
+    """Levenshtein distance limited to a diagonal band; max_dist + 1 once it must exceed max_dist."""
+    if abs(len(a) - len(b)) > max_dist:
+        return max_dist + 1
+    over = max_dist + 1
+    prev = [j if j <= max_dist else over for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        ca = a[i-1]
+        lo, hi = max(1, i - max_dist), min(len(b), i + max_dist)
+        cur = [over] * (len(b) + 1)
+        cur[0] = i if i <= max_dist else over
+        row_min = cur[0]
+        for j in range(lo, hi + 1):
+            v = prev[j-1] if ca == b[j-1] else prev[j-1] + 1
+            if prev[j] + 1 < v:
+                v = prev[j] + 1
+            if cur[j-1] + 1 < v:
+                v = cur[j-1] + 1
+            cur[j] = v
+            if v < row_min:
+                row_min = v
+        if row_min > max_dist:
+            return over
+        prev = cur
+    return min(prev[-1], over)
+
+class FuzzyMatcher:
+    """
+    Ranked approximate lookup over menu names.
+    Trigram postings pick a short candidate list (very common trigrams are skipped,
+    so large menus stay cheap), then bounded edit distance scores each candidate
+    against the full name and against its leading tokens ("mango pamelo sago").
+    """
+    CANDIDATES = 8
+    MIN_SHARED = 0.6
+    COMMON_FRACTION = 0.2
+    AUTO_CONFIDENCE = 0.8
+    AUTO_MARGIN = 0.08
+
+    def __init__(self, names: list):
+        self.names = list(names)
+        self.norm = [" ".join(_tokens(n)) for n in self.names]
+        self.postings = {}
+        for i, n in enumerate(self.norm):
+            for g in _trigrams(n):
+                self.postings.setdefault(g, []).append(i)
+        self.common = max(8, int(len(self.names) * self.COMMON_FRACTION))
+
+    def _score(self, q: str, i: int) -> float:
+        name = self.norm[i]
+        q_toks = q.count(" ") + 1
+        head = " ".join(name.split(" ")[:q_toks])
+        best = 0.0
+        targets = ((name, 1.0),) if head == name else ((name, 1.0), (head, 0.95))
+        for target, weight in targets:
+            longest = max(len(q), len(target))
+            max_dist = max(1, longest // 3)
+            d = _bounded_edit_distance(q, target, max_dist)
+            if d <= max_dist:
+                best = max(best, weight * (1 - d / longest))
+        return best
+
+    def suggest(self, query: str, k: int = 3) -> list:
+        """Top-k [{"name", "confidence"}] for query, best first."""
+        q = " ".join(_tokens(query))
+        if not q:
+            return []
+        grams = _trigrams(q)
+        lists = [self.postings[g] for g in grams if g in self.postings]
+        rare = [ids for ids in lists if len(ids) <= self.common] or lists
+        counts = Counter(chain.from_iterable(rare))
+        top = counts.most_common(self.CANDIDATES)
+        floor = top[0][1] * self.MIN_SHARED if top else 0
+        scored = []
+        for i, shared in top:
+            if shared < floor:
+                break
+            conf = self._score(q, i)
+            if conf > 0:
+                scored.append((round(conf, 3), -i))
+        scored.sort(reverse=True)
+        return [{"name": self.names[-i], "confidence": c} for c, i in scored[:k]]
+
+    def resolve(self, query: str):
+        """Best name if it is confident and clearly ahead of the runner-up, else None."""
+        top = self.suggest(query, k=2)
+        if not top or top[0]["confidence"] < self.AUTO_CONFIDENCE:
+            return None
+        if len(top) > 1 and top[0]["confidence"] - top[1]["confidence"] < self.AUTO_MARGIN:
+            return None
+        return top[0]["name"]
+
+
+# ---------- Phonetic Index (STT misrecognitions) ----------
+# Metaphone-style keys computed over the whole phrase with spaces removed, so
+# "long gun" / "lung an" -> Longan and "bay berry" -> Bayberry share a key.
+_PHONETIC_DIGRAPHS = (("tch","x"), ("sch","sk"), ("ph","f"), ("sh","x"), ("ch","x"), ("th","0"),
+                      ("ck","k"), ("dg","j"), ("gh",""), ("wh","w"), ("kn","n"), ("wr","r"))
+_PHONETIC_CODES = {"b":"P", "d":"T", "q":"K", "x":"KS", "z":"S", "v":"F", "w":"", "h":""}
+
+def _letters(text: str) -> str:
+    return re.sub(r"[^a-z]", "", (text or "").lower())
+
+def _phonetic_key(text: str) -> str:
+    s = _letters(text)
+    for a, b in _PHONETIC_DIGRAPHS:
+        s = s.replace(a, b)
+    out = []
+    for i, c in enumerate(s):
+        nxt = s[i+1] if i + 1 < len(s) else ""
+        if c in "aeiouy":
+            code = "A" if i == 0 else ""
+        elif c in "cg":
+            code = ("S" if c == "c" else "J") if nxt in ("e", "i", "y") else "K"
+        else:
+            code = _PHONETIC_CODES.get(c, c.upper())
+        for ch in code:
+            if not out or out[-1] != ch:
+                out.append(ch)
+    return "".join(out)
+
+class PhoneticIndex:
+    """
+    Phonetic key -> names. An exact key hit wins; otherwise only a near-full key
+    (same first code, length and edit distance within 1, keys of MIN_NEAR_KEY+ codes)
+    counts. Short keys collide easily ("boba", "pie" and "whip" are all "P"), so an
+    exact hit on one also needs the spelling to start with the same letter and be
+    about as long. Anything looser would substitute unrelated words ("bread", "mint")
+    for real items; those return None and the caller reports not found.
+    """
+    MIN_NEAR_KEY = 4
+
+    def __init__(self, names, aliases: dict = None):
+        self.by_key = {}  # key -> [(letters of the indexed phrase, name)]
+        for n in names:
+            self.by_key.setdefault(_phonetic_key(n), []).append((_letters(n), n))
+        for alias, target in (aliases or {}).items():
+            self.by_key.setdefault(_phonetic_key(alias), []).append((_letters(alias), target))
+
+    def resolve(self, query: str):
+        key = _phonetic_key(query)
+        if not key:
+            return None
+        if len(key) < self.MIN_NEAR_KEY:
+            letters = _letters(query)
+            hits = {n for phrase, n in self.by_key.get(key, ())
+                    if phrase[:1] == letters[:1] and abs(len(phrase) - len(letters)) <= 1}
+        else:
+            hits = {n for _, n in self.by_key.get(key, ())}
+            if not hits:
+                hits = {n for k, entries in self.by_key.items()
+                        if k[:1] == key[:1] and abs(len(k) - len(key)) <= 1
+                        and _bounded_edit_distance(key, k, 1) <= 1
+                        for _, n in entries}
+        return hits.pop() if len(hits) == 1 else None
+
+TOPPING_PHONETIC = PhoneticIndex(TOPPINGS, aliases=TOPPING_SYNONYMS)
+
+# How often each lookup path had to step in; printed when the demo exits.
+LOOKUP_STATS = Counter()
+
+# ---------- Topping Matcher (token trie, built once) ----------
+class ToppingMatcher:
+    """
+    Canonicalizes spoken toppings in one pass over their tokens:
+    1) exact phrase (topping name or synonym);
+    2) the phrase is part of exactly one topping ("coconut" -> coconut jelly);
+    3) longest topping/synonym phrase found inside the text ("extra boba please").
+    Several equally good toppings ("bubbles") is ambiguous: no canonical, all options
+    returned in TOPPINGS order, so the same input always gives the same answer.
+    """
+    CACHE_MAX = 4096
+    GENERIC_WORDS = frozenset({"sugar", "milk"})  # describe the drink ("50% sugar"), not a topping on their own
+
+    def __init__(self, toppings: list, synonyms: dict):
+        self.rank = {t: i for i, t in enumerate(toppings)}
+        self.phrases = {" ".join(_tokens(t)): t for t in toppings}
+        for alias, target in synonyms.items():
+            self.phrases.setdefault(" ".join(_tokens(alias)), target)
+        self.trie = {}
+        for phrase, target in self.phrases.items():
+            node = self.trie
+            for tok in phrase.split(" "):
+                node = node.setdefault(tok, {})
+            node[None] = target
+        self.parts = {}
+        for t in toppings:
+            toks = _tokens(t)
+            for i in range(len(toks)):
+                for j in range(i + 1, len(toks) + 1):
+                    part = " ".join(toks[i:j])
+                    if part not in self.GENERIC_WORDS:
+                        self.parts.setdefault(part, set()).add(t)
+        self._cache = {}
+
+    def _options(self, found) -> tuple:
+        return tuple(sorted(set(found), key=self.rank.get))
+
+    def _scan(self, toks: list) -> tuple:
+        best_len, found = 0, []
+        for start in range(len(toks)):
+            node, length = self.trie, 0
+            for tok in toks[start:]:
+                node = node.get(tok)
+                if node is None:
+                    break
+                length += 1
+                if None in node:
+                    if length > best_len:
+                        best_len, found = length, [node[None]]
+                    elif length == best_len:
+                        found.append(node[None])
+        return self._options(found)
+
+    def match(self, name: str) -> tuple:
+        """(canonical or None, options); options has several entries only when ambiguous."""
+        toks = _tokens(name)
+        if not toks:
+            return None, ()
+        key = " ".join(toks)
+        hit = self._cache.get(key)
+        if hit is None:
+            if key in self.phrases:
+                options = (self.phrases[key],)
+            else:
+                options = self._options(self.parts.get(key, ())) or self._scan(toks)
+            hit = (options[0] if len(options) == 1 else None, options)
+            if len(self._cache) < self.CACHE_MAX:
+                self._cache[key] = hit
+        return hit
+
+TOPPING_MATCHER = ToppingMatcher(TOPPINGS, TOPPING_SYNONYMS)
+
+def _match_topping(name: str) -> tuple:
+    ct, options = TOPPING_MATCHER.match(name)
+    if ct or options or not (name or "").strip():
+        return ct, options
+    ct = TOPPING_PHONETIC.resolve(name)
+    LOOKUP_STATS["topping_phonetic_rescue" if ct else "topping_miss"] += 1
+    return ct, (ct,) if ct else ()
+
+def _canon_topping(name: str):
+    return _match_topping(name)[0]
+
+def _canon_toppings(toppings: list) -> tuple:
+    """Canonicalize a line's toppings once: (canonical list, {spoken: options} for ambiguous ones)."""
+    canon, ambiguous = [], {}
+    for t in toppings or []:
+        ct, options = _match_topping(t)
+        if ct:
+            canon.append(ct)
+        elif options:
+            ambiguous[t] = list(options)
+    return canon, ambiguous
+
+# ---------- Pricing Engine (integer cents) ----------
+def _to_cents(amount: float) -> int:
+    return int(round(amount * 100))
+
+def _from_cents(cents: int) -> float:
+    return cents / 100
+
+class PricingEngine:
+    """
+    Integer-cents price table indexed by (item id, size) plus an included-topping
+    mask, so totals are exact. quote() prices the lines of many carts in one
+    vectorized pass when NumPy is available, and falls back to plain lists otherwise.
+    """
+
+    def __init__(self, index: MenuIndex, toppings: list, topping_price: float):
+        self.item_ids = {k: i for i, k in enumerate(index.keys)}
+        self.size_ids = {s: i for i, s in enumerate(index.sizes)}
+        self.topping_ids = {t: i for i, t in enumerate(toppings)}
+        self.topping_cents = _to_cents(topping_price)
+        self.table = [[_to_cents(index.records[k]["prices"][s]) for s in index.sizes] for k in index.keys]
+        self.included = [[t in index.records[k]["included"] for t in toppings] for k in index.keys]
+        if np is not None:
+            self.table = np.array(self.table, dtype=np.int64)
+            self.included = np.array(self.included, dtype=bool)
+
+    def unit_cents(self, item_key: str, size_key: str, canon_toppings: list) -> int:
+        i = self.item_ids[item_key]
+        row = self.included[i]
+        extra = sum(1 for t in canon_toppings if not row[self.topping_ids[t]])
+        return int(self.table[i][self.size_ids[size_key]]) + extra * self.topping_cents
+
+    def quote(self, carts: list) -> tuple:
+        """
+        carts: [[{name, size, qty, toppings}, ...], ...] with canonical names/toppings.
+        Returns (unit cents per line, line cents per line, total cents per cart);
+        lines are flattened in cart order.
+        """
+        cart_idx, item_idx, size_idx, qty, tops = [], [], [], [], []
+        for c, lines in enumerate(carts):
+            for line in lines:
+                cart_idx.append(c)
+                item_idx.append(self.item_ids[line["name"]])
+                size_idx.append(self.size_ids[line["size"].lower()])
+                qty.append(line["qty"])
+                tops.append([self.topping_ids[t] for t in line["toppings"]])
+
+        if np is None:
+            unit = [self.table[i][s] + self.topping_cents * sum(1 for t in ts if not self.included[i][t])
+                    for i, s, ts in zip(item_idx, size_idx, tops)]
+            line_cents = [u * q for u, q in zip(unit, qty)]
+            totals = [0] * len(carts)
+            for c, lc in zip(cart_idx, line_cents):
+                totals[c] += lc
+            return unit, line_cents, totals
+
+        items = np.array(item_idx, dtype=np.int64)
+        counts = np.zeros((len(items), len(self.topping_ids)), dtype=np.int64)
+        rows = np.repeat(np.arange(len(items)), [len(ts) for ts in tops])
+        np.add.at(counts, (rows, np.fromiter(chain.from_iterable(tops), dtype=np.int64, count=len(rows))), 1)
+        extra = (counts * ~self.included[items]).sum(axis=1) if len(items) else counts.sum(axis=1)
+        unit = self.table[items, np.array(size_idx, dtype=np.int64)] + extra * self.topping_cents
+        line_cents = unit * np.array(qty, dtype=np.int64)
+        totals = np.zeros(len(carts), dtype=np.int64)
+        np.add.at(totals, np.array(cart_idx, dtype=np.int64), line_cents)
+        return unit.tolist(), line_cents.tolist(), totals.tolist()
+
+# get_menu projections: "names" and "prices" are compact pipe-joined rows, "full" is the raw dicts.
+MENU_FIELDS = ("names", "prices", "full")
+MENU_PAGE_DEFAULT = 10
+MENU_PAGE_MAX = 50
+
+def _project_menu_row(row: dict, fields: str):
+    if fields == "names":
+        return row["name"]
+    if fields == "prices":
+        prices = "|".join(f"{p:.2f}" for p in row["prices"].values())
+        return f"{row['name']}|{prices}|{'1' if row['topseller'] else ''}"
+    return row
+
+# ---------- Facet Index (recommendations) ----------
+CAFFEINE_FREE_CATEGORIES = {"sago_nectar", "sparkling", "yogurt_smoothie", "milk_slush"}
+FRUIT_WORDS = {"mango", "passion", "strawberry", "peach", "pineapple", "kiwi", "lychee", "bayberry",
+               "orange", "lemon", "plum", "pomelo", "coconut", "pina", "colada", "apple", "blueberry"}
+# Web menu data; its caffeine_free / popular tags are merged in when the file is present.
+DRINKS_JSON = Path(__file__).resolve().parents[2] / "app" / "api" / "drinks.json"
+
+def _load_web_tags(path: Path) -> dict:
+    """Compact name (letters/digits only) -> tags from drinks.json; {} if unavailable."""
+    try:
+        with open(path) as f:
+            menu = json.load(f)["menu"]
+    except (OSError, ValueError, KeyError):
+        return {}
+    return {re.sub(r"[^a-z0-9]", "", d["name"].lower()): d.get("tags", {}) for d in menu.values()}
+
+class FacetIndex:
+    """
+    Bitset per facet value over a MenuIndex's item ids, so filters are integer ANDs:
+    category:<c>, caffeine_free, topseller, popular, fruit, flavor:<token>, topping:<t>.
+    Price bands use per-size price lists sorted once.
+    """
+
+    def __init__(self, index: MenuIndex, web_tags: dict = None, size_map: dict = SIZE_MAP):
+        self.index, self.size_map = index, size_map
+        self.all = (1 << len(index.keys)) - 1
+        self.bits = {}
+        web_tags = web_tags or {}
+        for i, key in enumerate(index.keys):
+            rec = index.records[key]
+            tags = web_tags.get(re.sub(r"[^a-z0-9]", "", key.lower()), {})
+            facets = [f"category:{rec['category']}"]
+            facets += [f"topping:{t}" for t in rec["included"]]
+            facets += [f"flavor:{tok}" for tok in _tokens(key)]
+            if rec["category"] in CAFFEINE_FREE_CATEGORIES or tags.get("caffeine_free"):
+                facets.append("caffeine_free")
+            if rec["topseller"]:
+                facets.append("topseller")
+            if tags.get("popular"):
+                facets.append("popular")
+            if FRUIT_WORDS & set(_tokens(key)):
+                facets.append("fruit")
+            for f in facets:
+                self.bits[f] = self.bits.get(f, 0) | (1 << i)
+        self.by_price = {
+            s: sorted((_to_cents(index.records[k]["prices"][s]), i) for i, k in enumerate(index.keys))
+            for s in index.sizes
+        }
+
+    def _price_band(self, size_key: str, min_cents: int = None, max_cents: int = None) -> int:
+        rows = self.by_price[size_key]
+        lo = 0 if min_cents is None else bisect_left(rows, (min_cents, -1))
+        hi = len(rows) if max_cents is None else bisect_right(rows, (max_cents, len(rows)))
+        mask = 0
+        for _, i in rows[lo:hi]:
+            mask |= 1 << i
+        return mask
+
+    def select(self, filters: dict) -> list:
+        """Matching menu keys, topsellers first, then cheapest (for the requested size)."""
+        f = filters or {}
+        size_key = self.size_map.get(str(f.get("size") or "m").strip().lower(), self.index.sizes[0])
+        mask = self.all
+        for flag in ("caffeine_free", "topseller", "popular", "fruit"):
+            if f.get(flag):
+                mask &= self.bits.get(flag, 0)
+        if f.get("category"):
+            mask &= self.bits.get(f"category:{_normalize_name(f['category']).replace(' ', '_')}", 0)
+        if f.get("flavor"):
+            for tok in _tokens(f["flavor"]):
+                mask &= self.bits.get(f"flavor:{tok}", 0)
+        if f.get("topping"):
+            ct = _canon_topping(f["topping"])
+            mask &= self.bits.get(f"topping:{ct}", 0) if ct else 0
+        if f.get("min_price") is not None or f.get("max_price") is not None:
+            lo = _to_cents(float(f["min_price"])) if f.get("min_price") is not None else None
+            hi = _to_cents(float(f["max_price"])) if f.get("max_price") is not None else None
+            mask &= self._price_band(size_key, lo, hi)
+        top = self.bits.get("topseller", 0)
+        ids = [i for i in range(len(self.index.keys)) if mask >> i & 1]
+        ids.sort(key=lambda i: (not top >> i & 1, self.index.records[self.index.keys[i]]["prices"][size_key], i))
+        return [self.index.keys[i] for i in ids]
+
+_WEB_TAGS = _load_web_tags(DRINKS_JSON)
+
+# Fingerprint of everything tool results are computed from (menu, toppings, web tags).
+# Caches of tool results key on it, so a changed menu never serves stale answers.
+def menu_version(menu: dict, toppings: list, synonyms: dict, topping_price: float, web_tags: dict) -> str:
+    return hashlib.sha256(json.dumps(
+        [menu, toppings, synonyms, topping_price, web_tags], sort_keys=True, default=sorted,
+    ).encode()).hexdigest()[:12]
+
+MENU_VERSION = menu_version(MENU, TOPPINGS, TOPPING_SYNONYMS, TOPPING_PRICE, _WEB_TAGS)
+
+
+# ---------- Catalog (one menu and everything built from it) ----------
+class Catalog:
+    """
+    A menu with the structures built from it once: name index, fuzzy and phonetic
+    matchers, integer-cents pricing, facets and the sorted get_menu rows. Sizes are
+    the menu's price keys and size_map maps spoken sizes onto them; toppings are the
+    subset of TOPPINGS this menu sells (none for a menu without toppings). CATALOG
+    (the Angel Tea menu) backs the module-level helpers below; a front end with its
+    own menu builds another Catalog and gives it to its Cart.
+    """
+
+    def __init__(self, menu: dict, size_map: dict = SIZE_MAP, web_tags: dict = None,
+                 toppings: list = TOPPINGS, topping_price: float = TOPPING_PRICE):
+        self.menu, self.size_map = menu, size_map
+        self.toppings, self.topping_price = tuple(toppings), topping_price
+        self.index = MenuIndex(menu)
+        self.fuzzy = FuzzyMatcher(menu.keys())
+        self.phonetic = PhoneticIndex(menu.keys())
+        self.pricing = PricingEngine(self.index, self.toppings, topping_price)
+        self.categories = tuple(dict.fromkeys(m["category"] for m in menu.values()))
+        self.facets = FacetIndex(self.index, web_tags, size_map)
+        self.columns = "name|" + "|".join(s.upper() for s in self.index.sizes) + "|topseller"
+        # Full rows sorted once (topsellers first); menu_list only filters.
+        self.rows = sorted(
+            (
+                {
+                    "name": name,
+                    "category": meta["category"],
+                    "prices": meta["prices"],
+                    "topseller": meta.get("topseller", False),
+                    "included_toppings": meta.get("included_toppings", [])
+                }
+                for name, meta in menu.items()
+            ),
+            key=lambda x: (not x["topseller"], x["category"], x["name"])
+        )
+        self.rows_by_name = {row["name"]: row for row in self.rows}
+
+    def find_item(self, name: str):
+        hit = self.index.find(name) or self.fuzzy.resolve(name)
+        if hit or not name:
+            return hit
+        hit = self.phonetic.resolve(name)
+        LOOKUP_STATS["item_phonetic_rescue" if hit else "item_miss"] += 1
+        return hit
+
+    def canon_toppings(self, toppings: list) -> tuple:
+        """
+        _canon_toppings limited to what this menu sells: (canonical list, {spoken: options}
+        for ambiguous ones, [spoken] it does not sell). Unrecognized words are dropped.
+        """
+        canon, ambiguous, unavailable = [], {}, []
+        for t in toppings or []:
+            matched = _match_topping(t)[1]
+            options = [o for o in matched if o in self.pricing.topping_ids]
+            if len(options) == 1:
+                canon.append(options[0])
+            elif options:
+                ambiguous[t] = options
+            elif matched:
+                unavailable.append(t)
+        return canon, ambiguous, unavailable
+
+    def unit_price(self, item_key: str, size_key: str, canon_toppings: list) -> float:
+        """Price one drink; toppings must already be canonical."""
+        return _from_cents(self.pricing.unit_cents(item_key, size_key, canon_toppings))
+
+    def price(self, name: str, size: str = None, toppings: list = None) -> Optional[float]:
+        """Return price for name + size. If toppings provided, include topping charges."""
+        item_key = self.find_item(name)
+        if not item_key:
+            return None
+        if not size:
+            return None  # force caller to specify the size for price accuracy
+        size_key = self.size_map.get(size.strip().lower())
+        if not size_key:
+            return None
+        canon, ambiguous, unavailable = self.canon_toppings(toppings)
+        if ambiguous or unavailable:
+            return None
+        return self.unit_price(item_key, size_key, canon)
+
+    def menu_list(self, query: str = None):
+        q = (query or "").strip().lower()
+        return [row for row in self.rows if not q or q in row["name"].lower() or q in row["category"]]
+
+    def normalize_line(self, it: dict) -> tuple:
+        """One requested item -> (normalized line without prices, None) or (None, error)."""
+        name = it.get("name","").strip()
+        size = (it.get("size") or "m").strip().lower()
+        qty = int(it.get("qty") or 1)
+        sugar = (it.get("sugar") or "100%").strip().lower()
+        ice = (it.get("ice") or "regular ice").strip().lower()
+        toppings = it.get("toppings") or []
+
+        if sugar not in _SUGAR_LEVELS:
+            sugar = "100%"
+        if ice not in _ICE_LEVELS:
+            ice = "regular ice"
+
+        item_key = self.find_item(name)
+        size_key = self.size_map.get(size)
+        if not item_key or not size_key:
+            return None, f"Item or size not found: {name} ({size})"
+        canon_toppings, ambiguous, unavailable = self.canon_toppings(toppings)
+        if ambiguous:
+            spoken, options = next(iter(ambiguous.items()))
+            return None, f"Topping is ambiguous: {spoken} (one of: {', '.join(options)})"
+        if unavailable:
+            return None, f"Topping not available: {unavailable[0]}"
+
+        return {
+            "name": item_key,
+            "size": size_key.upper(),
+            "qty": qty,
+            "sugar": sugar,
+            "ice": ice,
+            "toppings": canon_toppings,
+        }, None
+
+    def calc_totals(self, carts: list) -> list:
+        """
+        Price many carts (e.g. catering orders or order-history re-pricing) with one
+        PricingEngine.quote call. Returns one (result, error) pair per cart, same as calc_total.
+        """
+        carts_lines, errors = [], []
+        for items in carts:
+            lines, err = [], None
+            for it in items:
+                line, err = self.normalize_line(it)
+                if err:
+                    break
+                lines.append(line)
+            carts_lines.append([] if err else lines)
+            errors.append(err)
+
+        unit, line_cents, totals = self.pricing.quote(carts_lines)
+        out, pos = [], 0
+        for lines, err, total in zip(carts_lines, errors, totals):
+            if err:
+                out.append((None, err))
+                continue
+            for line in lines:
+                line["unit_price"] = _from_cents(unit[pos])
+                line["line_total"] = _from_cents(line_cents[pos])
+                pos += 1
+            out.append(({"items": lines, "total": _from_cents(total)}, None))
+        return out
+
+    def calc_total(self, items: list):
+        """
+        items: [{name, size, qty, sugar, ice, toppings: [..]}]
+        """
+        return self.calc_totals([items])[0]
+
+CATALOG = Catalog(MENU, web_tags=_WEB_TAGS)
+MENU_INDEX, MENU_FUZZY, MENU_PHONETIC = CATALOG.index, CATALOG.fuzzy, CATALOG.phonetic
+PRICING, MENU_FACETS = CATALOG.pricing, CATALOG.facets
+_MENU_ROWS, _MENU_ROWS_BY_NAME = CATALOG.rows, CATALOG.rows_by_name
+
+# The Angel Tea menu's helpers, used by the fast path, the tools and the tests.
+_find_item, _unit_price, _price, _menu_list = CATALOG.find_item, CATALOG.unit_price, CATALOG.price, CATALOG.menu_list
+_normalize_line, _calc_totals, _calc_total = CATALOG.normalize_line, CATALOG.calc_totals, CATALOG.calc_total
@@ -0,0 +1,117 @@
+# Reply cache for repeated FAQ turns ("What do you recommend?"). The cache is
+# global: one entry serves every session. That is only safe for replies that
+# cannot depend on the session, so it is read and written only on a session's
+# first turn (no history, no orders, empty cart), for transcripts that do not
+# refer back ("that one", "instead"), and for turns whose tools only read the menu.
+# A reply like "large" or "yes" then never carries one caller's context to another.
+# An entry can also carry the reply's synthesized audio, so a hit is text + audio.
+
+import os
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from .agent import FALLBACK_REPLY
+from .menu import MENU_VERSION
+
+REPLY_CACHE_TTL_S = float(os.getenv("VOICE_AGENT_REPLY_CACHE_TTL", "600"))  # 0 disables the cache
+REPLY_CACHE_SIZE = int(os.getenv("VOICE_AGENT_REPLY_CACHE_SIZE", "256"))
+STATELESS_TOOLS = frozenset({"get_menu", "recommend", "get_price", "quote_items"})
+_FILLER_WORDS = frozenset({"um", "uh", "erm", "hmm", "please", "hey", "so", "okay", "ok"})
+_CONTRACTIONS = {"what's": "what is", "how's": "how is", "that's": "that is", "i'd": "i would", "it's": "it is"}
+_CONTEXT_RE = re.compile(r"\b(it|that|this|those|these|them|one|ones|same|instead|also|another|again|"
+                         r"else|too|mine|my|order|cart)\b")
+
+
+def normalize_transcript(text: str) -> str:
+    """Lowercase, expand a few contractions, drop punctuation and filler words."""
+    words = []
+    for w in (text or "").lower().replace("’", "'").split():
+        w = w.strip(".,!?;:\"()")
+        words.extend(_CONTRACTIONS.get(w, w).split())
+    words = re.sub(r"[^a-z0-9%$.\s]+", " ", " ".join(words)).split()
+    return " ".join(w for w in words if w not in _FILLER_WORDS)
+
+
+def turn_is_stateless(turn_messages: list) -> bool:
+    """True when every tool the model called this turn only reads the menu."""
+    return all(tc["function"]["name"] in STATELESS_TOOLS
+               for m in turn_messages for tc in (m.get("tool_calls") or ()))
+
+
+class _Entry:
+    __slots__ = ("reply", "audio", "latency_ms", "stored_at")
+
+    def __init__(self, reply: str, latency_ms: float):
+        self.reply, self.audio, self.latency_ms = reply, None, latency_ms
+        self.stored_at = time.monotonic()
+
+
+class ReplyCache:
+    """
+    LRU of replies by (MENU_VERSION, normalized transcript), each valid for ttl_s.
+    get()/put() take the raw transcript and whether the session already has
+    context (ConversationMemory.has_context()); either is a no-op when it does.
+    Callers check turn_is_stateless() before put(). stats counts hits, misses,
+    stores, expiries and stateful skips; saved_ms sums the LLM time hits avoided.
+    """
+
+    def __init__(self, ttl_s: float = REPLY_CACHE_TTL_S, max_entries: int = REPLY_CACHE_SIZE,
+                 version: str = MENU_VERSION):
+        self.ttl_s, self.max_entries, self.version = ttl_s, max_entries, version
+        self._entries = OrderedDict()
+        self.stats = Counter()
+        self.saved_ms = 0.0
+
+    def key(self, text: str) -> Optional[tuple]:
+        """Cache key for a transcript, or None if it refers to earlier context."""
+        normalized = normalize_transcript(text)
+        if not normalized or _CONTEXT_RE.search(normalized):
+            return None
+        return (self.version, normalized)
+
+    def get(self, text: str, has_context: bool) -> Optional[_Entry]:
+        if self.ttl_s <= 0:
+            return None
+        if has_context:
+            self.stats["skipped_stateful"] += 1
+            return None
+        key = self.key(text)
+        entry = self._entries.get(key) if key else None
+        if entry is not None and time.monotonic() - entry.stored_at > self.ttl_s:
+            del self._entries[key]
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        self.saved_ms += entry.latency_ms
+        return entry
+
+    def put(self, text: str, reply: str, latency_ms: float, has_context: bool) -> Optional[_Entry]:
+        """Store a stateless turn's reply; returns the entry so audio can be attached to it."""
+        if self.ttl_s <= 0 or has_context or not reply or reply == FALLBACK_REPLY:
+            return None
+        key = self.key(text)
+        if key is None:
+            return None
+        entry = self._entries[key] = _Entry(reply, latency_ms)
+        self._entries.move_to_end(key)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "hit_rate": round(self.hit_rate(), 3),
+                "saved_ms": round(self.saved_ms)}
+
+
+REPLY_CACHE = ReplyCache()
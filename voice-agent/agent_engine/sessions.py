@@ -0,0 +1,152 @@
+# Session store for the multi-session service. Sessions are slotted records holding
+# a Cart (CartLine records) and a ConversationMemory (Turn records), with menu and
+# tool names interned. The store caps resident bytes per session by dropping the
+# oldest turns, evicts sessions idle past a TTL, and evicts the least recently used
+# idle session when full (never one mid-turn; if every session is busy, create()
+# raises Overloaded). stats() reports resident memory per session for host sizing.
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from collections import Counter, OrderedDict
+from functools import partial
+
+from .agent import SYSTEM_PROMPT, ConversationMemory
+from .limits import Overloaded
+from .menu import Catalog
+from .tools import Cart, run_tool_json
+
+SESSION_TTL_S = float(os.getenv("VOICE_AGENT_SESSION_TTL", "900"))        # idle time before eviction
+MAX_SESSIONS = int(os.getenv("VOICE_AGENT_MAX_SESSIONS", "5000"))
+SESSION_MAX_BYTES = int(os.getenv("VOICE_AGENT_SESSION_MAX_BYTES", "65536"))
+
+
+class Session:
+    """Per-caller state: the cart, bounded conversation memory, and a lock serializing its turns."""
+    __slots__ = ("id", "cart", "memory", "run_tool", "lock", "turns", "last_active", "resident_bytes")
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.cart = Cart()
+        self.memory = ConversationMemory(SYSTEM_PROMPT, cart=self.cart)
+        self.run_tool = partial(run_tool_json, cart=self.cart)
+        self.lock = asyncio.Lock()
+        self.turns = 0
+        self.last_active = time.monotonic()
+        self.resident_bytes = 0
+
+
+# Objects every session points at but does not own.
+_SHARED_TYPES = (type, type(sys), asyncio.Lock, Catalog)
+_SHARED_IDS = {id(SYSTEM_PROMPT)}
+
+
+def _deep_sizeof(obj, seen: set) -> int:
+    """Bytes held by obj and what it references, counting each object (e.g. an interned name) once per seen set."""
+    if id(obj) in seen or id(obj) in _SHARED_IDS or isinstance(obj, _SHARED_TYPES) or callable(obj):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_deep_sizeof(x, seen) for x in obj)
+    else:
+        for slot in getattr(type(obj), "__slots__", ()):
+            size += _deep_sizeof(getattr(obj, slot, None), seen)
+        if hasattr(obj, "__dict__"):
+            size += _deep_sizeof(vars(obj), seen)
+    return size
+
+
+def session_bytes(session: Session, seen: set = None) -> int:
+    """
+    Resident bytes of one session (records, history, cart). Pass one seen set across
+    sessions to count interned strings they share only once.
+    """
+    return _deep_sizeof(session, set() if seen is None else seen)
+
+
+class SessionStore:
+    """
+    Sessions by id in LRU order. get() refreshes a session; create() evicts idle
+    sessions and then the least recently used one not in a turn when the store is
+    full, or raises Overloaded if every session is in a turn; after each turn,
+    enforce() drops a session's oldest turns until it fits max_bytes.
+    """
+
+    def __init__(self, ttl_s: float = SESSION_TTL_S, max_sessions: int = MAX_SESSIONS,
+                 max_bytes: int = SESSION_MAX_BYTES):
+        self.ttl_s, self.max_sessions, self.max_bytes = ttl_s, max_sessions, max_bytes
+        self._sessions = OrderedDict()
+        self.evictions = Counter()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self) -> Session:
+        self.sweep()
+        while len(self._sessions) >= self.max_sessions:
+            victim = next((sid for sid, s in self._sessions.items() if not s.lock.locked()), None)
+            if victim is None:  # evicting a session mid-turn would drop its cart under it
+                self.evictions["create_refused"] += 1
+                raise Overloaded("sessions")
+            self._evict(victim, "lru")
+        session = Session(uuid.uuid4().hex)
+        session.resident_bytes = session_bytes(session)
+        self._sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.monotonic() - session.last_active > self.ttl_s:
+            self._evict(session_id, "ttl")
+            return None
+        session.last_active = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def enforce(self, session: Session):
+        """Recount a session's bytes after a turn, dropping its oldest turns while over the cap."""
+        session.resident_bytes = session_bytes(session)
+        while session.resident_bytes > self.max_bytes and session.memory.turns:
+            session.memory.drop_oldest()
+            self.evictions["turns_trimmed"] += 1
+            session.resident_bytes = session_bytes(session)
+
+    def sweep(self) -> int:
+        """Evict sessions idle longer than the TTL; the oldest are at the front."""
+        cutoff, evicted = time.monotonic() - self.ttl_s, 0
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session.last_active > cutoff or session.lock.locked():
+                break
+            self._evict(session_id, "ttl")
+            evicted += 1
+        return evicted
+
+    def _evict(self, session_id: str, reason: str):
+        del self._sessions[session_id]
+        self.evictions[reason] += 1
+
+    def stats(self) -> dict:
+        """Memory per session for host sizing; walks every session, so poll it, don't call it per turn."""
+        seen = set()
+        resident = sum(session_bytes(s, seen) for s in self._sessions.values())  # shared strings once
+        n = len(self._sessions)
+        return {
+            "sessions": n,
+            "resident_bytes": resident,
+            "avg_bytes_per_session": round(resident / n) if n else 0,
+            "max_bytes_per_session": max((s.resident_bytes for s in self._sessions.values()), default=0),
+            "cap_bytes_per_session": self.max_bytes,
+            "ttl_s": self.ttl_s,
+            "evictions": dict(self.evictions),
+        }
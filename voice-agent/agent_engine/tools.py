@@ -0,0 +1,586 @@
+# Tool schemas sent to the model, their implementations, spoken readbacks and the
+# session cart. run_tool() dispatches a model tool call by name; run_tool_json()
+# returns it serialized, from a cache for menu-only tools.
+
+import json, os, sys, uuid
+from collections import Counter, OrderedDict
+from itertools import chain
+from typing import Optional
+
+from .menu import (
+    CATALOG, MENU, TOPPINGS, Catalog, _SUGAR_LEVELS, _ICE_LEVELS, MENU_FIELDS, MENU_PAGE_DEFAULT, MENU_PAGE_MAX,
+    _project_menu_row, _to_cents, MENU_VERSION,
+)
+
+# ---------- Tool Schemas ----------
+# Built from a Catalog, so sizes, categories and topping prices match the menu the
+# tools price against. TOOLS is the Angel Tea set; another menu calls tool_schemas().
+def _line_props(sizes: str, toppings: Optional[str]) -> dict:
+    props = {
+        "name":{"type":"string"},
+        "size":{"type":"string", "description":sizes},
+        "qty":{"type":"integer"},
+        "sugar":{"type":"string", "description":"0%|25%|50%|75%|100%"},
+        "ice":{"type":"string", "description":"no/less/regular/extra ice"},
+    }
+    if toppings:
+        props["toppings"] = {"type":"array","items":{"type":"string"}, "description":toppings}
+    return props
+
+def tool_schemas(catalog: Catalog) -> list:
+    """The model-facing tool definitions for one Catalog."""
+    sizes = "|".join(s.upper() for s in catalog.index.sizes)
+    default_size = catalog.size_map.get("m", catalog.index.sizes[0]).upper()
+    *rest, last = sizes.split("|")
+    spoken_sizes = f"{', '.join(rest)} or {last}" if rest else last
+    charge = f"+${catalog.topping_price:.2f} each" if catalog.toppings else None
+    add_toppings = f"Toppings to add ({charge})." if charge else None
+    item_schema = {"type":"object", "properties": _line_props(sizes, add_toppings), "required": ["name"]}
+    cart_line_props = _line_props(sizes, f"Toppings ({charge}); replaces the line's toppings." if charge else None)
+    filters = {
+        "category": {"type":"string", "description":"e.g. " + ", ".join(catalog.categories)},
+        "caffeine_free": {"type":"boolean"},
+        "topseller": {"type":"boolean"},
+        "fruit": {"type":"boolean"},
+        "flavor": {"type":"string", "description":"Word in the drink name, e.g. mango, taro."},
+        "topping": {"type":"string", "description":"Included topping, e.g. boba."},
+        "min_price": {"type":"number"},
+        "max_price": {"type":"number"},
+        "size": {"type":"string", "description":f"{sizes}; size used for the price band (default {default_size})."}
+    }
+    price_props = {
+        "name": {"type":"string", "description":f"Drink name, e.g., {catalog.index.keys[0]}."},
+        "size": {"type":"string", "description":f"{sizes} (required for accurate price)."},
+    }
+    if charge:
+        price_props["toppings"] = {"type":"array","items":{"type":"string"}, "description":add_toppings}
+    else:
+        del filters["topping"]
+    return [
+        {
+            "type": "function",
+            "function": {
+                "name": "get_menu",
+                "description": "Return menu items, topsellers first; optionally filter by a query (name/category). "
+                               "Paged: pass next_cursor back as cursor for more.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "query": {"type":"string", "description":"Filter by keyword (optional)."},
+                        "fields": {"type":"string", "enum": list(MENU_FIELDS),
+                                   "description":f"names | prices (default; rows are {catalog.columns}) | full."},
+                        "limit": {"type":"integer", "description":f"Max items (default {MENU_PAGE_DEFAULT}, max {MENU_PAGE_MAX})."},
+                        "cursor": {"type":"string", "description":"next_cursor from a previous call."}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "recommend",
+                "description": "Recommend up to k drinks matching filters (topsellers first, then cheapest). "
+                               "Use instead of get_menu for requests like 'caffeine free under $7'.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "filters": {"type": "object", "properties": filters},
+                        "k": {"type":"integer", "description":"Max drinks to return (default 3)."}
+                    }
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "get_price",
+                "description": f"Return price for a specific drink and size ({spoken_sizes})."
+                               + (" Includes topping charges if provided." if charge else ""),
+                "parameters": {
+                    "type": "object",
+                    "properties": price_props,
+                    "required": ["name"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "quote_items",
+                "description": "Price one or more drinks in a single call (no order is placed). Returns per-line prices, the total, and a readback sentence.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"items": {"type": "array", "items": item_schema}},
+                    "required": ["items"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "add_to_cart",
+                "description": "Add drinks to the current cart. Returns the updated cart with prices and a readback.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "items": {"type": "array", "items": {"type": "object", "properties": cart_line_props, "required": ["name"]}}
+                    },
+                    "required": ["items"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "update_cart_line",
+                "description": "Change one cart line (by its number in the Cart block). Only the given fields change.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"line": {"type": "integer", "description": "1-based line number"}, **cart_line_props},
+                    "required": ["line"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "remove_from_cart",
+                "description": "Remove one cart line (by its number in the Cart block).",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"line": {"type": "integer", "description": "1-based line number"}},
+                    "required": ["line"]
+                }
+            }
+        },
+        {
+            "type": "function",
+            "function": {
+                "name": "place_order",
+                "description": "Place an order: the given items, or the current cart when items is omitted. Returns normalized items, unit prices, line totals, and grand total.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {"items": {"type": "array", "items": item_schema}},
+                    "required": []
+                }
+            }
+        }
+    ]
+
+TOOLS = tool_schemas(CATALOG)
+
+# ---------- Tool Implementations ----------
+# Menu tools price against CATALOG unless a caller passes another Catalog;
+# run_tool passes the one the cart was built with.
+def tool_get_menu(query=None, fields="prices", limit=MENU_PAGE_DEFAULT, cursor=None, *, catalog=None):
+    catalog = catalog or CATALOG
+    rows = catalog.menu_list(query)
+    if fields not in MENU_FIELDS:
+        fields = "prices"
+    try:
+        limit = max(1, min(int(limit or MENU_PAGE_DEFAULT), MENU_PAGE_MAX))
+    except (TypeError, ValueError):
+        limit = MENU_PAGE_DEFAULT
+    try:
+        start = max(0, int(cursor or 0))
+    except (TypeError, ValueError):
+        start = 0
+    page = rows[start:start + limit]
+    result = {"items": [_project_menu_row(r, fields) for r in page], "total": len(rows)}
+    if fields == "prices":
+        result["columns"] = catalog.columns
+    end = start + len(page)
+    result["next_cursor"] = str(end) if end < len(rows) else None
+    return result
+
+def tool_recommend(filters=None, k=3, *, catalog=None):
+    catalog = catalog or CATALOG
+    try:
+        k = max(1, min(int(k or 3), MENU_PAGE_MAX))
+    except (TypeError, ValueError):
+        k = 3
+    matches = catalog.facets.select(filters)
+    rows = [_project_menu_row(r, "prices") for r in (catalog.rows_by_name[n] for n in matches[:k])]
+    return {"items": rows, "columns": catalog.columns, "total": len(matches)}
+
+def tool_get_price(name, size=None, toppings=None, *, catalog=None):
+    catalog = catalog or CATALOG
+    p = catalog.price(name, size, toppings=toppings)
+    if p is None:
+        suggestion = catalog.find_item(name)
+        candidates = [] if suggestion else catalog.fuzzy.suggest(name)
+        if candidates:
+            suggestion = candidates[0]["name"]
+        result = {"found": False, "price": None, "suggestion": suggestion, "candidates": candidates}
+        _, ambiguous, unavailable = catalog.canon_toppings(toppings)
+        if ambiguous:
+            result["ambiguous_toppings"] = ambiguous
+        if unavailable:
+            result["unavailable_toppings"] = unavailable
+        return result
+    return {"found": True, "price": p, "name": catalog.find_item(name)}
+
+_SIZE_WORDS = {"S": "small", "M": "medium", "L": "large"}
+
+def _readback(calculated: dict) -> str:
+    """Speakable summary of _calc_total output, e.g. '2 large Taro Milk Tea (50% sugar, less ice) $14.38. Total $14.38.'"""
+    lines = []
+    for it in calculated["items"]:
+        details = f"{it['sugar']} sugar, {it['ice']}"
+        if it["toppings"]:
+            details += ", with " + " and ".join(it["toppings"])
+        lines.append(f"{it['qty']} {_SIZE_WORDS.get(it['size'], it['size'])} {it['name']} ({details}) ${it['line_total']:.2f}")
+    return "; ".join(lines) + f". Total ${calculated['total']:.2f}."
+
+# Readbacks as sequences of stock phrases, so a confirmation can be spliced from
+# cached audio segments (render_spliced) instead of synthesized per order.
+_UNIT_WORDS = ("zero one two three four five six seven eight nine ten eleven twelve thirteen "
+               "fourteen fifteen sixteen seventeen eighteen nineteen").split()
+_TENS_WORDS = "_ _ twenty thirty forty fifty sixty seventy eighty ninety".split()
+READBACK_PLANS = OrderedDict()  # spoken text -> segment phrases, most recent readbacks only
+READBACK_PLANS_MAX = 64
+_READBACK_CONNECTIVES = ("Got it:", "Anything else?", "with", "and", "total", "hundred",
+                         "dollar", "dollars", "cent", "cents")
+
+def _number_phrase(n: int) -> str:
+    if n < 20:
+        return _UNIT_WORDS[n]
+    tens, units = divmod(n, 10)
+    return _TENS_WORDS[tens] + (f"-{_UNIT_WORDS[units]}" if units else "")
+
+def _number_segments(n: int) -> Optional[list]:
+    if n < 100:
+        return [_number_phrase(n)]
+    if n < 1000:
+        hundreds, rest = divmod(n, 100)
+        return [_number_phrase(hundreds), "hundred"] + ([_number_phrase(rest)] if rest else [])
+    return None
+
+def _money_segments(amount: float) -> Optional[list]:
+    dollars, cents = divmod(_to_cents(amount), 100)
+    segs = _number_segments(dollars)
+    if segs is None:
+        return None
+    segs.append("dollar" if dollars == 1 else "dollars")
+    if cents:
+        segs += ["and", _number_phrase(cents), "cent" if cents == 1 else "cents"]
+    return segs
+
+def _readback_segments(calculated: dict) -> Optional[list]:
+    """Stock phrases that speak the same content as _readback, or None if any part has no segment."""
+    segs = []
+    for i, it in enumerate(calculated["items"]):
+        qty, price = _number_segments(it["qty"]), _money_segments(it["line_total"])
+        if qty is None or price is None:
+            return None
+        if i:
+            segs.append("and")
+        segs += qty + [_SIZE_WORDS.get(it["size"], it["size"]), it["name"], f"{it['sugar']} sugar", it["ice"]]
+        for j, topping in enumerate(it["toppings"]):
+            segs.append("with" if j == 0 else "and")
+            segs.append(topping)
+        segs += price
+    total = _money_segments(calculated["total"])
+    return None if total is None else segs + ["total"] + total
+
+def readback_segment_phrases() -> list:
+    """Every stock phrase a readback can use, for pre-rendering."""
+    return list(dict.fromkeys(chain(
+        _READBACK_CONNECTIVES, MENU, TOPPINGS, (f"{s} sugar" for s in sorted(_SUGAR_LEVELS)),
+        sorted(_ICE_LEVELS), _SIZE_WORDS.values(), (_number_phrase(n) for n in range(100)))))
+
+def _register_readback(text: str, segments: Optional[list]):
+    if segments is None:
+        return
+    READBACK_PLANS[text] = segments
+    READBACK_PLANS.move_to_end(text)
+    while len(READBACK_PLANS) > READBACK_PLANS_MAX:
+        READBACK_PLANS.popitem(last=False)
+
+def tool_quote_items(items, *, catalog=None):
+    calculated, err = (catalog or CATALOG).calc_total(items)
+    if err:
+        return {"ok": False, "error": err}
+    return {"ok": True, **calculated, "currency": "USD", "readback": _readback(calculated)}
+
+def _new_order(items: list, catalog: Catalog) -> dict:
+    calculated, err = catalog.calc_total(items)
+    if err:
+        return {"ok": False, "error": err}
+    order_id = str(uuid.uuid4())[:8]
+    calculated["order_id"] = order_id
+    calculated["currency"] = "USD"
+    calculated["readback"] = _readback(calculated)
+    return {"ok": True, **calculated}
+
+def tool_place_order(items=None, *, cart=None):
+    cart = cart or CART
+    if not items:
+        return cart.checkout()
+    result = _new_order(items, cart.catalog)
+    cart.record(result)
+    return result
+
+class CartLine:
+    """
+    One normalized cart line as a slotted record. Strings are interned, so thousands
+    of session carts share one copy of each drink, sugar, ice and topping name.
+    pending holds the details the customer has not said yet (see Cart.SLOTS).
+    """
+    __slots__ = ("name", "size", "qty", "sugar", "ice", "toppings", "pending")
+
+    def __init__(self, line: dict, pending=()):
+        self.name = sys.intern(line["name"])
+        self.size = sys.intern(line["size"])
+        self.qty = line["qty"]
+        self.sugar = sys.intern(line["sugar"])
+        self.ice = sys.intern(line["ice"])
+        self.toppings = tuple(sys.intern(t) for t in line["toppings"])
+        self.pending = tuple(pending)
+
+    def item(self) -> dict:
+        """The line as an item dict for Catalog.normalize_line / calc_total."""
+        return {"name": self.name, "size": self.size, "qty": self.qty, "sugar": self.sugar,
+                "ice": self.ice, "toppings": list(self.toppings)}
+
+class Cart:
+    """
+    The order being built this session, carried across turns instead of raw history:
+    CartLine records (normalized lines plus the details still to ask about) and the
+    last quote. Cart tools edit it; the model sees block(), one short line per drink.
+    Orders placed for the session (from the cart or with explicit items) wait in
+    placed as (order_id, readback) until ConversationMemory takes them. Lines are
+    priced against catalog (CATALOG by default).
+    """
+    __slots__ = ("lines", "last_quote", "placed", "catalog")
+    SLOTS = ("size", "sugar", "ice")
+
+    def __init__(self, catalog: Catalog = None):
+        self.catalog = catalog or CATALOG
+        self.placed = []
+        self.clear()
+
+    def clear(self):
+        self.lines, self.last_quote = [], None
+
+    def add(self, items: list) -> dict:
+        new = []
+        for it in items:
+            line, err = self.catalog.normalize_line(it)
+            if err:
+                return {"ok": False, "error": err}
+            new.append(CartLine(line, [slot for slot in self.SLOTS if not it.get(slot)]))
+        self.lines += new
+        return self.view()
+
+    def update(self, line: int, changes: dict) -> dict:
+        i = line - 1
+        if not 0 <= i < len(self.lines):
+            return {"ok": False, "error": f"No cart line {line}"}
+        changes = {k: v for k, v in changes.items() if v is not None}
+        current = self.lines[i]
+        updated, err = self.catalog.normalize_line({**current.item(), **changes})
+        if err:
+            return {"ok": False, "error": err}
+        self.lines[i] = CartLine(updated, [slot for slot in current.pending if slot not in changes])
+        return self.view()
+
+    def remove(self, line: int) -> dict:
+        i = line - 1
+        if not 0 <= i < len(self.lines):
+            return {"ok": False, "error": f"No cart line {line}"}
+        del self.lines[i]
+        return self.view()
+
+    def view(self) -> dict:
+        """Re-price the cart and return it as a tool result."""
+        if not self.lines:
+            self.last_quote = None
+            return {"ok": True, "items": [], "total": 0.0, "readback": "The cart is empty."}
+        calculated, err = self.catalog.calc_total([line.item() for line in self.lines])
+        if err:
+            return {"ok": False, "error": err}
+        self.last_quote = (calculated["total"], _readback(calculated))
+        pending = {str(n): list(line.pending) for n, line in enumerate(self.lines, 1) if line.pending}
+        return {"ok": True, **calculated, "pending": pending, "readback": self.last_quote[1]}
+
+    def checkout(self) -> dict:
+        if not self.lines:
+            return {"ok": False, "error": "Cart is empty"}
+        result = _new_order([line.item() for line in self.lines], self.catalog)
+        if result.get("ok"):
+            self.clear()
+            self.record(result)
+        return result
+
+    def record(self, result: dict):
+        """Note a placed order (a place_order result) for the session's memory."""
+        if result.get("ok"):
+            self.placed.append((sys.intern(result["order_id"]), result["readback"]))
+
+    def take_placed(self) -> list:
+        """Orders placed since the last call, oldest first."""
+        placed, self.placed = self.placed, []
+        return placed
+
+    def block(self) -> Optional[str]:
+        """Compact cart summary for the prompt, or None when there is nothing to show."""
+        if not self.lines:
+            return None
+        rows = []
+        for n, line in enumerate(self.lines, 1):
+            row = f"{n}) {line.qty} {line.size} {line.name}, {line.sugar} sugar, {line.ice}"
+            if line.toppings:
+                row += ", +" + " +".join(line.toppings)
+            if line.pending:
+                row += f" (not yet asked: {', '.join(line.pending)})"
+            rows.append(row)
+        if self.last_quote:
+            rows.append(f"Total ${self.last_quote[0]:.2f}")
+        return "Cart:\n" + "\n".join(rows)
+
+CART = Cart()
+
+# Cart tools act on the demo's CART unless a session passes its own cart.
+def tool_add_to_cart(items, *, cart=None):
+    return (cart or CART).add(items)
+
+def tool_update_cart_line(line, name=None, size=None, qty=None, sugar=None, ice=None, toppings=None, *, cart=None):
+    changes = {"name": name, "size": size, "qty": qty, "sugar": sugar, "ice": ice, "toppings": toppings}
+    return (cart or CART).update(line, changes)
+
+def tool_remove_from_cart(line, *, cart=None):
+    return (cart or CART).remove(line)
+
+# Requests keep a byte-stable prefix for provider-side prompt caching: the same
+# canonical TOOLS serialization and system prompt every round, with per-turn data
+# (session state, the new user text) at the end of the message list.
+def canonical_tools(tools: list) -> list:
+    """Tool schemas in one canonical form (sorted keys), so equal tool sets serialize identically."""
+    return json.loads(json.dumps(tools, sort_keys=True, separators=(",", ":")))
+
+REQUEST_TOOLS = canonical_tools(TOOLS)
+
+def run_tool(name: str, arguments: str, cart: Cart = None) -> dict:
+    """
+    Dispatch one model tool call (JSON arguments) to its tool_* function. Cart tools
+    use cart or CART, and menu tools price against that cart's catalog.
+    """
+    try:
+        args = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        return {"error": "invalid arguments"}
+    catalog = (cart or CART).catalog
+    result = {"error": f"unknown tool: {name}"}
+    try:
+        if name == "get_menu":
+            result = tool_get_menu(**args, catalog=catalog)
+        elif name == "recommend":
+            result = tool_recommend(**args, catalog=catalog)
+        elif name == "get_price":
+            result = tool_get_price(**args, catalog=catalog)
+        elif name == "quote_items":
+            result = tool_quote_items(**args, catalog=catalog)
+        elif name == "add_to_cart":
+            result = tool_add_to_cart(**args, cart=cart)
+        elif name == "update_cart_line":
+            result = tool_update_cart_line(**args, cart=cart)
+        elif name == "remove_from_cart":
+            result = tool_remove_from_cart(**args, cart=cart)
+        elif name == "place_order":
+            result = tool_place_order(**args, cart=cart)
+    except Exception as e:
+        result = {"error": str(e)}
+    return result
+
+# ---------- Tool result cache ----------
+# get_menu, recommend and get_price depend only on the menu, so their serialized
+# results for CATALOG are memoized by arguments and MENU_VERSION. Popular queries (topsellers,
+# a category page, a common price check) then cost a dict lookup and no json.dumps.
+TOOL_CACHE_SIZE = int(os.getenv("VOICE_AGENT_TOOL_CACHE", "512"))
+_CACHEABLE_TOOLS = frozenset({"get_menu", "recommend", "get_price"})
+_FREE_TEXT_ARGS = frozenset({"name", "query", "toppings"})  # matched case/space-insensitively
+
+def _normalize_text(value):
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, list):
+        return [_normalize_text(v) for v in value]
+    return value
+
+class ToolResultCache:
+    """
+    LRU of serialized tool results, max_entries results by normalized arguments
+    (sorted keys, free text lowercased) so "Taro Milk Tea" and "taro milk tea" share
+    an entry. The model's exact argument string maps to that key through a separate,
+    bounded alias table, so a repeated call skips normalization without taking a
+    second cache slot. Keys carry the menu version.
+    """
+    ALIASES_PER_ENTRY = 4
+
+    def __init__(self, max_entries: int = TOOL_CACHE_SIZE, version: str = MENU_VERSION):
+        self.max_entries, self.version = max_entries, version
+        self._entries = OrderedDict()  # normalized key -> JSON text
+        self._aliases = OrderedDict()  # (version, name, raw arguments) -> normalized key
+        self.stats = Counter()
+
+    def _normalized_key(self, name: str, arguments: str) -> Optional[tuple]:
+        try:
+            args = json.loads(arguments or "{}")
+        except json.JSONDecodeError:
+            return None
+        if isinstance(args, dict):
+            args = {k: _normalize_text(v) if k in _FREE_TEXT_ARGS else v for k, v in args.items()}
+        return (self.version, name, json.dumps(args, sort_keys=True, separators=(",", ":")))
+
+    def lookup(self, name: str, arguments: str) -> tuple:
+        """(key to store a fresh result under, or None; cached JSON text or None)."""
+        raw = (self.version, name, arguments)
+        key = self._aliases.get(raw)
+        if key is not None:
+            self._aliases.move_to_end(raw)
+        else:
+            key = self._normalized_key(name, arguments)
+            if key is None:
+                self.stats["misses"] += 1
+                return None, None
+            self._aliases[raw] = key
+            if len(self._aliases) > self.ALIASES_PER_ENTRY * self.max_entries:
+                self._aliases.popitem(last=False)
+        content = self._entries.get(key)
+        if content is None:
+            self.stats["misses"] += 1
+            return key, None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return None, content
+
+    def put(self, key: Optional[tuple], content: str):
+        if key is None:
+            return
+        self._entries[key] = content
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+TOOL_CACHE = ToolResultCache()
+
+def run_tool_json(name: str, arguments: str, cart: Cart = None) -> str:
+    """run_tool, serialized for the tool message; menu-only tools on CATALOG are served from TOOL_CACHE."""
+    if name not in _CACHEABLE_TOOLS or (cart or CART).catalog is not CATALOG:
+        return json.dumps(run_tool(name, arguments, cart))
+    key, content = TOOL_CACHE.lookup(name, arguments)
+    if content is None:
+        result = run_tool(name, arguments, cart)
+        content = json.dumps(result)
+        if "error" not in result:
+            TOOL_CACHE.put(key, content)
+    return content
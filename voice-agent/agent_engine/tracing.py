@@ -0,0 +1,135 @@
+# Lightweight per-stage tracing for the voice demos.
+# Set VOICE_AGENT_TRACE to a directory to record spans around each stage of a turn
+# (capture, STT, LLM rounds, tools, TTS, playback). Each turn is appended to
+# trace-<stamp>.jsonl, and trace-<stamp>.json is a Chrome trace-event file that
+# opens in chrome://tracing or https://ui.perfetto.dev. When unset, span() hands
+# back one shared no-op context manager, so instrumented code costs ~nothing.
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: dict):
+        self.tracer, self.name, self.attrs = tracer, name, attrs
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, **attrs):
+        """Attach attributes known only once the stage has run (e.g. cached tokens)."""
+        self.attrs.update(attrs)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._record(self.name, self.start, time.perf_counter(), self.attrs)
+        return False
+
+
+class Tracer:
+    """Collects spans per turn; disabled (no-op) unless given an output directory."""
+
+    def __init__(self, out_dir: Optional[str] = None):
+        self.enabled = bool(out_dir)
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self._turn, self._turn_start, self._spans = None, None, []
+        self._events = []
+        self._tids = {}
+        if self.enabled:
+            out = Path(out_dir)
+            out.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+            self.jsonl_path = out / f"trace-{stamp}.jsonl"
+            self.chrome_path = out / f"trace-{stamp}.json"
+
+    def span(self, name: str, **attrs):
+        """Context manager timing one stage; `with tracer.span("stt") as s: ... s.set(...)`."""
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, attrs)
+
+    def mark(self, name: str, **attrs):
+        """Instant event, e.g. the first audio chunk reaching the speaker."""
+        if self.enabled:
+            now = time.perf_counter()
+            self._record(name, now, None, attrs)
+
+    def begin_turn(self, turn_id):
+        """Start collecting spans for a turn (flushing one left open, e.g. after no speech)."""
+        if self.enabled:
+            self.end_turn()
+            with self._lock:
+                self._turn, self._turn_start, self._spans = turn_id, time.perf_counter(), []
+
+    def end_turn(self):
+        """Append this turn's spans as one JSON line."""
+        if not self.enabled or self._turn is None:
+            return
+        with self._lock:
+            line = {
+                "turn": self._turn,
+                "total_ms": round((time.perf_counter() - self._turn_start) * 1000, 1),
+                "spans": self._spans,
+            }
+            self._turn, self._spans = None, []
+        with open(self.jsonl_path, "a") as f:
+            f.write(json.dumps(line) + "\n")
+
+    def close(self):
+        """Write the Chrome trace-event file for the whole session."""
+        if not self.enabled:
+            return
+        self.end_turn()
+        with self._lock:
+            events = list(self._events)
+        with open(self.chrome_path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+        print(f"Trace written to {self.chrome_path} (per-turn spans in {self.jsonl_path.name})")
+
+    def _record(self, name: str, start: float, end: Optional[float], attrs: dict):
+        ident = threading.get_ident()
+        with self._lock:
+            tid = self._tids.setdefault(ident, len(self._tids) + 1)
+            event = {"name": name, "pid": 1, "tid": tid,
+                     "ts": round((start - self._origin) * 1e6), "args": attrs}
+            if end is None:
+                event.update(ph="i", s="t")
+            else:
+                event.update(ph="X", dur=round((end - start) * 1e6))
+            self._events.append(event)
+            if self._turn is not None:
+                span = {"name": name, "start_ms": round((start - self._turn_start) * 1000, 1)}
+                if end is not None:
+                    span["dur_ms"] = round((end - start) * 1000, 1)
+                if attrs:
+                    span["attrs"] = attrs
+                self._spans.append(span)
+
+
+TRACER = Tracer(os.getenv("VOICE_AGENT_TRACE"))
@@ -1,21 +1,24 @@
 # Lightweight benchmark for the Angel Tea voice agent (Python demo).
 # Runs a small set of text prompts through agent_reply() and checks the replies
 # with simple string/regex assertions. Requires OPENAI_API_KEY and the
-# dependencies used by continuous_demo.py.
+# dependencies used by continuous_demo.py. Loading the demo is side-effect free
+# (the agent_engine client is created on the first request), so cases can be
+# collected and inspected without credentials.
 
+import argparse
 import json
 import os
 import re
 from pathlib import Path
 import importlib.util
-from typing import Callable, Dict, List, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 
 Case = Dict[str, object]
 
 
-def _load_agent_reply():
-    """Dynamically load agent_reply from continuous_demo.py (no package install)."""
+def _load_agent_module():
+    """Dynamically load continuous_demo.py (no package install); it imports agent_engine from this directory."""
     here = Path(__file__).resolve().parent
     module_path = here / "continuous_demo.py"
     spec = importlib.util.spec_from_file_location("voice_agent_demo", module_path)
@@ -25,7 +28,25 @@ def _load_agent_reply():
     spec.loader.exec_module(mod)  # type: ignore
     if not hasattr(mod, "agent_reply"):
         raise RuntimeError("agent_reply() not found in continuous_demo.py")
-    return mod.agent_reply
+    return mod
+
+
+def _make_agent_fn(mod, tools=None, turn_stats: Optional[dict] = None,
+                   system_prompt: Optional[str] = None) -> Callable[[str], str]:
+    """
+    Bind agent_reply to a tool set (and optionally a system prompt); per-turn round
+    counts are written into turn_stats. Cases are independent, so the demo's cart is
+    emptied before each one.
+    """
+    def agent_fn(prompt: str) -> str:
+        mod.CART.clear()
+        return mod.agent_reply(prompt, tools=tools, stats=turn_stats, system_prompt=system_prompt)
+    return agent_fn
+
+
+def _without_tool(prompt: str, tool_name: str) -> str:
+    """The system prompt with every line that mentions tool_name removed (tool list entry and instructions)."""
+    return "".join(line for line in prompt.splitlines(keepends=True) if tool_name not in line)
 
 
 def _text_has_all(text: str, phrases: List[str]) -> bool:
@@ -680,7 +701,9 @@ def define_cases() -> List[Case]:
     return [c for c in cases if c["name"] not in removed]
 
 
-def run_cases(agent_fn: Callable[[str], str], cases: List[Case]) -> Tuple[List[dict], int]:
+def run_cases(
+    agent_fn: Callable[[str], str], cases: List[Case], turn_stats: Optional[dict] = None
+) -> Tuple[List[dict], int]:
     results = []
     passed = 0
 
@@ -709,6 +732,7 @@ def run_cases(agent_fn: Callable[[str], str], cases: List[Case]) -> Tuple[List[d
                 "ok": ok,
                 "failed_checks": failed_checks,
                 "reply": reply,
+                **(turn_stats or {}),
             }
         )
         status = "OK" if ok else "FAIL"
@@ -717,19 +741,100 @@ def run_cases(agent_fn: Callable[[str], str], cases: List[Case]) -> Tuple[List[d
     return results, passed
 
 
+def summarize_rounds(results: List[dict]) -> Dict[str, float]:
+    n = max(1, len(results))
+    return {
+        "avg_llm_rounds": sum(r.get("llm_rounds", 0) for r in results) / n,
+        "avg_tool_calls": sum(r.get("tool_calls", 0) for r in results) / n,
+    }
+
+
+def _avg(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def summarize_prompt_cache(results: List[dict]) -> Dict[str, object]:
+    """Prefix-cache hit rate over all LLM rounds, and latency of rounds with vs without a hit."""
+    rounds = [u for r in results for u in r.get("usage", [])]
+    prompt = sum(u["prompt_tokens"] for u in rounds)
+    cached = sum(u["cached_tokens"] for u in rounds)
+    hits = [u for u in rounds if u["cached_tokens"]]
+    misses = [u for u in rounds if not u["cached_tokens"]]
+    return {
+        "rounds": len(rounds),
+        "prompt_tokens": prompt,
+        "cached_tokens": cached,
+        "cached_token_pct": cached / prompt * 100 if prompt else 0.0,
+        "round_hit_pct": len(hits) / len(rounds) * 100 if rounds else 0.0,
+        "avg_latency_ms_hit": _avg([u["latency_ms"] for u in hits]),
+        "avg_latency_ms_miss": _avg([u["latency_ms"] for u in misses]),
+    }
+
+
+def _print_prompt_cache(cache: Dict[str, object]) -> None:
+    def ms(value):
+        return "n/a" if value is None else f"{value:.0f} ms"
+    print(
+        f"Prompt cache: {cache['cached_tokens']}/{cache['prompt_tokens']} prompt tokens cached "
+        f"({cache['cached_token_pct']:.1f}%), hits on {cache['round_hit_pct']:.0f}% of {cache['rounds']} rounds; "
+        f"avg latency hit {ms(cache['avg_latency_ms_hit'])} vs miss {ms(cache['avg_latency_ms_miss'])}"
+    )
+
+
+def run_suite(mod, cases: List[Case], tools=None,
+              system_prompt: Optional[str] = None) -> Tuple[List[dict], int, Dict[str, float]]:
+    turn_stats: dict = {}
+    results, passed = run_cases(_make_agent_fn(mod, tools, turn_stats, system_prompt), cases, turn_stats)
+    rounds = summarize_rounds(results)
+    print(
+        f"\nPassed {passed}/{len(cases)} cases. "
+        f"Avg LLM rounds/turn: {rounds['avg_llm_rounds']:.2f}, "
+        f"avg tool calls/turn: {rounds['avg_tool_calls']:.2f}"
+    )
+    _print_prompt_cache(summarize_prompt_cache(results))
+    return results, passed, rounds
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Angel Tea voice agent benchmark")
+    parser.add_argument(
+        "--compare-quote-tool",
+        action="store_true",
+        help="Also run without the quote_items tool and report the LLM round reduction.",
+    )
+    args = parser.parse_args()
+
     if not os.getenv("OPENAI_API_KEY"):
         raise SystemExit("Set OPENAI_API_KEY before running the benchmark.")
 
-    agent_reply = _load_agent_reply()
+    mod = _load_agent_module()
     cases = define_cases()
-    results, passed = run_cases(agent_reply, cases)
-    total = len(cases)
-    print(f"\nPassed {passed}/{total} cases.")
+    report: Dict[str, object] = {}
+
+    if args.compare_quote_tool:
+        print("== Without quote_items ==")
+        # The baseline neither offers the tool nor tells the model to call it.
+        baseline_tools = [t for t in mod.TOOLS if t["function"]["name"] != "quote_items"]
+        baseline_prompt = _without_tool(mod.SYSTEM_PROMPT, "quote_items")
+        base_results, _, base_rounds = run_suite(mod, cases, baseline_tools, baseline_prompt)
+        report["without_quote_items"] = {"rounds": base_rounds, "results": base_results}
+        print("\n== With quote_items ==")
+
+    results, _, rounds = run_suite(mod, cases)
+    report["rounds"] = rounds
+    report["prompt_cache"] = summarize_prompt_cache(results)
+    report["results"] = results
+
+    if args.compare_quote_tool:
+        before = base_rounds["avg_llm_rounds"]
+        after = rounds["avg_llm_rounds"]
+        reduction = (before - after) / before * 100 if before else 0.0
+        report["round_reduction_pct"] = reduction
+        print(f"\nLLM rounds/turn: {before:.2f} -> {after:.2f} ({reduction:.1f}% fewer)")
 
     out_path = Path(__file__).resolve().parent / "bench_results.json"
     with open(out_path, "w") as f:
-        json.dump(results, f, indent=2)
+        json.dump(report, f, indent=2)
     print(f"Saved detailed results to {out_path}")
 
 
@@ -9,17 +9,13 @@
 # Flow per round:
 #   Enter -> record segment (auto stops on silence) -> STT -> Agent (with tools) -> TTS playback
 
-import os, sys, subprocess, json, time, uuid, math
-from datetime import datetime
-from openai import OpenAI
+import sys, subprocess
+from functools import partial
 
-# ---------- Config ----------
-API_KEY = os.getenv("OPENAI_API_KEY")
-if not API_KEY:
-    sys.exit("Missing OPENAI_API_KEY. Run: export OPENAI_API_KEY='sk-...'")
-
-client = OpenAI(api_key=API_KEY)
+import agent_engine
+from agent_engine import TRACER, Cart, Catalog, canonical_tools, get_client, run_tool_json, tool_schemas
 
+# ---------- Config ----------
 REC_CMD = [
     # Record mono 16kHz WAV from default mic. Auto stop on ~1s silence; hard cap 10s.
     "sox", "-d", "-c", "1", "-r", "16000", "input.wav",
@@ -38,9 +34,16 @@ Important behavior:
 - Keep answers short (1–3 sentences).
 - Confirm key details when placing orders (item, size, sugar, ice, quantity).
 - Use the provided tools:
-  - get_menu(query)
+  - get_menu(query, fields, limit, cursor)
+  - recommend(filters, k)
   - get_price(name, size)
+  - quote_items(items[])
+  - add_to_cart(items[]), update_cart_line(line, ...), remove_from_cart(line)
   - place_order(items[])
+For price questions about one or more drinks, call quote_items once with every drink and answer from its readback.
+Build orders in the cart; the "Cart" system message shows its numbered lines. For "make that a large instead",
+call update_cart_line on that line. When the customer confirms, call place_order with no items to place the cart.
+Sizes are small, medium or large.
 Never invent items or prices that are not in the tool results.
 If an item is not found, suggest close alternatives from the menu.
 """
@@ -80,274 +83,93 @@ MENU = {
     },
 }
 
-# Simple sugar/ice textual options; agent will echo/confirm only.
-VALID_SUGAR = {"0%","25%","50%","75%","100%"}
-VALID_ICE = {"no ice","less ice","regular ice","extra ice"}
-
-def _normalize_name(name: str) -> str:
-    return (name or "").strip().lower()
-
-def _find_item(name: str):
-    key = _normalize_name(name)
-    for item in MENU.keys():
-        if _normalize_name(item) == key:
-            return item
-    # fuzzy: contains
-    for item in MENU.keys():
-        if key and key in _normalize_name(item):
-            return item
-    return None
-
-def _price(name: str, size: str = None) -> float:
-    item_key = _find_item(name)
-    if not item_key:
-        return None
-    info = MENU[item_key]
-    mult = 1.0
-    if size:
-        size_l = size.strip().lower()
-        # map synonyms
-        synonyms = {"s":"small","m":"medium","l":"large"}
-        size_l = synonyms.get(size_l, size_l)
-        if size_l not in info["sizes"]:
-            return None
-        mult = info["sizes"][size_l]
-    return round(info["base_price"] * mult, 2)
-
-def _menu_list(query: str = None):
-    out = []
-    q = (query or "").strip().lower()
-    for name, meta in MENU.items():
-        if not q or q in name.lower() or q in meta["category"]:
-            out.append({
-                "name": name,
-                "category": meta["category"],
-                "base_price": meta["base_price"],
-                "sizes": list(meta["sizes"].keys()),
-                "topseller": meta.get("topsellers", False)
-            })
-    # sort topsellers first
-    out.sort(key=lambda x: (not x["topseller"], x["name"]))
-    return out
+SIZE_SYNONYMS = {"s":"s", "small":"s", "m":"m", "medium":"m", "regular":"m", "l":"l", "large":"l"}
 
-def _calc_total(items: list):
-    total = 0.0
-    normalized_items = []
-    for it in items:
-        name = it.get("name","").strip()
-        size = (it.get("size") or "medium").strip().lower()
-        qty = int(it.get("qty") or 1)
-        sugar = (it.get("sugar") or "100%").strip().lower()
-        ice = (it.get("ice") or "regular ice").strip().lower()
-
-        # sanitize / normalize
-        if sugar not in {s.lower() for s in VALID_SUGAR}:
-            sugar = "100%"
-        if ice not in {i.lower() for i in VALID_ICE}:
-            ice = "regular ice"
-
-        price = _price(name, size)
-        if price is None:
-            return None, f"Item or size not found: {name} ({size})"
-
-        line_total = round(price * qty, 2)
-        total += line_total
-        normalized_items.append({
-            "name": _find_item(name), "size": size, "qty": qty,
-            "sugar": sugar, "ice": ice, "unit_price": price, "line_total": line_total
-        })
-    total = round(total, 2)
-    return {"items": normalized_items, "total": total}, None
-
-# ---------- Tool Schemas ----------
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_menu",
-            "description": "Return menu items; optionally filter by a query (name/category). Topsellers first.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string", "description": "Filter by keyword (optional)."}
-                }
-            },
-        },
-    },
+# The engine builds the index, matchers and integer-cents pricing for this menu;
+# prices per size are the base price times the size multiplier. No toppings are sold.
+CATALOG = Catalog(
     {
-        "type": "function",
-        "function": {
-            "name": "get_price",
-            "description": "Return price for a specific drink and optional size.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {"type": "string", "description": "Drink name (e.g., Brown Sugar Milk Tea)."},
-                    "size": {"type": "string", "description": "small|medium|large (optional)"}
-                },
-                "required": ["name"]
-            },
-        },
+        name: {
+            "category": meta["category"],
+            "prices": {size[0]: round(meta["base_price"] * mult, 2) for size, mult in meta["sizes"].items()},
+            "topseller": meta["topsellers"],
+        }
+        for name, meta in MENU.items()
     },
-    {
-        "type": "function",
-        "function": {
-            "name": "place_order",
-            "description": "Place a simple order. Returns normalized items, unit prices, line totals, and grand total.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "items": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "name": {"type": "string"},
-                                "size": {"type": "string", "description": "small|medium|large"},
-                                "qty": {"type": "integer"},
-                                "sugar": {"type": "string", "description": "0%|25%|50%|75%|100%"},
-                                "ice": {"type": "string", "description": "no/less/regular/extra ice"}
-                            },
-                            "required": ["name"]
-                        }
-                    }
-                },
-                "required": ["items"]
-            },
-        },
-    }
-]
-
-# ---------- Tool Implementations ----------
-def tool_get_menu(query=None):
-    return {"items": _menu_list(query)}
-
-def tool_get_price(name, size=None):
-    p = _price(name, size)
-    if p is None:
-        # suggest nearest
-        suggestion = _find_item(name)
-        return {"found": False, "price": None, "suggestion": suggestion}
-    return {"found": True, "price": p}
+    size_map=SIZE_SYNONYMS,
+    toppings=(),
+)
 
-def tool_place_order(items):
-    calculated, err = _calc_total(items)
-    if err:
-        return {"ok": False, "error": err}
-    order_id = str(uuid.uuid4())[:8]
-    calculated["order_id"] = order_id
-    calculated["currency"] = "USD"
-    return {"ok": True, **calculated}
+# The engine's cart and tools, priced against this menu; the schemas list its sizes and categories.
+TOOLS = tool_schemas(CATALOG)
+REQUEST_TOOLS = canonical_tools(TOOLS)
+CART = Cart(CATALOG)
+_run_tool = partial(run_tool_json, cart=CART)
 
 # ---------- Core Loop: record -> STT -> agent (tools) -> TTS ----------
 def record_once():
     print("Recording... speak now; pause ~1s to auto-stop.")
-    rec = subprocess.run(REC_CMD)
+    with TRACER.span("record"):
+        rec = subprocess.run(REC_CMD)
     if rec.returncode != 0:
         print("Recording failed. Check mic permissions (System Settings → Privacy & Security → Microphone).")
         return False
     return True
 
 def transcribe():
-    with open("input.wav","rb") as f:
-        r = client.audio.transcriptions.create(
+    with open("input.wav","rb") as f, TRACER.span("stt"):
+        r = get_client().audio.transcriptions.create(
             model="gpt-4o-mini-transcribe",
             file=f,
         )
     return (r.text or "").strip()
 
-def agent_reply(user_text: str) -> str:
+def agent_reply(user_text: str, tools: list = None, stats: dict = None, client=None,
+                system_prompt: str = None) -> str:
     """
-    Agent with function calling using chat.completions (more stable than responses).
-    Supports up to 3 tool rounds.
+    One turn through the engine's tool loop (up to 3 tool rounds) with this demo's
+    menu and tools. Each turn sees only the system prompt, the cart block (see Cart)
+    and the user text.
+    tools defaults to TOOLS and system_prompt to SYSTEM_PROMPT; if stats is given, it
+    receives llm_rounds, tool_calls and per-round usage (prompt, cached and completion
+    tokens, latency) for this turn.
     """
-    messages = [
-        {"role": "system", "content": SYSTEM_PROMPT},
-        {"role": "user", "content": user_text},
-    ]
-    tool_rounds = 0
-
-    while True:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages,
-            tools=TOOLS,
-            tool_choice="auto",
-        )
-        msg = resp.choices[0].message
-        tool_calls = msg.tool_calls or []
-
-        if tool_calls:
-            tool_rounds += 1
-            if tool_rounds > 3:
-                return "I didn't catch that—could you please repeat your question?"
-
-            # Record assistant tool calls
-            messages.append({
-                "role": "assistant",
-                "content": msg.content or "",
-                "tool_calls": [
-                    {
-                        "id": tc.id,
-                        "type": tc.type,
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        },
-                    }
-                    for tc in tool_calls
-                ],
-            })
-
-            # Execute tools and feed results back
-            for tc in tool_calls:
-                try:
-                    args = json.loads(tc.function.arguments or "{}")
-                except json.JSONDecodeError:
-                    result = {"error": "invalid arguments"}
-                else:
-                    result = {"error": f"unknown tool: {tc.function.name}"}
-                    try:
-                        if tc.function.name == "get_menu":
-                            result = tool_get_menu(**args)
-                        elif tc.function.name == "get_price":
-                            result = tool_get_price(**args)
-                        elif tc.function.name == "place_order":
-                            result = tool_place_order(**args)
-                    except Exception as e:
-                        result = {"error": str(e)}
-
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc.id,
-                    "content": json.dumps(result),
-                })
-            continue
-
-        final_text = (msg.content or "").strip()
-        if not final_text:
-            final_text = "I didn't catch that—could you please repeat your question?"
-        return final_text
+    messages = [{"role": "system", "content": system_prompt or SYSTEM_PROMPT}]
+    cart = CART.block()
+    if cart:  # per-turn data goes after the static prefix
+        messages.append({"role": "system", "content": cart})
+    messages.append({"role": "user", "content": user_text})
+    request_tools = canonical_tools(tools) if tools else REQUEST_TOOLS
+    answer = agent_engine.agent_reply(messages, stats, client=client, tools=request_tools, run_tool=_run_tool)
+    CART.take_placed()  # turns carry no history, so placed orders are not kept
+    return answer
 
 def speak(text: str):
-    audio = client.audio.speech.create(
-        model="gpt-4o-mini-tts",
-        voice="alloy",
-        input=text
-    )
-    with open("reply.mp3","wb") as f:
-        f.write(audio.read())
-    subprocess.run(["afplay" if sys.platform=="darwin" else "play", "reply.mp3"])
+    with TRACER.span("tts", chars=len(text)):
+        audio = get_client().audio.speech.create(
+            model="gpt-4o-mini-tts",
+            voice="alloy",
+            input=text
+        )
+        with open("reply.mp3","wb") as f:
+            f.write(audio.read())
+    with TRACER.span("play"):
+        subprocess.run(["afplay" if sys.platform=="darwin" else "play", "reply.mp3"])
 
 def main():
     print("\nVoice Ordering Demo (English)")
     print("Press Enter each round. Speak, then pause ~1s; it will transcribe, answer, and speak back.")
     print("Try: 'What do you recommend?', 'How much is a large Brown Sugar Milk Tea?',")
     print("'I want two medium Jasmine Green Teas, 50% sugar, less ice.'\n")
+    try:
+        get_client()
+    except RuntimeError as e:
+        sys.exit(str(e))
     round_id = 1
     try:
         while True:
             input(f"[Round {round_id}] Press Enter to record...")
+            TRACER.begin_turn(round_id)
             ok = record_once()
             if not ok:
                 continue
@@ -355,12 +177,16 @@ def main():
             print("You:", text or "(empty)")
             if not text:
                 continue
-            answer = agent_reply(text)
+            with TRACER.span("agent"):
+                answer = agent_reply(text)
             print("Agent:", answer)
             speak(answer)
+            TRACER.end_turn()
             round_id += 1
     except KeyboardInterrupt:
         print("\nBye!")
+    finally:
+        TRACER.close()
 
 if __name__ == "__main__":
     main()
@@ -1,5 +1,6 @@
 # file: voice_ordering_demo.py
 # Purpose: Voice demo with full Angel Tea menu, precise M/L pricing, toppings (+$0.80), and simple order placement.
+#          Menu, tools and the agent loop live in the agent_engine package; this file is the audio front end.
 # Usage:
 #   1) brew install sox
 #   2) pip install --upgrade openai
@@ -9,495 +10,890 @@
 # Flow per round:
 #   Enter -> record segment (auto stops on silence) -> STT -> Agent (with tools) -> TTS playback
 
-import os, sys, subprocess, json, time, uuid
+import os, sys, subprocess, json, time, queue, threading, io, math, wave, argparse, hashlib
+from abc import ABC, abstractmethod
+from array import array
 from typing import Optional
-from datetime import datetime
-from openai import OpenAI
+from pathlib import Path
+from collections import Counter, OrderedDict, deque
+from itertools import chain
+
+from agent_engine import (
+    CART, FALLBACK_REPLY, FAST_PATH_STATS, LOOKUP_STATS, READBACK_PLANS, REPLY_CACHE, SYSTEM_PROMPT, TOOL_CACHE,
+    TRACER, ConversationMemory, SentenceSplitter, agent_reply, agent_reply_stream, fast_path_hit_rate,
+    fast_path_reply, get_client, readback_segment_phrases, turn_is_stateless,
+)
+
+try:
+    import numpy as np  # optional: faster VAD and upload compaction
+except ImportError:
+    np = None
+try:
+    import sounddevice as sd  # optional: in-process audio capture/playback
+except ImportError:
+    sd = None
+try:
+    import soundfile as sf  # optional: FLAC/Opus encoding of STT uploads
+except ImportError:
+    sf = None
 
 # ---------- Config ----------
-API_KEY = os.getenv("OPENAI_API_KEY")
-if not API_KEY:
-    sys.exit("Missing OPENAI_API_KEY. Run: export OPENAI_API_KEY='sk-...'")
-
-client = OpenAI(api_key=API_KEY)
-
-REC_CMD = [
-    # Record mono 16kHz WAV from default mic. Auto stop on ~1s silence; hard cap 10s.
-    "sox", "-d", "-c", "1", "-r", "16000", "input.wav",
-    "silence", "1", "0.2", "1%", "1", "1.0", "1%",
-    "trim", "0", "10"
-]
-
-SYSTEM_PROMPT = """You are a calm, helpful tea shop voice agent.
-Your goals:
-1) Recommend drinks briefly and clearly.
-2) Answer prices accurately.
-3) Place small orders (items, size=M/L, sugar, ice, toppings, quantity), then read back the order and total price for confirmation.
-4) If the user asks unclear questions, ask a short follow-up.
-
-Important behavior:
-- Keep answers short (1–3 sentences).
-- Confirm key details when placing orders (item, size, sugar, ice, toppings, quantity).
-- Use the provided tools:
-  - get_menu(query)
-  - get_price(name, size, toppings)
-  - place_order(items[])
-- Sizes are M or L. Each added topping is +$0.80 unless the drink lists included toppings.
-- Boba is not included unless the drink name states it or the user adds it as a topping.
-- Never invent items or prices that are not in the tool results.
-If an item is not found, suggest close alternatives from the menu.
-"""
-
-# ---------- Full Angel Tea Menu (explicit M/L pricing) ----------
-# Conventions:
-# - prices: dict with 'm' and 'l'
-# - topseller: boolean for items marked with a star or ranking on the menu
-# - included_toppings: toppings bundled at $0.00 for that drink (rare)
-
-TOPPING_PRICE = 0.80
-
-TOPPINGS = [
-    "brown sugar boba", "coconut jelly", "herbal jelly", "sago",
-    "oreo crumbs", "milk foam", "red bean", "chocolate",
-    "mango popping bubbles", "green apple popping bubbles",
-    "lychee popping bubbles", "blueberry popping bubbles",
-    "strawberry popping bubbles"
-]
-
-TOPPING_SYNONYMS = {
-    "boba": "brown sugar boba",
-    "tapioca": "brown sugar boba",
-    "pearls": "brown sugar boba",
-    "milk cap": "milk foam",
-    "cheese foam": "milk foam",
-    "oreo": "oreo crumbs",
-    "mango popping": "mango popping bubbles",
-    "green apple popping": "green apple popping bubbles",
-    "lychee popping": "lychee popping bubbles",
-    "blueberry popping": "blueberry popping bubbles",
-    "strawberry popping": "strawberry popping bubbles",
-}
-
-def _canon_topping(name: str):
-    n = (name or "").strip().lower()
-    if not n:
-        return None
-    if n in TOPPING_SYNONYMS:
-        n = TOPPING_SYNONYMS[n]
-    # fuzzy contains
-    for t in TOPPINGS:
-        if n == t or n in t or t in n:
-            return t
-    return None
-
-MENU = {
-    # ---------------- ANGEL MILK TEA ----------------
-    "Angel Milk Tea": {"category":"milk_tea","prices":{"m":5.99,"l":6.89},"topseller": True},
-    "Jasmine Milk Tea": {"category":"milk_tea","prices":{"m":5.99,"l":6.89}},
-    "Coffee Milk Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49}},
-    "Taro Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19},"topseller": True},
-    "Matcha Milk Tea": {"category":"milk_tea","prices":{"m":6.79,"l":7.69}},
-    "THAI Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
-    "Oreo Milk Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49},"topseller": True},
-    "Mango Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
-    "Strawberry Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
-    "Lychee Jasmine Milk Tea": {"category":"milk_tea","prices":{"m":6.29,"l":7.19}},
-    "Brown Sugar Bubble Tea": {"category":"milk_tea","prices":{"m":6.59,"l":7.49},"topseller": True,
-                               "included_toppings":["brown sugar boba"]},
-    "Milk Foam Caramel Milk Tea": {"category":"milk_tea","prices":{"m":7.39,"l":8.29},"topseller": True,
-                                   "included_toppings":["milk foam"]},
-
-    # ---------------- ANGEL FRUIT TEA ----------------
-    "3 Brother 4 Season Spring Tea": {"category":"fruit_tea","prices":{"m":7.39,"l":8.29},"topseller": True,
-                                      "included_toppings":["brown sugar boba","sago","coconut jelly"]},
-    "Mango Passion Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
-    "Passion Fruit Green Tea": {"category":"fruit_tea","prices":{"m":6.25,"l":7.19}},
-    "Bayberry Jasmine Green Tea": {"category":"fruit_tea","prices":{"m":6.25,"l":7.19}},
-    "Pineapple Mango Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69}},
-    "Peach Coconut Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
-    "Strawberry Pineapple Green Tea": {"category":"fruit_tea","prices":{"m":6.75,"l":7.69},"topseller": True},
-    "Milk Foam Honey Peach Black Tea": {"category":"fruit_tea","prices":{"m":7.39,"l":8.29},
-                                        "included_toppings":["milk foam"]},
-    "Honey Lemon Black Tea": {"category":"fruit_tea","prices":{"m":6.49,"l":7.39}},
-    "Chinese Sour Plum Drink": {"category":"fruit_tea","prices":{"m":5.99,"l":6.89}},
-
-    # ---------------- LATTE SERIES ----------------
-    "Strawberry Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69},
-                                "included_toppings":["brown sugar boba","sago","coconut jelly"]},
-    "Kiwi Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69}},
-    "Peach Matcha Latte": {"category":"latte","prices":{"m":6.79,"l":7.69}},
-    "Strawberry Ube Latte": {"category":"latte","prices":{"m":6.79,"l":7.69},
-                             "included_toppings":["brown sugar boba","sago","coconut jelly"]},
-    "Brown Sugar Bubble Latte": {"category":"latte","prices":{"m":6.59,"l":7.49},
-                                 "included_toppings":["brown sugar boba"]},
-
-    # ---------------- SAGO NECTAR (Caffeine Free) ----------------
-    "Mango Pomelo Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49},"topseller": True},
-    "Strawberry Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49},"topseller": True},
-    "Pina Colada Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
-    "Peach Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
-    "Lychee Bayberry Sago Nectar": {"category":"sago_nectar","prices":{"m":7.59,"l":8.49}},
-
-    # ---------------- SPARKLING (Caffeine Free, flavor variants) ----------------
-    "Sparkling Strawberry": {"category":"sparkling","prices":{"m":7.39,"l":8.29},"topseller": True},
-    "Sparkling Pineapple": {"category":"sparkling","prices":{"m":7.39,"l":8.29},"topseller": True},
-    "Sparkling Mango": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-    "Sparkling Kiwi": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-    "Sparkling Passion Fruit": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-    "Sparkling Peach": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-    "Sparkling Bayberry": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-    "Sparkling Orange": {"category":"sparkling","prices":{"m":7.39,"l":8.29}},
-
-    # ---------------- YOGURT SMOOTHIE (Caffeine Free, flavor variants) ----------------
-    "Mango Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Strawberry Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Passion Fruit Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Lychee Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Pineapple Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Peach Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Bayberry Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Orange Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Kiwi Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-    "Oreo Yogurt Smoothie": {"category":"yogurt_smoothie","prices":{"m":7.69,"l":8.59}},
-
-    # ---------------- HERBAL HEALTH TEA ----------------
-    "Chrysanthemum Goji Berry Cassia Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
-    "Longan Rose Ginger Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
-    "Jasmine Date Goji Berry Rose Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
-    "Brown Sugar Date Ginger Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
-    "Ginseng Mulberry Chrysanthemum Goji Berry Tea": {"category":"herbal","prices":{"m":5.99,"l":7.79}},
-
-    # ---------------- MILK SLUSH (Caffeine Free, flavor variants) ----------------
-    "Mango Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Passion Fruit Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Strawberry Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Lychee Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Pineapple Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Peach Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Bayberry Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Orange Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Kiwi Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Oreo Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Matcha Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-    "Taro Milk Slush": {"category":"milk_slush","prices":{"m":6.69,"l":7.89}},
-}
-
-VALID_SUGAR = {"0%","25%","50%","75%","100%"}
-VALID_ICE = {"no ice","less ice","regular ice","extra ice"}
-
-def _normalize_name(name: str) -> str:
-    return (name or "").strip().lower()
-
-def _find_item(name: str):
-    key = _normalize_name(name)
-    for item in MENU.keys():
-        if _normalize_name(item) == key:
-            return item
-    for item in MENU.keys():
-        if key and key in _normalize_name(item):
-            return item
-    return None
-
-def _price(name: str, size: str = None, toppings: list = None) -> Optional[float]:
-    """Return price for name + size (M/L). If toppings provided, include topping charges."""
-    item_key = _find_item(name)
-    if not item_key:
-        return None
-    info = MENU[item_key]
-
-    if not size:
-        return None  # force caller to specify M/L for price accuracy
-    size_l = size.strip().lower()
-    size_map = {
-        "m":"m", "medium":"m", "regular":"m", "s":"m", "small":"m",
-        "l":"l", "large":"l"
-    }
-    if size_l not in size_map:
-        return None
-    size_key = size_map[size_l]
-
-    base = info["prices"][size_key]
-
-    # toppings
-    included = set(t.lower() for t in info.get("included_toppings", []))
-    tops = toppings or []
-    extra_count = 0
-    for t in tops:
-        ct = _canon_topping(t)
-        if not ct:
-            continue
-        if ct.lower() not in included:
-            extra_count += 1
-    return round(base + extra_count * TOPPING_PRICE, 2)
-
-def _menu_list(query: str = None):
-    out = []
-    q = (query or "").strip().lower()
-    for name, meta in MENU.items():
-        if not q or q in name.lower() or q in meta["category"]:
-            out.append({
-                "name": name,
-                "category": meta["category"],
-                "prices": meta["prices"],
-                "topseller": meta.get("topseller", False),
-                "included_toppings": meta.get("included_toppings", [])
-            })
-    out.sort(key=lambda x: (not x["topseller"], x["category"], x["name"]))
-    return out
-
-def _calc_total(items: list):
-    """
-    items: [{name, size, qty, sugar, ice, toppings: [..]}]
-    """
-    total = 0.0
-    normalized_items = []
-
-    for it in items:
-        name = it.get("name","").strip()
-        size = (it.get("size") or "m").strip().lower()
-        qty = int(it.get("qty") or 1)
-        sugar = (it.get("sugar") or "100%").strip().lower()
-        ice = (it.get("ice") or "regular ice").strip().lower()
-        toppings = it.get("toppings") or []
-
-        if sugar not in {s.lower() for s in VALID_SUGAR}:
-            sugar = "100%"
-        if ice not in {i.lower() for i in VALID_ICE}:
-            ice = "regular ice"
-
-        unit_price = _price(name, size, toppings=toppings)
-        if unit_price is None:
-            return None, f"Item or size not found: {name} ({size})"
-
-        line_total = round(unit_price * qty, 2)
-        total += line_total
-
-        # canonicalize toppings for display
-        canon_toppings = []
-        for t in toppings:
-            ct = _canon_topping(t)
-            if ct: canon_toppings.append(ct)
-
-        normalized_items.append({
-            "name": _find_item(name),
-            "size": {"m":"M","medium":"M","regular":"M","s":"M","small":"M","l":"L","large":"L"}.get(size, size).upper(),
-            "qty": qty,
-            "sugar": sugar,
-            "ice": ice,
-            "toppings": canon_toppings,
-            "unit_price": unit_price,
-            "line_total": line_total
-        })
-
-    total = round(total, 2)
-    return {"items": normalized_items, "total": total}, None
-
-# ---------- Tool Schemas ----------
-TOOLS = [
-    {
-        "type": "function",
-        "function": {
-            "name": "get_menu",
-            "description": "Return menu items; optionally filter by a query (name/category). Topsellers first.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type":"string", "description":"Filter by keyword (optional)."}
-                }
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "get_price",
-            "description": "Return price for a specific drink and size (M or L). Includes topping charges if provided.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "name": {"type":"string", "description":"Drink name, e.g., Brown Sugar Bubble Tea."},
-                    "size": {"type":"string", "description":"M|L (required for accurate price)."},
-                    "toppings": {"type":"array","items":{"type":"string"},
-                                 "description":"Toppings to add (+$0.80 each)."}
-                },
-                "required": ["name"]
-            }
-        }
-    },
-    {
-        "type": "function",
-        "function": {
-            "name": "place_order",
-            "description": "Place a simple order. Returns normalized items, unit prices, line totals, and grand total.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "items": {
-                        "type": "array",
-                        "items": {
-                            "type":"object",
-                            "properties": {
-                                "name":{"type":"string"},
-                                "size":{"type":"string", "description":"M|L"},
-                                "qty":{"type":"integer"},
-                                "sugar":{"type":"string", "description":"0%|25%|50%|75%|100%"},
-                                "ice":{"type":"string", "description":"no/less/regular/extra ice"},
-                                "toppings":{"type":"array","items":{"type":"string"},
-                                            "description":"Toppings to add (+$0.80 each)."}
-                            },
-                            "required": ["name"]
-                        }
-                    }
-                },
-                "required": ["items"]
-            }
-        }
-    }
-]
-
-# ---------- Tool Implementations ----------
-def tool_get_menu(query=None):
-    return {"items": _menu_list(query)}
-
-def tool_get_price(name, size=None, toppings=None):
-    p = _price(name, size, toppings=toppings)
-    if p is None:
-        suggestion = _find_item(name)
-        return {"found": False, "price": None, "suggestion": suggestion}
-    return {"found": True, "price": p}
-
-def tool_place_order(items):
-    calculated, err = _calc_total(items)
-    if err:
-        return {"ok": False, "error": err}
-    order_id = str(uuid.uuid4())[:8]
-    calculated["order_id"] = order_id
-    calculated["currency"] = "USD"
-    return {"ok": True, **calculated}
+# Stream chat completions and start speaking at the first finished sentence (set to 0 to disable).
+STREAM_REPLIES = os.getenv("VOICE_AGENT_STREAM", "1") != "0"
+
+# STT upload encoding: flac (default), opus or wav. flac/opus need soundfile, otherwise wav is sent.
+UPLOAD_CODEC = os.getenv("VOICE_AGENT_UPLOAD_CODEC", "flac")
+# Uplink assumed when reporting upload time saved (kbit/s); store Wi-Fi uplinks are often ~1-2 Mbit/s.
+UPLINK_KBPS = float(os.getenv("VOICE_AGENT_UPLINK_KBPS", "1500"))
+
+# Persistent raw capture (one sox process per session) when sounddevice is not installed.
+CAPTURE_CMD = ["sox", "-q", "-d", "-t", "raw", "-r", "16000", "-e", "signed", "-b", "16", "-c", "1", "-"]
 
 # ---------- Core Loop: record -> STT -> agent (tools) -> TTS ----------
-def record_once():
-    print("Recording... speak now; pause ~1s to auto-stop.")
-    rec = subprocess.run(REC_CMD)
-    if rec.returncode != 0:
-        print("Recording failed. Check mic permissions (System Settings → Privacy & Security → Microphone).")
+# ---------- Capture: persistent input stream + in-process VAD endpointing ----------
+CAPTURE_RATE = 16000
+FRAME_MS = 30
+FRAME_SAMPLES = CAPTURE_RATE * FRAME_MS // 1000
+FRAME_BYTES = FRAME_SAMPLES * 2
+
+def _frame_rms(frame: bytes) -> float:
+    """RMS of a little-endian 16-bit PCM frame."""
+    if np is not None:
+        x = np.frombuffer(frame, dtype="<i2").astype(np.float32)
+        return float(np.sqrt(np.mean(x * x))) if len(x) else 0.0
+    x = array("h", frame)
+    if sys.byteorder == "big":
+        x.byteswap()
+    return math.sqrt(sum(v * v for v in x) / len(x)) if x else 0.0
+
+def _pcm_to_wav(pcm: bytes, rate: int = CAPTURE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return buf.getvalue()
+
+# ---------- Upload compaction (in front of STT) ----------
+UPLOAD_TRIM_MIN_RMS = 328.0   # same floor as the endpointer
+UPLOAD_TRIM_PAD_MS = 120      # keep a little context around the speech
+UPLOAD_PEAK = 0.9 * 32767
+UPLOAD_MAX_GAIN = 8.0
+UPLOAD_FORMATS = {"flac": ("input.flac", "FLAC", None), "opus": ("input.ogg", "OGG", "OPUS")}
+UPLOAD_STATS = Counter()
+
+def _pcm_frame_levels(pcm: bytes) -> list:
+    """Per-frame RMS of 16-bit PCM (whole frames only)."""
+    n = len(pcm) // FRAME_BYTES
+    if np is not None and n:
+        x = np.frombuffer(pcm, dtype="<i2", count=n * FRAME_SAMPLES).astype(np.float32).reshape(n, FRAME_SAMPLES)
+        return np.sqrt(np.mean(x * x, axis=1)).tolist()
+    return [_frame_rms(pcm[i * FRAME_BYTES:(i + 1) * FRAME_BYTES]) for i in range(n)]
+
+def _trim_silence(pcm: bytes) -> bytes:
+    """Drop leading/trailing silence, keeping UPLOAD_TRIM_PAD_MS on each side."""
+    levels = _pcm_frame_levels(pcm)
+    if not levels:
+        return pcm
+    noise = sorted(levels)[len(levels) // 5]
+    floor = max(UPLOAD_TRIM_MIN_RMS, 3.0 * noise)
+    voiced = [i for i, v in enumerate(levels) if v >= floor]
+    if not voiced:
+        return pcm
+    pad = UPLOAD_TRIM_PAD_MS // FRAME_MS
+    start = max(0, voiced[0] - pad)
+    end = min(len(levels), voiced[-1] + 1 + pad)
+    tail = pcm[end * FRAME_BYTES:] if end == len(levels) else b""  # partial last frame
+    return pcm[start * FRAME_BYTES:end * FRAME_BYTES] + tail
+
+def _normalize_gain(pcm: bytes) -> bytes:
+    """Boost quiet speech so its peak reaches UPLOAD_PEAK (never attenuates, gain capped)."""
+    if np is not None:
+        x = np.frombuffer(pcm, dtype="<i2")
+        peak = int(np.abs(x.astype(np.int32)).max()) if len(x) else 0
+        gain = min(UPLOAD_MAX_GAIN, UPLOAD_PEAK / peak) if peak else 1.0
+        if gain <= 1.05:
+            return pcm
+        return np.clip(x * gain, -32768, 32767).astype("<i2").tobytes()
+    x = array("h", pcm)
+    if sys.byteorder == "big":
+        x.byteswap()
+    peak = max((abs(v) for v in x), default=0)
+    gain = min(UPLOAD_MAX_GAIN, UPLOAD_PEAK / peak) if peak else 1.0
+    if gain <= 1.05:
+        return pcm
+    y = array("h", (max(-32768, min(32767, int(v * gain))) for v in x))
+    if sys.byteorder == "big":
+        y.byteswap()
+    return y.tobytes()
+
+def _encode_upload(pcm: bytes) -> tuple:
+    """(filename, bytes) in UPLOAD_CODEC, falling back to WAV."""
+    fmt = UPLOAD_FORMATS.get(UPLOAD_CODEC)
+    if fmt and sf is not None and np is not None:
+        name, container, subtype = fmt
+        try:
+            buf = io.BytesIO()
+            sf.write(buf, np.frombuffer(pcm, dtype="<i2"), CAPTURE_RATE, format=container, subtype=subtype)
+            return name, buf.getvalue()
+        except Exception:
+            pass  # libsndfile built without this codec
+    return "input.wav", _pcm_to_wav(pcm)
+
+def compact_for_upload(pcm: bytes) -> tuple:
+    """Trim, normalize and encode raw capture PCM for STT; returns (filename, bytes) and updates UPLOAD_STATS."""
+    t0 = time.perf_counter()
+    name, data = _encode_upload(_normalize_gain(_trim_silence(pcm)))
+    UPLOAD_STATS["uploads"] += 1
+    UPLOAD_STATS["raw_bytes"] += len(pcm) + 44  # what the plain WAV upload would have been
+    UPLOAD_STATS["sent_bytes"] += len(data)
+    UPLOAD_STATS["prep_ms"] += (time.perf_counter() - t0) * 1000
+    return name, data
+
+def _upload_report(before: Counter, after: Counter) -> str:
+    raw = after["raw_bytes"] - before["raw_bytes"]
+    sent = after["sent_bytes"] - before["sent_bytes"]
+    if not raw:
+        return ""
+    saved_ms = (raw - sent) * 8 / UPLINK_KBPS
+    prep_ms = after["prep_ms"] - before["prep_ms"]
+    return (f"upload {sent / 1024:.1f} KB instead of {raw / 1024:.1f} KB, "
+            f"~{saved_ms:.0f} ms saved at {UPLINK_KBPS:.0f} kbit/s (prep {prep_ms:.0f} ms)")
+
+class FrameRing:
+    """Fixed-capacity frame buffer between the capture thread and the endpointer; the oldest frames drop first."""
+
+    def __init__(self, capacity: int):
+        self.frames = deque(maxlen=capacity)
+        self.cond = threading.Condition()
+        self.closed = False
+
+    def push(self, frame: bytes):
+        with self.cond:
+            self.frames.append(frame)
+            self.cond.notify()
+
+    def pop(self, timeout: float = None):
+        with self.cond:
+            self.cond.wait_for(lambda: self.frames or self.closed, timeout)
+            return self.frames.popleft() if self.frames else None
+
+    def clear(self):
+        with self.cond:
+            self.frames.clear()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+class MicCapture:
+    """
+    One capture stream for the whole session (sounddevice, else a single sox process)
+    feeding a FrameRing. frames() drops whatever was heard before it was called,
+    e.g. the agent's own reply.
+    """
+    RING_SECONDS = 30
+
+    def __init__(self):
+        self.ring = FrameRing(self.RING_SECONDS * 1000 // FRAME_MS)
+        self.stream = self.proc = None
+        if sd is not None:
+            self.stream = sd.RawInputStream(samplerate=CAPTURE_RATE, channels=1, dtype="int16",
+                                            blocksize=FRAME_SAMPLES,
+                                            callback=lambda data, n, t, status: self.ring.push(bytes(data)))
+            self.stream.start()
+        else:
+            self.proc = subprocess.Popen(CAPTURE_CMD, stdout=subprocess.PIPE)
+            threading.Thread(target=self._read_proc, daemon=True).start()
+
+    def _read_proc(self):
+        while True:
+            frame = self.proc.stdout.read(FRAME_BYTES)
+            if len(frame) < FRAME_BYTES:
+                break
+            self.ring.push(frame)
+        self.ring.close()
+
+    def frames(self):
+        self.ring.clear()
+        while True:
+            frame = self.ring.pop(timeout=1.0)
+            if frame is None:
+                if self.ring.closed:
+                    return
+                continue
+            yield frame
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+        if self.proc is not None:
+            self.proc.terminate()
+        self.ring.close()
+
+class WavCapture:
+    """Replays recorded WAV files (16 kHz, mono, 16-bit) as microphone input, one file per turn."""
+
+    def __init__(self, paths: list):
+        self.paths = list(paths)
+        self.current = None
+
+    @property
+    def exhausted(self) -> bool:
+        return not self.paths
+
+    def frames(self):
+        if not self.paths:
+            return
+        path = self.current = self.paths.pop(0)
+        with wave.open(path, "rb") as w:
+            if (w.getframerate(), w.getnchannels(), w.getsampwidth()) != (CAPTURE_RATE, 1, 2):
+                raise ValueError(f"{path}: expected 16 kHz mono 16-bit PCM")
+            while True:
+                frame = w.readframes(FRAME_SAMPLES)
+                if len(frame) < FRAME_BYTES:
+                    break
+                yield frame
+
+    def close(self):
+        pass
+
+class Endpointer:
+    """
+    Frame-level energy VAD with an adaptive noise floor.
+    Speech starts after START_MS of voiced frames (a pre-roll keeps the onset) and ends
+    after HANG_MS of silence, or SHORT_HANG_MS when the utterance already sounds
+    complete: long enough, with energy trailing off at the end. MAX_MS caps a turn.
+    """
+    START_MS = 150
+    PRE_ROLL_MS = 300
+    HANG_MS = 800
+    SHORT_HANG_MS = 350
+    COMPLETE_MIN_MS = 1200
+    MAX_MS = 10000
+    MIN_RMS = 328.0  # ~1% of full scale, the old sox threshold
+    NOISE_RATIO = 3.0
+    TAIL_FRAMES = 5
+
+    def __init__(self):
+        self.noise = self.MIN_RMS / self.NOISE_RATIO
+
+    def _is_speech(self, rms: float) -> bool:
+        if rms > max(self.MIN_RMS, self.noise * self.NOISE_RATIO):
+            return True
+        self.noise = 0.95 * self.noise + 0.05 * rms
         return False
-    return True
 
-def transcribe():
-    with open("input.wav","rb") as f:
-        r = client.audio.transcriptions.create(
+    def _sounds_complete(self, voiced_ms: int, levels: list) -> bool:
+        if voiced_ms < self.COMPLETE_MIN_MS or len(levels) <= self.TAIL_FRAMES:
+            return False
+        tail = sum(levels[-self.TAIL_FRAMES:]) / self.TAIL_FRAMES
+        body = sorted(levels)[len(levels) // 2]
+        return tail < 0.5 * body
+
+    def capture(self, frames, on_frame=None):
+        """
+        Raw PCM of the next utterance from a frame iterator, or None if no speech was heard.
+        on_frame(frame, is_speech) sees each utterance frame as soon as it is captured.
+        """
+        pre = deque(maxlen=self.PRE_ROLL_MS // FRAME_MS)
+        out, levels = [], []
+        started, run, silence_ms, voiced_ms = False, 0, 0, 0
+        for frame in frames:
+            rms = _frame_rms(frame)
+            speech = self._is_speech(rms)
+            if not started:
+                pre.append((frame, speech))
+                run = run + 1 if speech else 0
+                if run * FRAME_MS >= self.START_MS:
+                    started, voiced_ms = True, run * FRAME_MS
+                    for f, sp in pre:
+                        out.append(f)
+                        if on_frame:
+                            on_frame(f, sp)
+                continue
+            out.append(frame)
+            if on_frame:
+                on_frame(frame, speech)
+            if speech:
+                silence_ms = 0
+                voiced_ms += FRAME_MS
+                levels.append(rms)
+            else:
+                silence_ms += FRAME_MS
+            hang = self.SHORT_HANG_MS if self._sounds_complete(voiced_ms, levels) else self.HANG_MS
+            if silence_ms >= hang or len(out) * FRAME_MS >= self.MAX_MS:
+                break
+        return b"".join(out) if started else None
+
+def transcribe(pcm: bytes, prompt: str = None) -> str:
+    """Transcribe raw 16 kHz capture PCM (compacted first); prompt passes preceding text for context."""
+    kwargs = {"prompt": prompt} if prompt else {}
+    with TRACER.span("stt.upload", audio_ms=len(pcm) * 1000 // (CAPTURE_RATE * 2)) as span:
+        upload = compact_for_upload(pcm)
+        span.set(bytes=len(upload[1]))
+        r = get_client().audio.transcriptions.create(
             model="gpt-4o-mini-transcribe",
-            file=f,
+            file=upload,
+            **kwargs
         )
     return (r.text or "").strip()
 
-def agent_reply(conversation: list) -> str:
+# ---------- Streaming STT (providers behind one interface) ----------
+class Transcriber(ABC):
     """
-    Agent with function calling support.
-    - The model may request multiple tool calls; we execute then feed back.
-    - Up to 3 tool rounds.
-    conversation is mutated with assistant/tool messages so history persists.
+    Per-turn STT interface: begin(), then feed(frame, is_speech) while the customer is
+    still talking, then finish() for the final transcript. Providers that have interim
+    text report it through on_partial(text).
     """
-    tool_rounds = 0
-
-    while True:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=conversation,
-            tools=TOOLS,
-            tool_choice="auto"
-        )
-        choice = resp.choices[0]
-        message = choice.message
-
-        assistant_msg = {"role": message.role, "content": message.content or ""}
-        if message.tool_calls:
-            tool_payloads = []
-            for tc in message.tool_calls:
-                tool_payloads.append({
-                    "id": tc.id,
-                    "type": tc.type,
-                    "function": {
-                        "name": tc.function.name,
-                        "arguments": tc.function.arguments,
-                    }
-                })
-            assistant_msg["tool_calls"] = tool_payloads
-        conversation.append(assistant_msg)
-
-        tool_calls = message.tool_calls or []
-        if tool_calls:
-            tool_rounds += 1
-            if tool_rounds > 3:
-                return "I didn't catch that—could you please repeat your question?"
-
-            for tc in tool_calls:
-                name = tc.function.name
-                try:
-                    args = json.loads(tc.function.arguments or "{}")
-                except json.JSONDecodeError:
-                    result = {"error": "invalid arguments"}
-                else:
-                    result = {"error": f"unknown tool: {name}"}
-                    try:
-                        if name == "get_menu":
-                            result = tool_get_menu(**args)
-                        elif name == "get_price":
-                            result = tool_get_price(**args)
-                        elif name == "place_order":
-                            result = tool_place_order(**args)
-                    except Exception as e:
-                        result = {"error": str(e)}
-
-                conversation.append({
-                    "role":"tool",
-                    "tool_call_id": tc.id,
-                    "content": json.dumps(result)
-                })
-            continue
-
-        final_text = (message.content or "").strip()
-        if not final_text:
-            final_text = "I didn't catch that—could you please repeat your question?"
-        return final_text
-
-def speak(text: str):
-    audio = client.audio.speech.create(
-        model="gpt-4o-mini-tts",
-        voice="alloy",
-        input=text
-    )
-    with open("reply.mp3","wb") as f:
-        f.write(audio.read())
-    subprocess.run(["afplay" if sys.platform=="darwin" else "play", "reply.mp3"])
-
-def main():
+
+    def __init__(self, on_partial=None):
+        self.on_partial = on_partial
+
+    def begin(self):
+        pass
+
+    @abstractmethod
+    def feed(self, frame: bytes, is_speech: bool):
+        """Take one captured frame, as soon as it is captured."""
+
+    @abstractmethod
+    def finish(self) -> str:
+        """The final transcript once the utterance has ended."""
+
+    def _partial(self, text: str):
+        if self.on_partial and text:
+            self.on_partial(text)
+
+class BatchTranscriber(Transcriber):
+    """Uploads the whole utterance after endpointing (no overlap)."""
+
+    def begin(self):
+        self._frames = []
+
+    def feed(self, frame: bytes, is_speech: bool):
+        self._frames.append(frame)
+
+    def finish(self) -> str:
+        return transcribe(b"".join(self._frames)) if self._frames else ""
+
+class ChunkedTranscriber(Transcriber):
+    """
+    Overlaps STT with capture: each time the speaker pauses briefly mid-utterance, the
+    audio since the last cut is transcribed on a worker thread (with the text so far as
+    prompt) while capture continues. After endpointing only the last chunk is left.
+    """
+    PAUSE_MS = 240
+    MIN_CHUNK_MS = 1200
+
+    def begin(self):
+        self._chunk, self._silence_ms, self._voiced = [], 0, False
+        self._texts = []
+        self._jobs = queue.Queue()
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._worker.start()
+
+    def feed(self, frame: bytes, is_speech: bool):
+        self._chunk.append(frame)
+        self._voiced = self._voiced or is_speech
+        self._silence_ms = 0 if is_speech else self._silence_ms + FRAME_MS
+        if self._silence_ms >= self.PAUSE_MS and len(self._chunk) * FRAME_MS >= self.MIN_CHUNK_MS:
+            self._cut()
+
+    def _cut(self):
+        if self._voiced:  # trailing silence is not worth an upload
+            self._jobs.put(b"".join(self._chunk))
+        self._chunk, self._voiced = [], False
+
+    def _work(self):
+        while True:
+            pcm = self._jobs.get()
+            if pcm is None:
+                break
+            try:
+                text = transcribe(pcm, prompt=" ".join(self._texts) or None)
+            except Exception as e:
+                print(f"STT chunk failed: {e}")
+                continue
+            if text:
+                self._texts.append(text)
+                self._partial(" ".join(self._texts))
+
+    def finish(self) -> str:
+        self._cut()
+        self._jobs.put(None)
+        self._worker.join()
+        return " ".join(self._texts).strip()
+
+class ReplayTranscriber(Transcriber):
+    """
+    Local stand-in for tests and demos without network: pairs each replayed WAV
+    fixture with its expected transcript (turn1.wav -> turn1.txt) and reveals the
+    words in step with the speech frames fed, ending with the full text.
+    """
+
+    def __init__(self, capture: "WavCapture", on_partial=None):
+        super().__init__(on_partial)
+        self.capture = capture
+
+    def begin(self):
+        path = Path(self.capture.current or "")
+        txt = path.with_suffix(".txt")
+        self._words = txt.read_text().split() if txt.is_file() else []
+        self._speech_frames = 0
+        self._shown = 0
+
+    def feed(self, frame: bytes, is_speech: bool):
+        if not is_speech or not self._words:
+            return
+        self._speech_frames += 1
+        shown = min(len(self._words), self._speech_frames * FRAME_MS // 300)  # ~one word per 300 ms of speech
+        if shown > self._shown:
+            self._shown = shown
+            self._partial(" ".join(self._words[:shown]))
+
+    def finish(self) -> str:
+        return " ".join(self._words)
+
+STT_PROVIDERS = {"batch": BatchTranscriber, "chunked": ChunkedTranscriber, "replay": ReplayTranscriber}
+
+# ---------- TTS Playback: streamed PCM into one long-lived sink per session ----------
+# OpenAI "pcm" speech output: 24 kHz, 16-bit signed little-endian, mono.
+TTS_SAMPLE_RATE = 24000
+TTS_BYTES_PER_SEC = TTS_SAMPLE_RATE * 2
+TTS_CHUNK_BYTES = 4096
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+TTS_FORMAT = "pcm"
+
+def _synthesize_stream(text: str):
+    """Yield raw PCM chunks as the TTS response arrives."""
+    with get_client().audio.speech.with_streaming_response.create(
+        model=TTS_MODEL,
+        voice=TTS_VOICE,
+        input=text,
+        response_format=TTS_FORMAT
+    ) as resp:
+        yield from resp.iter_bytes(TTS_CHUNK_BYTES)
+
+# ---------- TTS audio cache ----------
+GREETING = "Hi, welcome to Angel Tea! What can I get for you today?"
+STOCK_PHRASES = (GREETING, FALLBACK_REPLY)  # pre-rendered at startup
+TTS_CACHE_DIR = Path(os.getenv("VOICE_AGENT_TTS_CACHE", Path.home() / ".cache" / "angeltea-voice" / "tts"))
+TTS_CACHE_MEM_BYTES = 32 * 1024 * 1024
+TTS_CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+class TTSCache:
+    """
+    Content-addressed LRU of synthesized PCM, in memory and on disk. Keys hash
+    (text, voice, model, format), so changing any of them never serves stale audio.
+    Both tiers evict least-recently-used clips once over their byte budget. The
+    directory is created and indexed on first use, not when the cache is built.
+    """
+
+    def __init__(self, directory: Path = None, mem_bytes: int = TTS_CACHE_MEM_BYTES,
+                 disk_bytes: int = TTS_CACHE_DISK_BYTES):
+        self.directory = Path(directory) if directory else None
+        self.mem_bytes, self.disk_bytes = mem_bytes, disk_bytes
+        self._mem = OrderedDict()   # key -> pcm
+        self._mem_size = 0
+        self._disk = OrderedDict()  # key -> size, oldest first
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self._indexed = self.directory is None
+        self.stats = Counter()
+
+    def _index_disk(self):
+        """Create the directory and index the clips already in it, once; call with _lock held."""
+        if self._indexed:
+            return
+        self._indexed = True
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.pcm"), key=lambda f: f.stat().st_mtime)
+        except OSError as e:
+            print(f"TTS disk cache disabled: {e}")
+            self.directory, files = None, []
+        for f in files:
+            size = f.stat().st_size
+            self._disk[f.stem] = size
+            self._disk_size += size
+
+    @staticmethod
+    def key(text: str, voice: str = TTS_VOICE, model: str = TTS_MODEL, fmt: str = TTS_FORMAT) -> str:
+        return hashlib.sha256(json.dumps([text, voice, model, fmt]).encode()).hexdigest()
+
+    def get(self, text: str) -> Optional[bytes]:
+        k = self.key(text)
+        with self._lock:
+            self._index_disk()
+            pcm = self._mem.get(k)
+            if pcm is not None:
+                self._mem.move_to_end(k)
+                self.stats["memory_hits"] += 1
+                return pcm
+            if k not in self._disk:
+                self.stats["misses"] += 1
+                return None
+        path = self.directory / f"{k}.pcm"
+        try:
+            pcm = path.read_bytes()
+            os.utime(path)  # recency survives restarts via mtime
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk.pop(k, 0)
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            if k in self._disk:
+                self._disk.move_to_end(k)
+            self._remember(k, pcm)
+            self.stats["disk_hits"] += 1
+        return pcm
+
+    def put(self, text: str, pcm: bytes):
+        if not pcm:
+            return
+        k = self.key(text)
+        with self._lock:
+            self._index_disk()
+            self._remember(k, pcm)
+            if not self.directory or k in self._disk or len(pcm) > self.disk_bytes:
+                return
+            self._disk[k] = len(pcm)
+            self._disk_size += len(pcm)
+            evicted = []
+            while self._disk_size > self.disk_bytes:
+                old, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old)
+        try:
+            tmp = self.directory / f"{k}.tmp"
+            tmp.write_bytes(pcm)
+            os.replace(tmp, self.directory / f"{k}.pcm")
+            for old in evicted:
+                (self.directory / f"{old}.pcm").unlink(missing_ok=True)
+        except OSError as e:
+            print(f"TTS cache write failed: {e}")
+
+    def _remember(self, k: str, pcm: bytes):
+        if k in self._mem or len(pcm) > self.mem_bytes:
+            return
+        self._mem[k] = pcm
+        self._mem_size += len(pcm)
+        while self._mem_size > self.mem_bytes:
+            _, old = self._mem.popitem(last=False)
+            self._mem_size -= len(old)
+
+    def prerender(self, phrases):
+        """Synthesize any phrases not cached yet (run at startup)."""
+        with self._lock:
+            self._index_disk()
+        for text in phrases:
+            if self.key(text) in self._mem or self.key(text) in self._disk:
+                continue
+            try:
+                self.put(text, b"".join(_synthesize_stream(text)))
+                self.stats["prerendered"] += 1
+            except Exception as e:
+                print(f"Pre-render failed for {text!r}: {e}")
+
+TTS_CACHE = TTSCache(TTS_CACHE_DIR)
+
+# Pre-render readback segments (menu names, toppings, levels, numbers) at startup; set to 0 to skip.
+PRERENDER_SEGMENTS = os.getenv("VOICE_AGENT_PRERENDER_SEGMENTS", "1") != "0"
+SPLICE_GAP_MS = 40
+SPLICE_STATS = Counter()
+
+def render_spliced(segments: list) -> Optional[bytes]:
+    """Concatenate cached clips for each segment phrase, or None if any is not cached yet."""
+    clips = []
+    for seg in segments:
+        pcm = TTS_CACHE.get(seg)
+        if pcm is None:
+            SPLICE_STATS["fallbacks"] += 1
+            return None
+        clips.append(pcm)
+    SPLICE_STATS["spliced"] += 1
+    return bytes(TTS_BYTES_PER_SEC * SPLICE_GAP_MS // 1000).join(clips)
+
+def _pcm_chunks(pcm: bytes):
+    for i in range(0, len(pcm), TTS_CHUNK_BYTES):
+        yield pcm[i:i + TTS_CHUNK_BYTES]
+
+def _speech_chunks(text: str):
+    """
+    PCM chunks for text: replayed from TTS_CACHE, else spliced from cached segments
+    when it is a registered readback, else streamed from TTS and cached.
+    """
+    text = text.strip()
+    pcm = TTS_CACHE.get(text)
+    source = "cache"
+    if pcm is None and text in READBACK_PLANS:
+        pcm, source = render_spliced(READBACK_PLANS[text]), "splice"
+    if pcm is not None:
+        TRACER.mark("tts.first_chunk", source=source)
+        yield from _pcm_chunks(pcm)
+        return
+    parts = []
+    with TRACER.span("tts.synth", chars=len(text)):
+        for chunk in _synthesize_stream(text):
+            if not parts:
+                TRACER.mark("tts.first_chunk", source="api")
+            parts.append(chunk)
+            yield chunk
+    TTS_CACHE.put(text, b"".join(parts))  # only reached when the stream completed
+
+class PipePlayerSink:
+    """One `play` (SoX) process for the whole session, fed raw PCM on stdin."""
+    CMD = ["play", "-q", "-t", "raw", "-r", str(TTS_SAMPLE_RATE), "-e", "signed", "-b", "16", "-c", "1", "-"]
+
+    def __init__(self):
+        self.proc = subprocess.Popen(self.CMD, stdin=subprocess.PIPE)
+        self._until = 0.0
+
+    def write(self, pcm: bytes):
+        self.proc.stdin.write(pcm)
+        self.proc.stdin.flush()
+        self._until = max(self._until, time.monotonic()) + len(pcm) / TTS_BYTES_PER_SEC
+
+    def drain(self):
+        """Wait until the audio written so far should have finished playing."""
+        delay = self._until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait()
+
+class SoundDeviceSink:
+    """In-process output stream (used when the sounddevice package is installed)."""
+
+    def __init__(self):
+        self.stream = sd.RawOutputStream(samplerate=TTS_SAMPLE_RATE, channels=1, dtype="int16")
+        self.stream.start()
+        self._carry = b""
+
+    def write(self, pcm: bytes):
+        pcm = self._carry + pcm
+        cut = len(pcm) - len(pcm) % 2  # whole 16-bit frames only
+        self._carry = pcm[cut:]
+        if cut:
+            self.stream.write(pcm[:cut])
+
+    def drain(self):
+        time.sleep(self.stream.latency)
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+def _open_audio_sink():
+    return SoundDeviceSink() if sd is not None else PipePlayerSink()
+
+class SpeechPipeline:
+    """
+    Speaks sentences in order as they arrive: one thread streams TTS audio for each
+    sentence into a chunk queue, another writes chunks to the session's sink, so
+    playback starts on the first chunk and the next sentence is fetched meanwhile.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._texts = queue.Queue()
+        self._chunks = queue.Queue()
+        self._threads = [threading.Thread(target=self._synth_loop, daemon=True),
+                         threading.Thread(target=self._play_loop, daemon=True)]
+        for t in self._threads:
+            t.start()
+
+    def say(self, sentence: str):
+        self._texts.put(sentence)
+
+    def finish(self):
+        """Block until everything queued has been played."""
+        self._texts.put(None)
+        for t in self._threads:
+            t.join()
+        with TRACER.span("play.drain"):
+            self.sink.drain()
+
+    def _synth_loop(self):
+        while True:
+            text = self._texts.get()
+            if text is None:
+                break
+            try:
+                for chunk in _speech_chunks(text):
+                    self._chunks.put(chunk)
+            except Exception as e:
+                print(f"TTS failed: {e}")
+        self._chunks.put(None)
+
+    def _play_loop(self):
+        first = True
+        while True:
+            chunk = self._chunks.get()
+            if chunk is None:
+                break
+            if first:
+                TRACER.mark("play.start")
+                first = False
+            self.sink.write(chunk)
+
+def speak(text: str, sink):
+    for i, chunk in enumerate(_speech_chunks(text)):
+        if i == 0:
+            TRACER.mark("play.start")
+        sink.write(chunk)
+    with TRACER.span("play.drain"):
+        sink.drain()
+
+def speak_reply(text: str, sink):
+    """
+    Speak a finished reply (e.g. from REPLY_CACHE) the way it was first spoken:
+    sentence by sentence when streaming, so each sentence's audio comes from TTS_CACHE.
+    """
+    if not STREAM_REPLIES:
+        speak(text, sink)
+        return
+    splitter, speech = SentenceSplitter(), SpeechPipeline(sink)
+    for sentence in splitter.feed(text + " ") + splitter.flush():
+        speech.say(sentence)
+    speech.finish()
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Angel Tea voice ordering demo")
+    parser.add_argument("--input-wav", nargs="+", metavar="WAV",
+                        help="Use recorded 16 kHz mono WAV files (one per turn) instead of the microphone.")
+    parser.add_argument("--stt", choices=sorted(STT_PROVIDERS), default="chunked",
+                        help="chunked (default) transcribes while you speak; batch uploads after you stop; "
+                             "replay reads the transcript next to each --input-wav file (turn1.wav -> turn1.txt).")
+    args = parser.parse_args(argv)
+    if args.stt == "replay" and not args.input_wav:
+        parser.error("--stt replay needs --input-wav")
+    try:
+        get_client()
+    except RuntimeError as e:
+        sys.exit(str(e))
+
     print("\nVoice Ordering Demo (Angel Tea)")
-    print("Press Enter each round. Speak, then pause ~1s; it will transcribe, answer, and speak back.")
+    print("Press Enter each round. Speak, then pause briefly; it will transcribe, answer, and speak back.")
     print("Try examples like:")
     print("- 'What do you recommend?'")
     print("- 'How much is a large Brown Sugar Bubble Tea?'")
     print("- 'Two M Angel Milk Tea, 50% sugar, less ice; one L Mango Pomelo Sago Nectar with boba.'\n")
     round_id = 1
-    conversation = [{"role":"system","content": SYSTEM_PROMPT}]
+    memory = ConversationMemory(SYSTEM_PROMPT, cart=CART)
+    capture = WavCapture(args.input_wav) if args.input_wav else MicCapture()
+    endpointer = Endpointer()
+    on_partial = lambda text: print("  …", text)
+    stt = ReplayTranscriber(capture, on_partial) if args.stt == "replay" else STT_PROVIDERS[args.stt](on_partial)
+    sink = _open_audio_sink()
     try:
+        speak(GREETING, sink)
+        phrases = list(STOCK_PHRASES) + (readback_segment_phrases() if PRERENDER_SEGMENTS else [])
+        threading.Thread(target=TTS_CACHE.prerender, args=(phrases,), daemon=True).start()
         while True:
-            input(f"[Round {round_id}] Press Enter to record...")
-            ok = record_once()
-            if not ok:
+            if args.input_wav:
+                if capture.exhausted:
+                    break
+            else:
+                input(f"[Round {round_id}] Press Enter to record...")
+            print("Listening... speak now; pause briefly to finish.")
+            TRACER.begin_turn(round_id)
+            frames = capture.frames()
+            first = next(frames, None)  # starts the turn (and picks the next WAV when replaying)
+            uploads_before = Counter(UPLOAD_STATS)
+            stt.begin()
+            with TRACER.span("capture") as span:
+                pcm = endpointer.capture(chain([first] if first else [], frames), on_frame=stt.feed)
+                span.set(speech_ms=len(pcm or b"") * 1000 // (CAPTURE_RATE * 2))
+            t_end = time.perf_counter()
+            with TRACER.span("stt.final", provider=args.stt):
+                text = stt.finish()
+            if not pcm:
+                print("(no speech detected)")
                 continue
-            text = transcribe()
-            print("You:", text or "(empty)")
+            print(f"You: {text or '(empty)'}  [transcript {1000 * (time.perf_counter() - t_end):.0f} ms after end of speech]")
+            report = _upload_report(uploads_before, UPLOAD_STATS)
+            if report:
+                print("  STT", report)
             if not text:
                 continue
-            conversation.append({"role":"user","content": text})
-            answer = agent_reply(conversation)
-            print("Agent:", answer)
-            speak(answer)
+            has_context = memory.has_context()
+            conversation = memory.begin_turn(text)
+            turn_stats = {}
+            with TRACER.span("fast_path") as span:
+                answer = fast_path_reply(text, cart=CART)
+                span.set(hit=bool(answer))
+            cached = None
+            if not answer:
+                with TRACER.span("reply_cache") as span:
+                    cached = REPLY_CACHE.get(text, has_context=has_context)
+                    span.set(hit=bool(cached))
+            if answer:
+                conversation.append({"role":"assistant","content": answer})
+                print("Agent:", answer)
+                speak(answer, sink)
+            elif cached:
+                answer = cached.reply
+                conversation.append({"role":"assistant","content": answer})
+                print("Agent:", answer, f"  [cached reply, ~{cached.latency_ms:.0f} ms LLM time saved]")
+                speak_reply(answer, sink)
+            else:
+                started = time.perf_counter()
+                if STREAM_REPLIES:
+                    speech = SpeechPipeline(sink)
+                    with TRACER.span("agent", stream=True):
+                        answer = agent_reply_stream(conversation, speech.say, turn_stats)
+                else:
+                    with TRACER.span("agent"):
+                        answer = agent_reply(conversation, turn_stats)
+                latency_ms = (time.perf_counter() - started) * 1000
+                print("Agent:", answer)
+                if STREAM_REPLIES:
+                    speech.finish()
+                else:
+                    speak(answer, sink)
+                if turn_is_stateless(memory.turn_messages(conversation)):
+                    REPLY_CACHE.put(text, answer, latency_ms, has_context=has_context)
+            memory.end_turn(conversation)
+            print(f"  context: ~{memory.last_prompt_tokens} prompt tokens this turn, "
+                  f"{len(memory.turns)} turns kept, {memory.dropped_turns} compacted")
+            if turn_stats.get("usage"):
+                prompt = sum(u["prompt_tokens"] for u in turn_stats["usage"])
+                cached = sum(u["cached_tokens"] for u in turn_stats["usage"])
+                print(f"  prompt cache: {cached}/{prompt} tokens cached over {turn_stats['llm_rounds']} round(s)")
+            TRACER.end_turn()
             round_id += 1
     except KeyboardInterrupt:
+        pass
+    finally:
+        if LOOKUP_STATS:
+            print("\nLookup stats:", dict(LOOKUP_STATS))
+        if FAST_PATH_STATS["turns"]:
+            print(f"Fast path: {FAST_PATH_STATS['hits']}/{FAST_PATH_STATS['turns']} turns "
+                  f"({fast_path_hit_rate():.0%}) answered without the LLM")
+        if UPLOAD_STATS["uploads"]:
+            print("STT uploads:", _upload_report(Counter(), UPLOAD_STATS))
+        if SPLICE_STATS:
+            print("Spliced readbacks:", dict(SPLICE_STATS))
+        if TTS_CACHE.stats:
+            print("TTS cache:", dict(TTS_CACHE.stats))
+        if REPLY_CACHE.stats:
+            print(f"Reply cache: {REPLY_CACHE.stats['hits']} hits, {REPLY_CACHE.hit_rate():.0%} of lookups, "
+                  f"~{REPLY_CACHE.saved_ms / 1000:.1f} s of LLM time saved")
+        if TOOL_CACHE.stats:
+            print(f"Tool result cache: {dict(TOOL_CACHE.stats)} ({TOOL_CACHE.hit_rate():.0%} hits)")
+        TRACER.close()
         print("\nBye!")
+        capture.close()
+        sink.close()
 
 if __name__ == "__main__":
     main()
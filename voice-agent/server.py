@@ -0,0 +1,271 @@
+# file: server.py
+# Purpose: Async multi-session Angel Tea voice agent service. One process serves many
+#          kiosks and phone lines at once over plain HTTP/1.1 (stdlib asyncio, no web framework).
+# Usage:
+#   1) pip install --upgrade openai
+#   2) export OPENAI_API_KEY="sk-..."
+#   3) python server.py --port 8080
+#
+# API (JSON unless noted):
+#   POST   /sessions                 -> {"session_id"}
+#   POST   /sessions/<id>/turn       body {"text": "..."} or a WAV clip (Content-Type: audio/wav);
+#                                    ?speak=0 skips TTS
+#                                    -> {"transcript", "reply", "fast_path", "cached", "audio_wav_b64"}
+#                                    (or "tts_error" instead of audio when TTS fails after the turn ran)
+#   DELETE /sessions/<id>
+#   GET    /stats                    sessions and bytes per session, per-endpoint limiter gauges,
+#                                    fast-path, tool-cache and reply-cache hit rates (+ LLM time saved)
+#
+# Every session has its own cart and conversation memory (agent_engine.sessions), and
+# its turns run one at a time. Idle sessions expire after VOICE_AGENT_SESSION_TTL.
+# All sessions share one pooled AsyncOpenAI client, and STT, chat and TTS requests
+# each go through their own concurrency limit. A saturated endpoint answers 503
+# with Retry-After instead of queueing without bound.
+
+import argparse, asyncio, base64, json, os, re, sys, time
+from urllib.parse import parse_qs, urlsplit
+
+from agent_engine import (
+    REPLY_CACHE, TOOL_CACHE, Overloaded, Session, SessionStore, UpstreamLimiter, agent_reply_async,
+    fast_path_hit_rate, fast_path_reply, get_async_client, turn_is_stateless,
+)
+
+# ---------- Config ----------
+STT_MODEL = "gpt-4o-mini-transcribe"
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+MAX_BODY_BYTES = 4 * 1024 * 1024  # ~2 min of 16 kHz mono WAV
+_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 413: "Payload Too Large", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str, headers: dict = None):
+        super().__init__(message)
+        self.status, self.headers = status, headers or {}
+
+
+SWEEP_INTERVAL_S = 30
+
+
+class VoiceAgentService:
+    def __init__(self, client=None, limiter: UpstreamLimiter = None, sessions: SessionStore = None):
+        self.client = client or get_async_client()
+        self.limiter = limiter or UpstreamLimiter()
+        self.sessions = sessions or SessionStore()
+        self.turns = 0
+        self.started = time.monotonic()
+
+    def close_session(self, session_id: str):
+        if not self.sessions.close(session_id):
+            raise HTTPError(404, "unknown session")
+
+    async def sweep_sessions(self):
+        """Evict idle sessions in the background so memory is freed without new traffic."""
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL_S)
+            self.sessions.sweep()
+
+    async def transcribe(self, wav: bytes) -> str:
+        async with self.limiter.slot("stt"):
+            r = await self.client.audio.transcriptions.create(model=STT_MODEL, file=("turn.wav", wav))
+        return (r.text or "").strip()
+
+    async def synthesize(self, text: str) -> bytes:
+        async with self.limiter.slot("tts"):
+            r = await self.client.audio.speech.create(model=TTS_MODEL, voice=TTS_VOICE, input=text,
+                                                      response_format="wav")
+        return r.content
+
+    async def turn(self, session: Session, text: str = None, wav: bytes = None, speak: bool = True) -> dict:
+        """
+        One turn: STT (for audio), fast path, reply cache or the async tool loop, then TTS.
+        TTS runs after the turn is committed, so a TTS failure is reported in "tts_error"
+        next to the reply rather than as an error status a client would retry.
+        """
+        async with session.lock:
+            session.last_active = time.monotonic()
+            if wav is not None:
+                text = await self.transcribe(wav)
+            out = {"transcript": text, "reply": None, "fast_path": False, "cached": False}
+            if not text:
+                return out
+            has_context = session.memory.has_context()  # the shared reply cache only serves first turns
+            conversation = session.memory.begin_turn(text)
+            answer = fast_path_reply(text, cart=session.cart)
+            cached = None if answer else REPLY_CACHE.get(text, has_context=has_context)
+            if answer:
+                conversation.append({"role": "assistant", "content": answer})
+                out["fast_path"] = True
+            elif cached:
+                answer = cached.reply
+                conversation.append({"role": "assistant", "content": answer})
+                out["cached"] = True
+            else:
+                stats = {}
+                started = time.perf_counter()
+                answer = await agent_reply_async(conversation, stats, client=self.client,
+                                                 run_tool=session.run_tool, limiter=self.limiter)
+                out["llm_rounds"] = stats["llm_rounds"]
+                if turn_is_stateless(session.memory.turn_messages(conversation)):
+                    cached = REPLY_CACHE.put(text, answer, (time.perf_counter() - started) * 1000,
+                                             has_context=has_context)
+            session.memory.end_turn(conversation)
+            self.sessions.enforce(session)
+            session.turns += 1
+            self.turns += 1
+            out["reply"] = answer
+            if speak:
+                audio = cached.audio if cached else None
+                if audio is None:
+                    try:
+                        audio = await self.synthesize(answer)
+                    except Exception as e:  # the turn is committed: answer 200 so a retry can't repeat it
+                        out["tts_error"] = str(e) if isinstance(e, Overloaded) else type(e).__name__
+                        return out
+                    if cached:
+                        cached.audio = audio  # later hits serve text and audio with no upstream call
+                out["audio_wav_b64"] = base64.b64encode(audio).decode("ascii")
+            return out
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self.sessions),
+            "turns": self.turns,
+            "uptime_s": round(time.monotonic() - self.started),
+            "fast_path_hit_rate": round(fast_path_hit_rate(), 3),
+            "tool_cache": {**TOOL_CACHE.stats, "hit_rate": round(TOOL_CACHE.hit_rate(), 3)},
+            "reply_cache": REPLY_CACHE.snapshot(),
+            "upstream": self.limiter.snapshot(),
+            "memory": self.sessions.stats(),
+        }
+
+    # ---------- HTTP ----------
+    _SESSION_RE = re.compile(r"^/sessions/([0-9a-f]{32})(/turn)?$")
+
+    async def route(self, method: str, target: str, headers: dict, body: bytes):
+        url = urlsplit(target)
+        if url.path == "/sessions":
+            if method != "POST":
+                raise HTTPError(405, "use POST")
+            return 201, {"session_id": self.sessions.create().id}
+        if url.path == "/stats":
+            return 200, self.stats()
+        m = self._SESSION_RE.match(url.path)
+        if not m:
+            raise HTTPError(404, "not found")
+        if not m.group(2):
+            if method != "DELETE":
+                raise HTTPError(405, "use DELETE")
+            self.close_session(m.group(1))
+            return 204, None
+        if method != "POST":
+            raise HTTPError(405, "use POST")
+        session = self.sessions.get(m.group(1))
+        if session is None:
+            raise HTTPError(404, "unknown or expired session")
+        speak = parse_qs(url.query).get("speak", ["1"])[0] != "0"
+        if headers.get("content-type", "").startswith("audio/"):
+            return 200, await self.turn(session, wav=body, speak=speak)
+        try:
+            text = str(json.loads(body or b"{}").get("text") or "").strip()
+        except (ValueError, AttributeError):
+            raise HTTPError(400, 'expected {"text": "..."} or an audio/wav body') from None
+        return 200, await self.turn(session, text=text, speak=speak)
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve keep-alive HTTP/1.1 requests on one connection until the client closes it."""
+        try:
+            while True:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                extra = {}
+                try:
+                    status, payload = await self.route(method, target, headers, body)
+                except HTTPError as e:
+                    status, payload, extra = e.status, {"error": str(e)}, e.headers
+                except Overloaded as e:
+                    status, payload = 503, {"error": str(e)}
+                    extra = {"Retry-After": str(max(1, round(e.retry_after)))}
+                except Exception as e:  # keep the connection usable; the error goes back to the caller
+                    status, payload = 502, {"error": f"upstream error: {type(e).__name__}"}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _write_response(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except HTTPError as e:  # malformed request: answer once, then drop the connection
+            await _write_response(writer, e.status, {"error": str(e)}, e.headers, False)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, _ = line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "bad request line") from None
+    headers = {}
+    while True:
+        h = await reader.readline()
+        if h in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = h.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(400, "bad Content-Length") from None
+    if length < 0:
+        raise HTTPError(400, "bad Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"body over {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, headers, body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, payload, headers: dict, keep_alive: bool):
+    body = b"" if payload is None else json.dumps(payload).encode()
+    head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}",
+            "Content-Type: application/json",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    head += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()  # a slow reader holds its own turn back, not the event loop
+
+
+async def serve(host: str, port: int):
+    service = VoiceAgentService()
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"Angel Tea voice agent service on http://{host}:{port}  (limits: {service.limiter.limits})")
+    sweeper = asyncio.create_task(service.sweep_sessions())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        await service.client.close()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Angel Tea multi-session voice agent service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args(argv)
+    if not os.getenv("OPENAI_API_KEY"):
+        sys.exit("Missing OPENAI_API_KEY. Run: export OPENAI_API_KEY='sk-...'")
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nBye!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+# Make agent_engine importable when pytest runs from the repo root or voice-agent/.
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
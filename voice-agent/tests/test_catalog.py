@@ -0,0 +1,43 @@
+import json
+
+import continuous_demo
+from agent_engine import CART, TOOL_CACHE, run_tool_json
+
+
+def _quote(items):
+    return json.loads(run_tool_json("quote_items", json.dumps({"items": items}), cart=continuous_demo.CART))
+
+
+def test_small_menu_prices_with_three_sizes():
+    assert _quote([{"name": "Oolong Milk Tea", "size": "small"}])["total"] == 5.25
+    assert _quote([{"name": "Oolong Milk Tea", "size": "large"}])["total"] == 7.09
+    two = _quote([{"name": "Brown Sugar Milk Tea", "size": "large", "qty": 2, "sugar": "50%", "ice": "less ice"}])
+    assert two["readback"] == "2 large Brown Sugar Milk Tea (50% sugar, less ice) $15.40. Total $15.40."
+
+
+def test_small_menu_uses_the_engine_cart_and_skips_the_shared_cache():
+    cart = continuous_demo.CART
+    cart.clear()
+    before = dict(TOOL_CACHE.stats)
+    menu = json.loads(run_tool_json("get_menu", '{"fields": "names"}', cart=cart))
+    assert sorted(menu["items"]) == sorted(continuous_demo.MENU)
+    assert dict(TOOL_CACHE.stats) == before
+    run_tool_json("add_to_cart", json.dumps({"items": [{"name": "taro milk tea", "size": "m"}]}), cart=cart)
+    assert cart.block().startswith("Cart:\n1) 1 M Taro Milk Tea") and not CART.lines
+    assert json.loads(run_tool_json("place_order", "{}", cart=cart))["total"] == 6.78
+
+
+def test_small_menu_tool_schemas_describe_its_sizes_and_categories():
+    tools = {t["function"]["name"]: t["function"] for t in continuous_demo.TOOLS}
+    assert tools["get_price"]["parameters"]["properties"]["size"]["description"].startswith("S|M|L")
+    assert "toppings" not in tools["get_price"]["parameters"]["properties"]
+    filters = tools["recommend"]["parameters"]["properties"]["filters"]["properties"]
+    assert filters["category"]["description"] == "e.g. milk_tea, tea, fruit_tea" and "topping" not in filters
+    assert "+$" not in json.dumps(continuous_demo.TOOLS)
+
+
+def test_small_menu_sells_no_toppings():
+    args = {"name": "Taro Milk Tea", "size": "small", "toppings": ["boba"]}
+    price = json.loads(run_tool_json("get_price", json.dumps(args), cart=continuous_demo.CART))
+    assert price["price"] is None and price["unavailable_toppings"] == ["boba"]
+    assert _quote([args]) == {"ok": False, "error": "Topping not available: boba"}
@@ -0,0 +1,38 @@
+import pytest
+
+from agent_engine.menu import CAFFEINE_FREE_CATEGORIES, MENU, MENU_FACETS
+
+
+def _scan(pred) -> set:
+    return {name for name, info in MENU.items() if pred(name, info)}
+
+
+@pytest.mark.parametrize("filters, pred", [
+    ({"category": "herbal"}, lambda n, i: i["category"] == "herbal"),
+    ({"category": "milk tea"}, lambda n, i: i["category"] == "milk_tea"),
+    ({"topseller": True}, lambda n, i: i.get("topseller", False)),
+    ({"flavor": "oreo"}, lambda n, i: "oreo" in n.lower().split()),
+    ({"topping": "boba"}, lambda n, i: "brown sugar boba" in i.get("included_toppings", ())),
+    ({"category": "milk_slush", "max_price": 6.69}, lambda n, i: i["category"] == "milk_slush"),
+    ({"category": "milk_slush", "max_price": 6.68}, lambda n, i: False),
+    ({"size": "l", "min_price": 8.5}, lambda n, i: i["prices"]["l"] >= 8.5),
+    ({"flavor": "lychee", "category": "milk tea"}, lambda n, i: n == "Lychee Jasmine Milk Tea"),
+])
+def test_facet_queries_return_expected_sets(filters, pred):
+    assert set(MENU_FACETS.select(filters)) == _scan(pred)
+
+
+def test_caffeine_free_includes_every_caffeine_free_category():
+    expected = _scan(lambda n, i: i["category"] in CAFFEINE_FREE_CATEGORIES)
+    assert expected <= set(MENU_FACETS.select({"caffeine_free": True}))
+
+
+def test_unknown_facet_values_match_nothing():
+    assert MENU_FACETS.select({"category": "pizza"}) == []
+    assert MENU_FACETS.select({"topping": "anchovies"}) == []
+
+
+def test_topsellers_first_then_cheapest():
+    names = MENU_FACETS.select({})
+    keys = [(not MENU[n].get("topseller", False), MENU[n]["prices"]["m"]) for n in names]
+    assert keys == sorted(keys)
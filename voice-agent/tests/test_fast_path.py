@@ -0,0 +1,51 @@
+import json
+
+from agent_engine import Session, fast_path_reply
+
+
+def test_fast_path_order_lands_in_the_session_cart():
+    session, other = Session("a"), Session("b")
+    reply = fast_path_reply("Two large Taro Milk Tea, 50% sugar", cart=session.cart)
+    assert reply.startswith("Got it:")
+    assert [(line.qty, line.size, line.name, line.sugar) for line in session.cart.lines] == \
+        [(2, "L", "Taro Milk Tea", "50%")]
+    assert not other.cart.lines
+
+
+def test_edit_turn_after_fast_path_order():
+    session = Session("s")
+    conversation = session.memory.begin_turn("one large mango milk slush")
+    conversation.append({"role": "assistant", "content": fast_path_reply(conversation[-1]["content"],
+                                                                         cart=session.cart)})
+    session.memory.end_turn(conversation)
+
+    # "make that a medium" bails out of the fast path; the model edits line 1 of the cart it sees.
+    conversation = session.memory.begin_turn("make that a medium")
+    assert fast_path_reply("make that a medium", cart=session.cart) is None
+    assert any("1) 1 L Mango Milk Slush" in (m["content"] or "") for m in conversation if m["role"] == "system")
+    result = json.loads(session.run_tool("update_cart_line", json.dumps({"line": 1, "size": "m"})))
+    assert result["ok"] and result["items"][0]["size"] == "M" and result["total"] == 6.69
+
+    placed = json.loads(session.run_tool("place_order", "{}"))
+    assert placed["ok"] and placed["total"] == 6.69
+    assert not session.cart.lines
+
+
+def test_fast_path_prices_from_the_cart_catalog():
+    import continuous_demo
+
+    cart = continuous_demo.CART
+    cart.clear()
+    price = fast_path_reply("how much is a large taro milk tea", cart=cart)
+    assert price == "A large Taro Milk Tea is $7.76."
+    assert fast_path_reply("one large taro milk tea", cart=cart)
+    assert cart.view()["items"][0]["unit_price"] == 7.76
+    assert fast_path_reply("how much is a large taro milk tea with boba", cart=cart) is None  # no toppings sold
+    cart.clear()
+
+
+def test_zero_quantity_falls_through_to_the_model():
+    session = Session("s")
+    assert fast_path_reply("0 large taro milk tea", cart=session.cart) is None
+    assert fast_path_reply("how much is 0 large taro milk tea", cart=session.cart) is None
+    assert not session.cart.lines
@@ -0,0 +1,26 @@
+import pytest
+
+from agent_engine.menu import MENU, MENU_FUZZY, _find_item
+
+
+@pytest.mark.parametrize("spoken, expected", [
+    ("tarro milk tea", "Taro Milk Tea"),
+    ("mango yogert smoothie", "Mango Yogurt Smoothie"),
+    ("strawbery milk slush", "Strawberry Milk Slush"),
+    ("matcha milk slsh", "Matcha Milk Slush"),
+    ("passionfruit yogurt smoothie", "Passion Fruit Yogurt Smoothie"),
+    ("jasmin milk tea", "Jasmine Milk Tea"),
+])
+def test_misspellings_map_to_the_right_item(spoken, expected):
+    assert MENU_FUZZY.resolve(spoken) == expected
+    assert _find_item(spoken) == expected
+
+
+@pytest.mark.parametrize("word", ["xyz", "bread", "sandwich", "water please", "hot dog"])
+def test_unrelated_words_return_none(word):
+    assert MENU_FUZZY.resolve(word) is None
+    assert _find_item(word) is None
+
+
+def test_exact_names_resolve_to_themselves():
+    assert all(MENU_FUZZY.resolve(name.lower()) == name for name in MENU)
@@ -0,0 +1,63 @@
+import json
+from types import SimpleNamespace
+
+from agent_engine import FALLBACK_REPLY, Session, agent_reply, fast_path_reply
+from agent_engine.agent import MAX_TOOL_ROUNDS, MEMORY_MAX_ORDERS
+
+
+def _turn(session: Session, text: str, reply: str = None):
+    conversation = session.memory.begin_turn(text)
+    reply = reply or fast_path_reply(text, cart=session.cart)
+    conversation.append({"role": "assistant", "content": reply})
+    session.memory.end_turn(conversation)
+
+
+def test_orders_placed_outside_the_tool_loop_are_remembered():
+    session = Session("s")
+    _turn(session, "two large taro milk tea")
+    placed = json.loads(session.run_tool("place_order", "{}"))  # e.g. a confirmation turn
+    _turn(session, "that's all", "Your order is placed.")
+    assert session.memory.orders == [(placed["order_id"], placed["readback"])]
+    assert f"#{placed['order_id']}" in session.memory.state_block()["content"]
+
+
+def test_orders_are_capped_and_counted_in_the_budget():
+    session = Session("s")
+    ids = []
+    for _ in range(MEMORY_MAX_ORDERS + 2):
+        _turn(session, "one medium mango milk slush")
+        ids.append(json.loads(session.run_tool("place_order", "{}"))["order_id"])
+        _turn(session, "yes please", "Placed.")
+    assert [order_id for order_id, _ in session.memory.orders] == ids[-MEMORY_MAX_ORDERS:]
+    turns = sum(t.tokens for t in session.memory.turns)
+    assert session.memory.orders_tokens > 0
+    assert session.memory.history_tokens() == turns + session.memory.orders_tokens
+
+
+class _AlwaysCallsTools:
+    """Chat client whose every completion asks for another get_menu call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **_):
+        self.calls += 1
+        call = SimpleNamespace(id=f"c{self.calls}", type="function",
+                               function=SimpleNamespace(name="get_menu", arguments="{}"))
+        message = SimpleNamespace(role="assistant", content="", tool_calls=[call])
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def test_tool_round_cap_leaves_no_unanswered_tool_calls_in_history():
+    session = Session("s")
+    conversation = session.memory.begin_turn("what do you have")
+    client = _AlwaysCallsTools()
+    assert agent_reply(conversation, client=client, run_tool=session.run_tool) == FALLBACK_REPLY
+    assert client.calls == MAX_TOOL_ROUNDS + 1
+    session.memory.end_turn(conversation)
+    messages = session.memory.begin_turn("hello?")
+    assert messages[-2] == {"role": "assistant", "content": FALLBACK_REPLY}
+    answered = {m["tool_call_id"] for m in messages if m["role"] == "tool"}
+    requested = {tc["id"] for m in messages for tc in (m.get("tool_calls") or ())}
+    assert requested == answered
@@ -0,0 +1,41 @@
+import json
+
+import pytest
+
+from agent_engine import MENU, TOPPINGS, run_tool
+from agent_engine.menu import _find_item, _match_topping
+
+
+@pytest.mark.parametrize("spoken, expected", [
+    ("long gun rose ginger", "Longan Rose Ginger Tea"),
+    ("lung an rose ginger tea", "Longan Rose Ginger Tea"),
+])
+def test_stt_misrecognitions_resolve(spoken, expected):
+    assert _find_item(spoken) == expected
+
+
+def test_sego_is_sago():
+    assert _match_topping("sego")[0] == "sago"
+
+
+@pytest.mark.parametrize("word", ["bread", "pancake", "mint", "sandwich", "hamburger"])
+def test_unrelated_words_are_not_items(word):
+    assert _find_item(word) is None
+
+
+@pytest.mark.parametrize("word", ["cream", "creme", "crema", "grape", "papaya", "pie", "whip",
+                                  "sugar", "brownie", "milk"])
+def test_unrelated_words_are_not_toppings(word):
+    assert _match_topping(word) == (None, ())
+
+
+def test_every_name_resolves_to_itself():
+    assert all(_find_item(name) == name for name in MENU)
+    assert all(_match_topping(t)[0] == t for t in TOPPINGS)
+
+
+def test_unknown_item_is_reported_not_substituted():
+    price = run_tool("get_price", json.dumps({"name": "bread", "size": "m"}))
+    assert price["found"] is False and price["price"] is None
+    order = run_tool("place_order", json.dumps({"items": [{"name": "mint", "toppings": ["whip", "grape"]}]}))
+    assert order["ok"] is False
@@ -0,0 +1,49 @@
+import random
+
+import pytest
+
+from agent_engine.menu import MENU, TOPPING_PRICE, TOPPINGS, _calc_total, _calc_totals, _price
+
+
+def _float_total(items: list) -> float:
+    """The pre-cents float arithmetic: round each unit and line to 2 places, then the sum."""
+    total = 0.0
+    for it in items:
+        info = MENU[it["name"]]
+        included = {t.lower() for t in info.get("included_toppings", [])}
+        extra = sum(1 for t in it["toppings"] if t.lower() not in included)
+        unit = round(info["prices"][it["size"]] + extra * TOPPING_PRICE, 2)
+        total += round(unit * it["qty"], 2)
+    return round(total, 2)
+
+
+def _random_cart(rng: random.Random) -> list:
+    return [{"name": rng.choice(list(MENU)), "size": rng.choice("ml"), "qty": rng.randint(1, 12),
+             "toppings": rng.sample(TOPPINGS, rng.randint(0, 3))} for _ in range(rng.randint(1, 8))]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_cent_totals_match_float_totals(seed):
+    rng = random.Random(seed)
+    for _ in range(25):
+        cart = _random_cart(rng)
+        result, err = _calc_total(cart)
+        assert err is None
+        assert result["total"] == pytest.approx(_float_total(cart), abs=1e-9)
+
+
+def test_unit_prices_match_float_prices():
+    for name, info in MENU.items():
+        for size in ("m", "l"):
+            for toppings in ([], TOPPINGS[:1], TOPPINGS[:3]):
+                included = {t.lower() for t in info.get("included_toppings", [])}
+                extra = sum(1 for t in toppings if t not in included)
+                assert _price(name, size, toppings) == pytest.approx(
+                    round(info["prices"][size] + extra * TOPPING_PRICE, 2), abs=1e-9)
+
+
+def test_batch_quote_matches_single_quotes():
+    rng = random.Random(7)
+    carts = [_random_cart(rng) for _ in range(30)] + [[{"name": "not a drink", "size": "m"}]]
+    assert _calc_totals(carts) == [_calc_total(c) for c in carts]
+
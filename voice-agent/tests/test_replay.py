@@ -0,0 +1,69 @@
+import math
+import wave
+from itertools import chain
+
+import pytest
+
+from demov2 import CAPTURE_RATE, FRAME_MS, Endpointer, ReplayTranscriber, Transcriber, WavCapture
+
+
+def _write_wav(path, segments, rate=CAPTURE_RATE):
+    """segments: [(ms, amplitude)]; a 440 Hz tone for speech, zeros for silence."""
+    samples = []
+    for ms, amp in segments:
+        samples += [round(amp * math.sin(2 * math.pi * 440 * n / rate)) for n in range(rate * ms // 1000)]
+    with wave.open(str(path), "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"".join(s.to_bytes(2, "little", signed=True) for s in samples))
+
+
+def _turn(capture, endpointer, stt):
+    """One turn the way demov2.main runs it."""
+    frames = capture.frames()
+    first = next(frames, None)
+    stt.begin()
+    pcm = endpointer.capture(chain([first] if first else [], frames), on_frame=stt.feed)
+    return pcm, stt.finish()
+
+
+def test_replayed_wav_turns_drive_endpointer_and_transcripts(tmp_path):
+    paths = []
+    for n, (speech_ms, text) in enumerate([(1500, "one large taro milk tea"), (900, "that's all")], 1):
+        path = tmp_path / f"turn{n}.wav"
+        _write_wav(path, [(300, 0), (speech_ms, 8000), (1200, 0)])
+        path.with_suffix(".txt").write_text(text)
+        paths.append(str(path))
+    capture, endpointer, partials = WavCapture(paths), Endpointer(), []
+    stt = ReplayTranscriber(capture, partials.append)
+
+    pcm, text = _turn(capture, endpointer, stt)
+    assert text == "one large taro milk tea"
+    assert partials[0] == "one" and partials[-1] == text  # words revealed as speech frames arrive
+    speech_ms = len(pcm) * 1000 // (CAPTURE_RATE * 2)
+    assert 1500 <= speech_ms < 1500 + 300 + Endpointer.HANG_MS + FRAME_MS  # pre-roll + hangover, then cut
+
+    pcm, text = _turn(capture, endpointer, stt)
+    assert pcm and text == "that's all"
+    assert capture.exhausted
+
+
+def test_silent_wav_yields_no_utterance(tmp_path):
+    path = tmp_path / "quiet.wav"
+    _write_wav(path, [(1000, 0)])
+    capture = WavCapture([str(path)])
+    pcm, text = _turn(capture, Endpointer(), ReplayTranscriber(capture))
+    assert pcm is None and text == ""
+
+
+def test_wav_capture_rejects_other_formats(tmp_path):
+    path = tmp_path / "cd.wav"
+    _write_wav(path, [(100, 0)], rate=44100)
+    with pytest.raises(ValueError):
+        list(WavCapture([str(path)]).frames())
+
+
+def test_transcriber_is_abstract():
+    with pytest.raises(TypeError):
+        Transcriber()
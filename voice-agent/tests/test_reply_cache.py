@@ -0,0 +1,32 @@
+from agent_engine import ReplyCache, Session
+
+
+def _finish_turn(session: Session, text: str, reply: str):
+    conversation = session.memory.begin_turn(text)
+    conversation.append({"role": "assistant", "content": reply})
+    session.memory.end_turn(conversation)
+
+
+def test_first_turn_reply_is_shared():
+    cache, a, b = ReplyCache(), Session("a"), Session("b")
+    assert cache.put("What do you recommend?", "Try the Taro Milk Tea.", 900, has_context=a.memory.has_context())
+    hit = cache.get("um, what do you recommend", has_context=b.memory.has_context())
+    assert hit is not None and hit.reply == "Try the Taro Milk Tea."
+
+
+def test_context_dependent_turns_do_not_leak_between_sessions():
+    cache, a, b = ReplyCache(), Session("a"), Session("b")
+    _finish_turn(a, "Can I get a taro milk tea?", "Medium or large?")
+    assert a.memory.has_context()
+    assert cache.put("large", "One large Taro Milk Tea, $7.49.", 900, has_context=a.memory.has_context()) is None
+    _finish_turn(b, "What's in the mango slush?", "Mango and milk, blended with ice.")
+    for text in ("large", "yes", "no thanks", "50% sugar", "and a medium?", "what about the mango?"):
+        assert cache.get(text, has_context=b.memory.has_context()) is None
+    assert cache.stats["stores"] == 0 and cache.stats["hits"] == 0
+
+
+def test_cart_lines_count_as_context():
+    s = Session("s")
+    assert not s.memory.has_context()
+    s.cart.add([{"name": "Taro Milk Tea", "size": "m"}])
+    assert s.memory.has_context()
@@ -0,0 +1,88 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from agent_engine import Overloaded, Session, UpstreamLimiter, agent_reply_async
+from server import HTTPError, _read_request
+
+
+def _completion(content="", tool_calls=()):
+    calls = [SimpleNamespace(id=f"c{i}", type="function", function=SimpleNamespace(name=n, arguments=a))
+             for i, (n, a) in enumerate(tool_calls)]
+    message = SimpleNamespace(role="assistant", content=content, tool_calls=calls or None)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+class _ScriptedChat:
+    """Async chat client replaying completions; waits on `gate` before each round after the first."""
+
+    def __init__(self, replies, gate=None):
+        self.replies, self.gate, self.calls = list(replies), gate, 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **_):
+        self.calls += 1
+        if self.calls > 1 and self.gate:
+            await self.gate.wait()
+        return self.replies.pop(0)
+
+
+def test_turn_holds_one_chat_slot_for_all_rounds():
+    async def scenario():
+        limiter = UpstreamLimiter({"chat": 1}, max_queued=0)
+        session, gate = Session("s"), asyncio.Event()
+        add = json.dumps({"items": [{"name": "Taro Milk Tea", "size": "l"}]})
+        client = _ScriptedChat([_completion(tool_calls=[("add_to_cart", add)]), _completion("Added.")], gate)
+        turn = asyncio.ensure_future(agent_reply_async(session.memory.begin_turn("a large taro"), client=client,
+                                                       run_tool=session.run_tool, limiter=limiter))
+        while client.calls < 2:
+            await asyncio.sleep(0)
+        # Round 2 is pending with the cart already changed: another turn is shed, this one is not.
+        with pytest.raises(Overloaded):
+            await agent_reply_async([], client=_ScriptedChat([]), limiter=limiter)
+        gate.set()
+        assert await turn == "Added."
+        assert len(session.cart.lines) == 1
+        assert limiter.in_flight["chat"] == 0 and limiter.stats["chat.admitted"] == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("length", ["abc", "-5", "1.5"])
+def test_malformed_content_length_is_a_400(length):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f"POST /sessions HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode())
+        reader.feed_eof()
+        return await _read_request(reader)
+
+    with pytest.raises(HTTPError) as e:
+        asyncio.run(read())
+    assert e.value.status == 400
+
+
+class _SaturatedTTS:
+    def __init__(self):
+        self.audio = SimpleNamespace(speech=SimpleNamespace(create=self._create))
+
+    async def _create(self, **_):
+        raise AssertionError("TTS slot should have been refused")
+
+
+def test_tts_overload_after_a_committed_turn_is_not_an_error_status():
+    from server import VoiceAgentService
+
+    async def scenario():
+        limiter = UpstreamLimiter({"tts": 1}, max_queued=0)
+        service = VoiceAgentService(client=_SaturatedTTS(), limiter=limiter)
+        session = service.sessions.create()
+        async with limiter.slot("tts"):  # another turn holds the only TTS slot
+            out = await service.turn(session, text="one medium mango milk slush")
+        assert out["fast_path"] and out["reply"]
+        assert "audio_wav_b64" not in out and "tts" in out["tts_error"]
+        assert [line.name for line in session.cart.lines] == ["Mango Milk Slush"]
+        assert session.turns == 1
+
+    asyncio.run(scenario())
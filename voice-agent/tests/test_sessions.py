@@ -0,0 +1,31 @@
+import asyncio
+
+import pytest
+
+from agent_engine import Overloaded, SessionStore
+
+
+def test_lru_eviction_skips_sessions_in_a_turn():
+    async def scenario():
+        store = SessionStore(max_sessions=2)
+        busy, idle = store.create(), store.create()
+        async with busy.lock:  # busy is the least recently used but mid-turn
+            third = store.create()
+        assert store.get(busy.id) is busy and store.get(third.id) is third
+        assert store.get(idle.id) is None
+        assert store.evictions["lru"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_create_is_refused_when_every_session_is_in_a_turn():
+    async def scenario():
+        store = SessionStore(max_sessions=2)
+        a, b = store.create(), store.create()
+        async with a.lock, b.lock:
+            with pytest.raises(Overloaded):
+                store.create()
+        assert len(store) == 2 and store.evictions["create_refused"] == 1
+        assert store.create() and store.get(a.id) is None  # once idle, the LRU one goes
+
+    asyncio.run(scenario())
@@ -0,0 +1,66 @@
+import json
+from types import SimpleNamespace
+
+from agent_engine import SentenceSplitter, agent_reply_stream
+from agent_engine.agent import _merge_tool_call_deltas
+
+
+def _call(index, id=None, name=None, arguments=None):
+    return SimpleNamespace(index=index, id=id, type="function" if id else None,
+                           function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def _chunk(content=None, tool_calls=None):
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content, tool_calls=tool_calls))],
+                           usage=None)
+
+
+# Two tool calls whose fragments arrive interleaved: ids and names only on the first
+# fragment of each, arguments split mid-token, and one chunk carrying both indexes.
+TOOL_CALL_CHUNKS = [
+    _chunk(tool_calls=[_call(0, "call_a", "get_pr")]),
+    _chunk(tool_calls=[_call(0, name="ice", arguments='{"name": "Taro')]),
+    _chunk(tool_calls=[_call(1, "call_b", "get_price", '{"na')]),
+    _chunk(tool_calls=[_call(0, arguments=' Milk Tea", "si'), _call(1, arguments='me": "Mango Milk Slush",')]),
+    _chunk(tool_calls=[_call(1, arguments=' "size": "M"}')]),
+    _chunk(tool_calls=[_call(0, arguments='ze": "L"}')]),
+]
+
+
+def test_interleaved_tool_call_deltas_assemble_by_index():
+    calls = {}
+    for chunk in TOOL_CALL_CHUNKS:
+        _merge_tool_call_deltas(calls, chunk.choices[0].delta.tool_calls)
+    assert [calls[i]["id"] for i in sorted(calls)] == ["call_a", "call_b"]
+    assert calls[0]["function"] == {"name": "get_price", "arguments": '{"name": "Taro Milk Tea", "size": "L"}'}
+    assert json.loads(calls[1]["function"]["arguments"]) == {"name": "Mango Milk Slush", "size": "M"}
+
+
+class _ScriptedStream:
+    def __init__(self, rounds):
+        self.rounds = list(rounds)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **_: iter(self.rounds.pop(0))))
+
+
+def test_stream_runs_both_tool_calls_then_speaks_sentences():
+    ran, spoken = [], []
+
+    def run_tool(name, arguments):
+        ran.append((name, json.loads(arguments)))
+        return {"found": True}
+
+    text = ["Sure. A large Taro is $7", ".19, and a medium Mango is $6.29! Anything else?"]
+    client = _ScriptedStream([TOOL_CALL_CHUNKS, [_chunk(t) for t in text]])
+    reply = agent_reply_stream([], spoken.append, client=client, run_tool=run_tool)
+    assert ran == [("get_price", {"name": "Taro Milk Tea", "size": "L"}),
+                   ("get_price", {"name": "Mango Milk Slush", "size": "M"})]
+    assert spoken == ["Sure.", "A large Taro is $7.19, and a medium Mango is $6.29!", "Anything else?"]
+    assert reply == "".join(text)
+
+
+def test_splitter_keeps_abbreviations_inside_the_sentence():
+    splitter = SentenceSplitter()
+    out = splitter.feed("Ask Dr. Lee about the 16 oz. cup. We also have e.g. ")
+    out += splitter.feed("taro. Thanks")
+    assert out == ["Ask Dr. Lee about the 16 oz. cup.", "We also have e.g. taro."]
+    assert splitter.flush() == ["Thanks"]
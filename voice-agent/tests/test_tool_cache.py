@@ -0,0 +1,54 @@
+import copy
+import json
+
+from agent_engine import Cart, MENU, MENU_VERSION, TOOL_CACHE, ToolResultCache, run_tool_json
+from agent_engine.menu import TOPPING_PRICE, TOPPING_SYNONYMS, TOPPINGS, _WEB_TAGS, menu_version
+
+
+def test_menu_edit_changes_the_version_and_misses_the_cache(monkeypatch):
+    assert menu_version(MENU, TOPPINGS, TOPPING_SYNONYMS, TOPPING_PRICE, _WEB_TAGS) == MENU_VERSION
+    edited = copy.deepcopy(MENU)
+    edited["Taro Milk Tea"]["prices"]["l"] += 0.50
+    new_version = menu_version(edited, TOPPINGS, TOPPING_SYNONYMS, TOPPING_PRICE, _WEB_TAGS)
+    assert new_version != MENU_VERSION
+
+    args = '{"name": "Taro Milk Tea", "size": "L"}'
+    run_tool_json("get_price", args)
+    misses = TOOL_CACHE.stats["misses"]
+    run_tool_json("get_price", args)
+    assert TOOL_CACHE.stats["misses"] == misses  # cached under the current version
+
+    monkeypatch.setattr(TOOL_CACHE, "version", new_version)  # as after a restart with the edited menu
+    run_tool_json("get_price", args)
+    assert TOOL_CACHE.stats["misses"] == misses + 1
+
+
+def test_menu_tools_hit_and_cart_tools_bypass_the_cache():
+    cart = Cart()
+    args = json.dumps({"items": [{"name": "Taro Milk Tea", "size": "m"}]})
+    first = run_tool_json("get_price", '{"name": "Mango Milk Slush", "size": "M"}', cart=cart)
+    before = dict(TOOL_CACHE.stats)
+    assert run_tool_json("get_price", '{"name": "Mango Milk Slush", "size": "M"}', cart=cart) == first
+    assert TOOL_CACHE.stats["hits"] == before.get("hits", 0) + 1
+
+    before = dict(TOOL_CACHE.stats)
+    for _ in range(2):
+        run_tool_json("add_to_cart", args, cart=cart)
+    run_tool_json("quote_items", args, cart=cart)
+    assert dict(TOOL_CACHE.stats) == before
+    assert len(cart.lines) == 2  # both calls ran; neither was served from the cache
+
+
+def test_each_result_takes_one_entry_however_it_was_spelled():
+    cache = ToolResultCache(max_entries=2)
+    spellings = ['{"name": "Taro Milk Tea", "size": "L"}', '{"size": "L", "name": "taro milk tea"}']
+    key, content = cache.lookup("get_price", spellings[0])
+    assert content is None
+    cache.put(key, "taro")
+    assert cache.lookup("get_price", spellings[1]) == (None, "taro")
+    assert cache.lookup("get_price", spellings[0]) == (None, "taro")  # via the alias
+    assert len(cache) == 1
+    for drink in ("Mango Milk Slush", "Angel Milk Tea"):
+        cache.put(cache.lookup("get_price", json.dumps({"name": drink}))[0], drink)
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    assert cache.lookup("get_price", spellings[0])[1] is None  # the oldest result was evicted
@@ -0,0 +1,40 @@
+import json
+
+from agent_engine import Cart, run_tool_json
+from agent_engine.menu import TOPPING_SYNONYMS, TOPPINGS, ToppingMatcher, _canon_toppings
+
+POPPING = tuple(t for t in TOPPINGS if t.endswith("popping bubbles"))
+
+
+def test_ambiguous_topping_options_follow_menu_order():
+    assert ToppingMatcher(TOPPINGS, TOPPING_SYNONYMS).match("bubbles") == (None, POPPING)
+    # Same answer however the synonyms were declared and however often it is asked.
+    shuffled = ToppingMatcher(TOPPINGS, dict(reversed(list(TOPPING_SYNONYMS.items()))))
+    assert [shuffled.match("bubbles") for _ in range(3)] == [(None, POPPING)] * 3
+    assert shuffled.match("jelly") == (None, ("coconut jelly", "herbal jelly"))
+
+
+def test_canon_toppings_splits_canonical_and_ambiguous():
+    canon, ambiguous = _canon_toppings(["extra boba please", "Coconut", "bubbles", "no such thing"])
+    assert canon == ["brown sugar boba", "coconut jelly"]
+    assert ambiguous == {"bubbles": list(POPPING)}
+    assert _canon_toppings(None) == ([], {})
+
+
+def test_toppings_are_carried_through_the_order():
+    cart = Cart()
+    line = {"name": "Taro Milk Tea", "size": "l", "toppings": ["pearls", "cheese foam"]}
+    added = json.loads(run_tool_json("add_to_cart", json.dumps({"items": [line]}), cart=cart))
+    assert added["items"][0]["toppings"] == ["brown sugar boba", "milk foam"]
+    assert cart.lines[0].toppings == ("brown sugar boba", "milk foam")
+    order = json.loads(run_tool_json("place_order", "{}", cart=cart))
+    assert order["items"][0]["toppings"] == ["brown sugar boba", "milk foam"]
+    assert order["items"][0]["unit_price"] == round(added["items"][0]["unit_price"], 2)
+
+
+def test_ambiguous_topping_is_asked_about_not_guessed():
+    args = {"name": "Taro Milk Tea", "size": "l", "toppings": ["bubbles"]}
+    price = json.loads(run_tool_json("get_price", json.dumps(args)))
+    assert price["price"] is None and price["ambiguous_toppings"] == {"bubbles": list(POPPING)}
+    order = json.loads(run_tool_json("place_order", json.dumps({"items": [args]}), cart=Cart()))
+    assert not order["ok"] and order["error"].startswith("Topping is ambiguous: bubbles (one of: mango popping")
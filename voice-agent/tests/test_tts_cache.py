@@ -0,0 +1,20 @@
+from demov2 import TTSCache
+
+
+def test_cache_touches_disk_only_on_first_use(tmp_path):
+    directory = tmp_path / "tts"
+    cache = TTSCache(directory, disk_bytes=10)
+    assert not directory.exists()
+    assert cache.get("hello") is None
+    assert directory.is_dir()
+
+
+def test_clips_persist_and_evict_by_disk_budget(tmp_path):
+    cache = TTSCache(tmp_path, disk_bytes=10)
+    cache.put("one", b"11111")
+    cache.put("two", b"22222")
+    cache.put("three", b"33333")  # over 10 bytes: "one" leaves the disk
+    reopened = TTSCache(tmp_path, disk_bytes=10)
+    assert reopened.get("one") is None
+    assert reopened.get("three") == b"33333"
+    assert reopened.stats["disk_hits"] == 1